@@ -0,0 +1,20 @@
+"""
+Gunicorn settings for serving the app, read automatically from the working directory:
+
+    gunicorn -w 4 run:app
+
+The master imports the app and loads the model once before forking, so the
+workers share its weights copy-on-write. Each worker then warms the model up in
+the background; /readyz reports ready once that is done.
+"""
+preload_app = True
+
+def when_ready(server):
+    # Runs in the master after the app was imported, before any worker is forked.
+    # Only load here: inference threads started before fork() would not survive it
+    from run import model_loader
+    model_loader.load()
+
+def post_worker_init(worker):
+    from run import model_loader
+    model_loader.start()
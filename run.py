@@ -1,15 +1,29 @@
 import io
 import os
-import uuid
+import hmac
+import tarfile
+import zipfile
+import json
 import cv2
 import numpy as np
 import logging
-from flask import Flask, request, jsonify, send_file, render_template, send_from_directory
+from flask import Flask, Response, g, request, jsonify, send_file, render_template, send_from_directory, stream_with_context
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
-from src.preprocessing import normalization, noise_reduction, skull_stripping, artifact_removal
-from src.augmentation import rotation, translation, scaling, flipping, elastic_deformation, intensity_adjustment, noise_injection, shearing, random_cropping
-from ultralytics import YOLO
+from src.preprocessing import normalization, skull_stripping
+from src.feature_extraction.similarity_index import INDEX_FILENAME, SimilarityIndex
+from src.models.loader import ModelLoader
+from src.models.tiling import predict_tiled
+from src.utils import config
+from src.utils.image_store import create_image_store
+from src.utils.archives import archive_kind, iter_archive
+from src.utils.executor import ImageExecutor
+from src.utils.jobs import create_job_queue
+from src.utils.operators import AUGMENT_MAP, PROCESSING_MAP
+from src.utils import metrics
+from src.utils.profiling import RequestProfile
+from src.utils.result_cache import ResultCache, content_digest
+from src.utils.volumes import Volume, group_slices
 from pathlib import Path
 import time
 from typing import Optional, Union
@@ -17,87 +31,143 @@ from typing import Optional, Union
 #==============================================================================
 # CONFIGURATION AND INITIALIZATION
 #==============================================================================
-# Set up logging
-logging.basicConfig(level=logging.INFO)
+# Set up logging; every line carries the id of the request that produced it
+logging.basicConfig(level=logging.INFO, format='%(levelname)s:%(name)s:[%(request_id)s] %(message)s')
+for handler in logging.getLogger().handlers:
+    handler.addFilter(metrics.RequestIdFilter())
 logger = logging.getLogger(__name__)
 
 # Initialize Flask app
 app = Flask(__name__, static_folder='web_interface', template_folder='web_interface')
 CORS(app)
 
+@app.before_request
+def start_request_metrics():
+    # Reuse the caller's request id (e.g. from a proxy) so logs can be joined across services
+    request.environ['neuroscan.start'] = time.perf_counter()
+    metrics.current_request_id.set(request.headers.get('X-Request-ID') or metrics.new_request_id())
+    metrics.current_route.set(request.url_rule.rule if request.url_rule else 'unmatched')
+
+@app.after_request
+def record_request_metrics(response):
+    start = request.environ.get('neuroscan.start')
+    if start is not None:
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - start, route=metrics.current_route.get(),
+                                        method=request.method, status=response.status_code)
+    response.headers['X-Request-ID'] = metrics.current_request_id.get()
+    return response
+
+@app.teardown_request
+def clear_request_context(error):
+    # Sync workers reuse one thread, so later log lines must not carry this request's id
+    metrics.current_request_id.set('-')
+    metrics.current_route.set('none')
+
+# Routes a request may ask to have profiled, see config.PROFILE_TOKEN
+PROFILED_ROUTES = {'/detect', '/process', '/augment'}
+
+def profile_token_valid() -> bool:
+    """
+    Check the profiling token sent with the current request.
+
+    Returns
+    -------
+    bool
+        True if profiling is enabled and the X-Profile header or ?profile= parameter matches the token.
+    """
+    token = request.headers.get('X-Profile') or request.args.get('profile')
+    return bool(config.PROFILE_TOKEN and token) and hmac.compare_digest(token, config.PROFILE_TOKEN)
+
+@app.before_request
+def start_profile():
+    # Registered after start_request_metrics, so the route is already known
+    if not config.PROFILE_TOKEN or metrics.current_route.get() not in PROFILED_ROUTES or not profile_token_valid():
+        return
+    profile = RequestProfile(metrics.current_route.get(), metrics.current_request_id.get())
+    if profile.start():
+        g.profile = profile
+    else:
+        logger.warning("Another request is being profiled; running this one unprofiled")
+
+@app.after_request
+def finish_profile(response):
+    profile = g.pop('profile', None)
+    if profile is not None:
+        report = profile.stop()
+        if report is not None:
+            response.headers['X-Profile'] = report['name']
+    return response
+
+@app.teardown_request
+def discard_profile(error):
+    # Release the profiler if the request failed before after_request ran
+    profile = g.pop('profile', None)
+    if profile is not None:
+        profile.stop()
+
 # Allowed image file extensions
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif' 'webp'}
 
+# Decode flags by the downscale factor /upload?preview= accepts
+PREVIEW_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+# Formats /uploads/<filename> can encode images to: extension and mimetype
+IMAGE_FORMATS = {
+    'jpg': ('.jpg', 'image/jpeg'),
+    'png': ('.png', 'image/png'),
+    'webp': ('.webp', 'image/webp'),
+}
+
 #==============================================================================
 # IMAGE STORAGE MANAGEMENT
 #==============================================================================
-class ImageStore:
-    """
-    Manages in-memory storage of images with expiration times.
+# Memoized detection and preprocessing results, keyed by pixel content
+result_cache = ResultCache()
 
-    Attributes
-    ----------
-    store : dict
-        Internal dictionary to hold images and their expiration metadata.
-    """
-    def __init__(self):
-        self.store = {}
-        
-    def set(self, key: str, image: np.ndarray, timeout: int = 3600) -> None:
-        """
-        Store an image in the cache with an expiration time.
-
-        Parameters
-        ----------
-        key : str
-            Unique identifier for the image.
-        image : numpy.ndarray
-            Image data to be stored.
-        timeout : int, optional
-            Time (seconds) before the image expires.
-        """
-        self.store[key] = {
-            'image': image,
-            'expires': time.time() + timeout
-        }
-        
-    def get(self, key: str) -> Optional[np.ndarray]:
-        """
-        Retrieve an image from the cache if valid.
-
-        Parameters
-        ----------
-        key : str
-            Unique identifier for the image.
-
-        Returns
-        -------
-        numpy.ndarray or None
-            The stored image or None if expired/absent.
-        """
-        item = self.store.get(key)
-        if item is None:
-            return None
-            
-        if time.time() > item['expires']:
-            del self.store[key]
-            return None
-            
-        return item['image']
+# Background detection jobs, shared between workers along with the image store
+detection_jobs = create_job_queue()
+
+# Threads that transform the images of one request in parallel
+image_executor = ImageExecutor()
+
+# Initialize image store (per-process or shared between workers, see config.STORE_BACKEND)
+image_store = create_image_store()
 
-# Initialize image store
-image_store = ImageStore()
+def _hit_rate(stats: dict) -> Optional[float]:
+    lookups = stats['hits'] + stats['misses']
+    return stats['hits'] / lookups if lookups else None
+
+# Store and cache state, read when /metrics is scraped
+for metric_name, documentation, read, kind in (
+    ('neuroscan_store_entries', 'Images held by the image store.', lambda: image_store.stats()['entries'], 'gauge'),
+    ('neuroscan_store_resident_bytes', 'Bytes held by the image store.', lambda: image_store.stats()['resident_bytes'], 'gauge'),
+    ('neuroscan_store_hit_ratio', 'Fraction of image store lookups that found the image.', lambda: _hit_rate(image_store.stats()), 'gauge'),
+    ('neuroscan_store_evictions_total', 'Images evicted from the image store.', lambda: image_store.stats()['evictions'], 'counter'),
+    ('neuroscan_result_cache_entries', 'Memoized detection and preprocessing results.', lambda: result_cache.stats()['entries'], 'gauge'),
+    ('neuroscan_result_cache_hit_ratio', 'Fraction of result cache lookups that hit.', lambda: _hit_rate(result_cache.stats()), 'gauge'),
+):
+    metrics.REGISTRY.gauge(metric_name, documentation, read, kind)
 
 #==============================================================================
 # MODEL INITIALIZATION
 #==============================================================================
+# The model is loaded on first use, by the first /readyz probe, or up front by
+# gunicorn.conf.py and __main__ below, so importing the app stays fast
+model_loader = ModelLoader(config.MODEL_BACKEND, config.MODEL_PATH)
+
+# Similar-case search index, built by src.feature_extraction.similarity_index
+similarity_index_path = os.path.join(config.FEATURE_STORE_DIR, INDEX_FILENAME)
 try:
-    logger.info("Loading YOLOv8 model...")
-    model = YOLO('./runs/detect 70_30/train/weights/best.pt')
-    logger.info("Model loaded successfully.")
-except Exception as e:
-    logger.error(f"Error loading YOLOv8 model: {e}")
-    model = None
+    similarity_index = SimilarityIndex.load(similarity_index_path)
+    logger.info(f"Similarity index loaded with {len(similarity_index)} slices.")
+except FileNotFoundError:
+    logger.info(f"No similarity index at {similarity_index_path}; /similar is disabled.")
+    similarity_index = None
 
 #==============================================================================
 # UTILITY FUNCTIONS
@@ -118,35 +188,67 @@ def allowed_file(filename: str) -> bool:
     """
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def save_to_memory(file) -> Union[str, None]:
+def store_upload(filename: str, data: bytes, flags: int = cv2.IMREAD_COLOR) -> Union[str, None]:
     """
-    This function saves an uploaded file to memory (using the image_store class) and assigns it a unique filename. It ensures that the file is valid, processes it into an image, and stores it for later use.
+    Decode an uploaded image and save it to memory (using the image_store class), named after a hash of its decoded pixels so identical uploads share one entry.
 
     Parameters
     ----------
-    file : werkzeug.datastructures.FileStorage
-        The uploaded file object.
+    filename : str
+        Name the image was uploaded under.
+    data : bytes
+        Encoded image.
+    flags : int, optional
+        cv2.imdecode flags, e.g. a PREVIEW_FLAGS entry.
 
     Returns
     -------
     str or None
-        Unique filename, or None if invalid.
+        Unique filename, or None if the name or data is not a supported image.
     """
-    if not (file and allowed_file(file.filename)):
+    if not allowed_file(filename):
         return None
-    
+
     try:
-        unique_filename = f"{uuid.uuid4()}_{secure_filename(file.filename)}"
-        file_bytes = np.frombuffer(file.read(), np.uint8)
-        image = cv2.imdecode(file_bytes, cv2.IMREAD_COLOR)
-        
-        # Store in image_store with 1 hour expiration
-        image_store.set(unique_filename, image, timeout=3600)
+        with metrics.stage('decode'):
+            image = cv2.imdecode(np.frombuffer(data, np.uint8), flags)
+        if image is None:
+            logger.warning(f"Could not decode image: {filename}")
+            return None
+
+        # Key by pixel content so re-uploading the same slice reuses the stored copy
+        unique_filename = f"{content_digest(image)}_{secure_filename(filename)}"
+        if image_store.get(unique_filename) is None:
+            # Store in image_store with 1 hour expiration
+            image_store.set(unique_filename, image, timeout=3600)
         return unique_filename
     except Exception as e:
-        logger.error(f"Error processing file {file.filename}: {e}")
+        logger.error(f"Error processing file {filename}: {e}")
         return None
 
+def iter_uploaded_files(files: list):
+    """
+    Read uploaded files one at a time, expanding ZIP and tar archives into their entries.
+
+    Parameters
+    ----------
+    files : list of werkzeug.datastructures.FileStorage
+        Files of a multipart upload.
+
+    Yields
+    ------
+    tuple
+        (filename, encoded bytes) per loose file or archive entry.
+    """
+    for file in files:
+        kind = archive_kind(file.filename)
+        if kind:
+            yield from metrics.timed_iter(iter_archive(file.stream, kind), 'read')
+        else:
+            with metrics.stage('read'):
+                data = file.read()
+            yield file.filename, data
+
 def convert_to_grayscale(image: np.ndarray) -> np.ndarray:
     """
     Convert an RGB image to grayscale if needed.
@@ -165,9 +267,83 @@ def convert_to_grayscale(image: np.ndarray) -> np.ndarray:
         image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
     return image
 
+def to_uint8(image: np.ndarray) -> np.ndarray:
+    """
+    Clip and convert an image to uint8 if needed, as the detector expects.
+
+    Parameters
+    ----------
+    image : numpy.ndarray
+        Input image array.
+
+    Returns
+    -------
+    numpy.ndarray
+        uint8 image array.
+    """
+    if image.dtype != np.uint8:
+        image = np.clip(image, 0, 255)
+        image = image.astype(np.uint8)
+    return image
+
 #==============================================================================
 # CORE PROCESSING FUNCTIONS
 #==============================================================================
+# Preprocessing methods that work on a whole volume at once, by name
+VOLUME_PROCESSING_MAP = {
+    'normalization': lambda volume: normalization.normalize_volume(volume.stack),
+    'skull_stripping': lambda volume: skull_stripping.skull_strip_volume(volume.stack, volume.slice_indices),
+}
+
+def extract_boxes(detections: tuple) -> tuple:
+    """
+    Convert one image's backend detections into plain boxes.
+
+    Parameters
+    ----------
+    detections : tuple
+        (boxes, scores, class_ids) arrays returned by the model backend for a single image.
+
+    Returns
+    -------
+    tuple
+        One (x1, y1, x2, y2, confidence, label) tuple per detected box.
+    """
+    names = model_loader.get().names
+    extracted = []
+    for (x1, y1, x2, y2), confidence, class_id in zip(*detections):
+        extracted.append((int(x1), int(y1), int(x2), int(y2), float(confidence), names[int(class_id)]))
+    return tuple(extracted)
+
+def annotate_detections(image: np.ndarray, boxes: tuple) -> tuple:
+    """
+    Draw detected boxes on an image and collect their details.
+
+    Parameters
+    ----------
+    image : numpy.ndarray
+        Image to draw on (modified in place).
+    boxes : tuple
+        Boxes as returned by extract_boxes.
+
+    Returns
+    -------
+    tuple
+        (tumor_detected, detection_info).
+    """
+    detection_info = []
+    for x1, y1, x2, y2, confidence, tumor_label in boxes:
+        detection_info.append({
+            'location': f"({x1}, {y1}) to ({x2}, {y2})",
+            'type': tumor_label,
+            'confidence': f"{confidence:.2f}"
+        })
+
+        # Only draw the bounding box without labels
+        cv2.rectangle(image, (x1, y1), (x2, y2), (0, 255, 0), 2)
+
+    return bool(boxes), detection_info
+
 def detect_tumor(image_data: np.ndarray) -> tuple:
     """
     Detect tumors in an image using the YOLOv8 model.
@@ -182,40 +358,139 @@ def detect_tumor(image_data: np.ndarray) -> tuple:
     tuple
         (modified_image, tumor_detected, detection_info).
     """
-    try:
-        original_image = image_data.copy()
-        rgb_image = cv2.cvtColor(original_image, cv2.COLOR_BGR2RGB)
-        results = model(rgb_image)
-        
-        tumor_detected = False
-        detection_info = []
-        
-        for result in results:
-            boxes = getattr(result, 'boxes', None)
-            if not boxes:
-                continue
-                
-            tumor_detected = True
-            for box in boxes:
-                x1, y1, x2, y2 = map(int, box.xyxy[0].tolist())
-                confidence = float(box.conf[0])
-                class_id = int(box.cls[0])
-                tumor_label = result.names[class_id]
-                
-                detection_info.append({
-                    'location': f"({x1}, {y1}) to ({x2}, {y2})",
-                    'type': tumor_label,
-                    'confidence': f"{confidence:.2f}"
-                })
-                
-                # Only draw the bounding box without labels
-                cv2.rectangle(original_image, (x1, y1), (x2, y2), (0, 255, 0), 2)
-        
-        return original_image, tumor_detected, detection_info
-        
-    except Exception as e:
-        logger.error(f"Error during tumor detection: {e}")
-        return None, False, []
+    return detect_tumors_batch([image_data])[0]
+
+def detect_tumors_batch(images: list, batch_size: int = config.DETECT_BATCH_SIZE) -> list:
+    """
+    Detect tumors in several images, grouping up to batch_size images per model call.
+
+    Images larger than config.DETECT_TILE_THRESHOLD are detected tile by tile at
+    full resolution. Boxes are memoized per (pixel content, model weights,
+    thresholds), so images that were analysed before skip the model entirely.
+
+    Parameters
+    ----------
+    images : list of numpy.ndarray
+        Images in which to detect tumors.
+    batch_size : int, optional
+        Maximum number of images passed to the model at once.
+
+    Returns
+    -------
+    list of tuple
+        One (modified_image, tumor_detected, detection_info) per input image,
+        in input order. Images of a failed batch yield (None, False, []).
+    """
+    model = model_loader.get()
+    outputs = [None] * len(images)
+    pending = []
+
+    # Grayscale results (e.g. skull stripping) are drawn on and detected as 3-channel images
+    with metrics.stage('color_conversion'):
+        images = [cv2.cvtColor(image, cv2.COLOR_GRAY2BGR) if image.ndim == 2 else image for image in images]
+
+    for index, image in enumerate(images):
+        cache_key = ('detect', content_digest(image), model_loader.model_id, config.DETECT_CONFIDENCE, config.DETECT_IOU,
+                     config.DETECT_TILE_THRESHOLD, config.DETECT_TILE_OVERLAP)
+        boxes = result_cache.get(cache_key)
+        if boxes is None:
+            pending.append((index, cache_key))
+        else:
+            with metrics.stage('annotate'):
+                annotated = image.copy()
+                outputs[index] = (annotated, *annotate_detections(annotated, boxes))
+
+    batch_size = max(1, batch_size)
+    for start in range(0, len(pending), batch_size):
+        batch = pending[start:start + batch_size]
+        try:
+            with metrics.stage('inference'):
+                results = predict_tiled(model, [images[index] for index, _ in batch],
+                                        conf=config.DETECT_CONFIDENCE, iou=config.DETECT_IOU)
+
+            # The backend returns one result per input image, in order
+            for (index, cache_key), result in zip(batch, results):
+                boxes = extract_boxes(result)
+                result_cache.set(cache_key, boxes)
+
+                with metrics.stage('annotate'):
+                    annotated = images[index].copy()
+                    outputs[index] = (annotated, *annotate_detections(annotated, boxes))
+        except Exception as e:
+            logger.error(f"Error during batched tumor detection: {e}")
+            for index, _ in batch:
+                outputs[index] = (None, False, [])
+
+    return outputs
+
+def detect_stored_images(filenames: list) -> list:
+    """
+    Detect tumors in stored images and store the annotated copies.
+
+    Parameters
+    ----------
+    filenames : list of str
+        Unique names of the stored images.
+
+    Returns
+    -------
+    list of tuple
+        (filename, detection_result) for every image that was found and analysed,
+        where detection_result holds the annotated image URL, whether a tumor was
+        detected and the box details.
+    """
+    image_ids = []
+    images = []
+    for image_id in filenames:
+        # Retrieve the image from memory
+        image_data = image_store.get(image_id)
+
+        if image_data is None:
+            logger.error(f"Image not found: {image_id}")
+            continue
+
+        image_ids.append(image_id)
+        # Convert image to uint8 if necessary
+        images.append(to_uint8(image_data))
+
+    detection_results = []
+
+    # Detect tumors in batches of images
+    for image_id, (detected_image, tumor_detected, detection_info) in zip(image_ids, detect_tumors_batch(images)):
+        if detected_image is None:
+            logger.error(f"Tumor detection failed for image: {image_id}")
+            continue
+
+        # Store the detected image back in memory
+        detected_image_id = f"detected_{image_id}"
+        image_store.set(detected_image_id, detected_image, timeout=3600)
+
+        # Append detection result for this image
+        detection_results.append((image_id, {
+            'image_url': f'/uploads/{detected_image_id}',
+            'tumor_detected': tumor_detected,
+            'details': detection_info
+        }))
+
+        logger.info(f"Tumor detection completed for image: {image_id}")
+
+    return detection_results
+
+def run_detection_job(filenames: list) -> list:
+    """
+    Detect tumors in one chunk of a queued detection job.
+
+    Parameters
+    ----------
+    filenames : list of str
+        Unique names of the stored images.
+
+    Returns
+    -------
+    list of dict
+        Detection results, each tagged with the filename it belongs to.
+    """
+    return [{'filename': filename, **result} for filename, result in detect_stored_images(filenames)]
 
 def handle_processing(process_type: str, image_data: np.ndarray) -> Optional[np.ndarray]:
     """
@@ -237,16 +512,15 @@ def handle_processing(process_type: str, image_data: np.ndarray) -> Optional[np.
     # if process_type in ['skull_stripping']:
     #     image_data = convert_to_grayscale(image_data)
 
-    processing_map = {
-        'normalization': normalization.normalize_image,
-        'noise_reduction': noise_reduction.reduce_noise,
-        'skull_stripping': skull_stripping.skull_strip,
-        'artifact_removal': artifact_removal.remove_artifacts,
-    }
-
-    process_func = processing_map.get(process_type)
+    process_func = PROCESSING_MAP.get(process_type)
     if process_func:
-        processed_image = process_func(image_data)
+        # Preprocessing is deterministic, so identical pixels give identical results
+        cache_key = ('process', process_type, content_digest(image_data))
+        processed_image = result_cache.get(cache_key)
+        if processed_image is None:
+            with metrics.OPERATOR_SECONDS.time(operator=process_type):
+                processed_image = process_func(image_data)
+            result_cache.set(cache_key, processed_image)
         return processed_image
     return None
 
@@ -266,24 +540,74 @@ def handle_augmentation(augment_type: str, image: np.ndarray) -> Optional[np.nda
     numpy.ndarray or None
         Augmented image or None if augment_type is invalid.
     """
-    augment_map = {
-        'rotation': lambda img: rotation.rotate_image(img, 90),
-        'translation': lambda img: translation.translate_image(img, 20, 20),
-        'scaling': lambda img: scaling.scale_image(img, 3, 3),
-        'flipping': lambda img: flipping.flip_image(img, 1),
-        'elastic_deformation': lambda img: elastic_deformation.elastic_transform(img, alpha=3),
-        'intensity_adjustment': lambda img: intensity_adjustment.adjust_intensity(img, alpha=1.9, beta=20),
-        'noise_injection': lambda img: noise_injection.inject_noise(img / 255.0) * 255,
-        'shearing': lambda img: shearing.shear_image(img, shear_factor=0.3),
-        'random_cropping': lambda img: random_cropping.random_crop(img, crop_size=(100, 100)),
-    }
-
-    augment_func = augment_map.get(augment_type)
+    augment_func = AUGMENT_MAP.get(augment_type)
     if augment_func:
-        augmented_image = augment_func(image)
+        with metrics.OPERATOR_SECONDS.time(operator=augment_type):
+            augmented_image = augment_func(image)
         return augmented_image
     return None
 
+def run_pipeline(steps: list, image: np.ndarray) -> list:
+    """
+    Apply preprocessing and augmentation steps back-to-back to one image.
+
+    Parameters
+    ----------
+    steps : list of str
+        Names from PROCESSING_MAP or AUGMENT_MAP, applied in order.
+    image : numpy.ndarray
+        Image data to transform.
+
+    Returns
+    -------
+    list of numpy.ndarray
+        The output of every step, in order.
+    """
+    outputs = []
+    for step in steps:
+        if step in PROCESSING_MAP:
+            image = handle_processing(step, image)
+        else:
+            image = handle_augmentation(step, image)
+        outputs.append(image)
+    return outputs
+
+def process_volume(steps: list, volume: Volume) -> np.ndarray:
+    """
+    Apply preprocessing and augmentation steps to every slice of a volume.
+
+    Steps in VOLUME_PROCESSING_MAP run once on the whole stack; other steps run
+    slice by slice on the image executor.
+
+    Parameters
+    ----------
+    steps : list of str
+        Names from PROCESSING_MAP or AUGMENT_MAP, applied in order.
+    volume : Volume
+        Slices to transform.
+
+    Returns
+    -------
+    numpy.ndarray
+        The transformed stack.
+
+    Raises
+    ------
+    ValueError
+        If a step leaves the slices with different shapes.
+    """
+    stack = volume.stack
+    for step in steps:
+        if step in VOLUME_PROCESSING_MAP:
+            stack = VOLUME_PROCESSING_MAP[step](Volume(volume.volume_id, volume.slice_indices, volume.names, stack))
+            continue
+
+        slices = image_executor.map(lambda image: run_pipeline([step], image)[0], stack)
+        if len({(image.shape, image.dtype) for image in slices}) > 1:
+            raise ValueError(f"Step {step} left the slices of volume {volume.volume_id} with different shapes")
+        stack = np.stack(slices)
+    return stack
+
 #==============================================================================
 # FLASK ROUTES
 #==============================================================================
@@ -310,18 +634,43 @@ def upload_image():
     """
     Handle image upload requests and save images to memory.
 
+    Accepts image files in the ``images`` multipart field, ZIP or tar archives of
+    slices in the same field, or a raw archive body (Content-Type application/zip
+    or application/x-tar). Archives are read entry by entry and decoded on the
+    image executor as they arrive, so memory does not grow with archive size.
+    ``?preview=2``, ``4`` or ``8`` decodes images at reduced resolution.
+
     Returns
     -------
     flask.Response
         JSON response with URLs or error message.
     """
-    if 'images' not in request.files:
-        return jsonify({'error': 'No file part'}), 400
+    preview = request.args.get('preview', '1')
+    flags = PREVIEW_FLAGS.get(int(preview) if preview.isdigit() else None)
+    if flags is None:
+        return jsonify({'error': 'preview must be 1, 2, 4 or 8'}), 400
+
+    # Check the body's content type before touching request.files, which would consume it
+    kind = archive_kind(mimetype=request.mimetype)
+    if kind:
+        entries = metrics.timed_iter(iter_archive(request.stream, kind), 'read')
+    else:
+        # Werkzeug parses the whole multipart body on first access
+        with metrics.stage('multipart_parse'):
+            has_images = 'images' in request.files
+        if not has_images:
+            return jsonify({'error': 'No file part'}), 400
+        entries = iter_uploaded_files(request.files.getlist('images'))
 
     saved_files = []
-    for file in request.files.getlist('images'):
-        if filename := save_to_memory(file):
-            saved_files.append(filename)
+    try:
+        for filename in image_executor.imap(lambda entry: store_upload(*entry, flags), entries):
+            if filename:
+                saved_files.append(filename)
+    except (tarfile.TarError, zipfile.BadZipFile, EOFError) as e:
+        logger.error(f"Error reading uploaded archive: {e}")
+        return jsonify({'error': f'Invalid archive: {e}',
+                        'image_urls': [f'/uploads/{f}' for f in saved_files]}), 400
 
     if not saved_files:
         return jsonify({'error': 'No valid files uploaded'}), 400
@@ -333,6 +682,10 @@ def uploaded_file(filename: str):
     """
     Serve images from memory store.
 
+    Each image is encoded once per format and the bytes are cached in the store,
+    so repeated requests skip the encoder. Responses carry an ETag and
+    Last-Modified, and conditional requests for an unchanged image get a 304.
+
     Parameters
     ----------
     filename : str
@@ -341,27 +694,116 @@ def uploaded_file(filename: str):
     Returns
     -------
     flask.Response
-        The requested image or an error message.
+        The requested image or an error message. The ``format`` query parameter
+        selects 'jpg', 'png' or 'webp' (config.IMAGE_FORMAT by default).
     """
     try:
-        image = image_store.get(filename)
-        if image is None:
-            logger.error(f"Image not found in store: {filename}")
-            return jsonify({'error': 'File not found'}), 404
-
-        # Convert grayscale to BGR if needed
-        if len(image.shape) == 2:
-            image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
-
-        _, buffer = cv2.imencode('.jpg', image)
-        io_buf = io.BytesIO(buffer)
-        io_buf.seek(0)
-        
-        return send_file(io_buf, mimetype='image/jpeg')
+        fmt = request.args.get('format', config.IMAGE_FORMAT).lower()
+        if fmt not in IMAGE_FORMATS:
+            return jsonify({'error': f'Unsupported format: {fmt}'}), 400
+        extension, mimetype = IMAGE_FORMATS[fmt]
+
+        encoded = image_store.get_encoded(filename, fmt)
+        if encoded is None:
+            image = image_store.get(filename)
+            if image is None:
+                logger.error(f"Image not found in store: {filename}")
+                return jsonify({'error': 'File not found'}), 404
+
+            # Convert grayscale to BGR if needed
+            if len(image.shape) == 2:
+                image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+
+            with metrics.stage('encode'):
+                _, buffer = cv2.imencode(extension, image)
+            encoded = image_store.set_encoded(filename, fmt, buffer.tobytes())
+            if encoded is None:
+                # Evicted while encoding; serve it this once without caching
+                encoded = (buffer.tobytes(), None, None)
+
+        data, etag, modified = encoded
+        return send_file(io.BytesIO(data), mimetype=mimetype, etag=etag or False,
+                         last_modified=modified, conditional=True)
     except Exception as e:
         logger.error(f"Error serving file {filename}: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/store/stats')
+def store_stats():
+    """
+    Report image store usage.
+
+    Returns
+    -------
+    flask.Response
+        JSON response with the store's size and hit/miss/eviction counters,
+        plus the result cache's.
+    """
+    return jsonify({**image_store.stats(), 'result_cache': result_cache.stats()}), 200
+
+@app.route('/healthz')
+def healthz():
+    """
+    Liveness probe: the process is up and serving requests.
+
+    Returns
+    -------
+    tuple
+        JSON status and 200.
+    """
+    return jsonify({'status': 'ok'}), 200
+
+@app.route('/readyz')
+def readyz():
+    """
+    Readiness probe: the model is loaded and warmed up, so detection requests are served at full speed.
+
+    The first probe starts loading the model in the background if nothing else has.
+
+    Returns
+    -------
+    tuple
+        JSON with the model state, and 200 when ready or 503 otherwise.
+    """
+    model_loader.start()
+    body = {'status': 'ready' if model_loader.ready else 'not ready', 'model': model_loader.state}
+    if model_loader.error:
+        body['error'] = model_loader.error
+    return jsonify(body), 200 if model_loader.ready else 503
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """
+    Expose latency histograms per route, stage and operator, and store state, for Prometheus.
+
+    Returns
+    -------
+    flask.Response
+        Metrics of this worker process in the Prometheus text format.
+    """
+    return Response(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/profiles/<name>')
+def get_profile(name: str):
+    """
+    Download the output of a profiled request from this worker.
+
+    Parameters
+    ----------
+    name : str
+        ``<profile>.collapsed`` or ``<profile>.json``, where ``<profile>`` is the
+        X-Profile header of the profiled response.
+
+    Returns
+    -------
+    flask.Response
+        The file, or 404 if profiling is disabled, the token is missing or wrong,
+        or the file does not exist.
+    """
+    if not profile_token_valid():
+        return jsonify({'error': 'Not found'}), 404
+    return send_from_directory(os.path.abspath(config.PROFILE_DIR), secure_filename(name))
+
 #------------------------------------------------------------------------------
 # Processing Routes
 #------------------------------------------------------------------------------
@@ -379,14 +821,18 @@ def process_images():
     process_type = data['type']
     filenames = data['filenames']
 
-    processed_image_urls = []
+    images = []
     for filename in filenames:
         image = image_store.get(filename)
         if image is None:
             logger.warning(f"Image not found in store: {filename}")
             continue
-            
-        processed_image = handle_processing(process_type, image)
+        images.append((filename, image))
+
+    processed_images = image_executor.map(lambda item: handle_processing(process_type, item[1]), images)
+
+    processed_image_urls = []
+    for (filename, _), processed_image in zip(images, processed_images):
         if processed_image is not None:
             unique_filename = f"{process_type}_{filename}"
             image_store.set(unique_filename, processed_image, timeout=3600)
@@ -411,13 +857,18 @@ def augment_images():
     augment_type = data['type']
     filenames = data['filenames']
 
-    augmented_image_urls = []
+    images = []
     for filename in filenames:
         image = image_store.get(filename)
         if image is None:
             logger.error(f"Image not found: {filename}")
             continue
-        augmented_image = handle_augmentation(augment_type, image)
+        images.append((filename, image))
+
+    augmented_images = image_executor.map(lambda item: handle_augmentation(augment_type, item[1]), images)
+
+    augmented_image_urls = []
+    for (filename, _), augmented_image in zip(images, augmented_images):
         if augmented_image is not None:
             unique_filename = f"{augment_type}_{filename}"
             image_store.set(unique_filename, augmented_image, timeout=3600)
@@ -428,6 +879,114 @@ def augment_images():
     else:
         return jsonify({'error': 'Augmentation failed for all images'}), 400
 
+@app.route('/pipeline', methods=['POST'])
+def pipeline_images():
+    """
+    Apply an ordered chain of preprocessing and augmentation steps, optionally
+    followed by tumor detection, without storing or serving the intermediate images.
+
+    The JSON body holds ``filenames``, ``steps`` (names accepted by /process and
+    /augment), an optional ``detect`` flag, and ``keep``: 'final' (default),
+    'all', 'none', or a list of step indices whose outputs should be stored
+    (negative indices count from the last step).
+    Stored outputs are named as if the steps had been run one request at a time,
+    e.g. ``skull_stripping_normalization_<filename>``.
+
+    Returns
+    -------
+    flask.Response
+        JSON response with one result per image (stored image URLs and, if requested,
+        its detection result), plus ``detection_results`` shaped like /detect's.
+    """
+    data = request.get_json()
+    filenames = data.get('filenames', [])
+    steps = data.get('steps', [])
+    detect = bool(data.get('detect', False))
+    keep = data.get('keep', 'final')
+
+    if not filenames:
+        return jsonify({'error': 'Filenames are required'}), 400
+
+    unknown_steps = [step for step in steps if step not in PROCESSING_MAP and step not in AUGMENT_MAP]
+    if unknown_steps:
+        return jsonify({'error': f"Unknown step(s): {', '.join(unknown_steps)}"}), 400
+
+    if keep == 'all':
+        keep_steps = set(range(len(steps)))
+    elif keep == 'final':
+        keep_steps = {len(steps) - 1} if steps else set()
+    elif keep == 'none':
+        keep_steps = set()
+    elif isinstance(keep, list) and all(isinstance(index, int) and not isinstance(index, bool)
+                                        and -len(steps) <= index < len(steps) for index in keep):
+        # Negative indices count from the last step, as in Python
+        keep_steps = {index % len(steps) for index in keep}
+    else:
+        return jsonify({'error': f"keep must be 'final', 'all', 'none' or a list of integer indices "
+                                 f"into the {len(steps)} step(s)"}), 400
+
+    if detect and model_loader.get() is None:
+        logger.error("YOLO model not loaded.")
+        return jsonify({'error': 'YOLO model not loaded'}), 500
+
+    images = []
+    for filename in filenames:
+        image = image_store.get(filename)
+        if image is None:
+            logger.warning(f"Image not found in store: {filename}")
+            continue
+        images.append((filename, image))
+
+    def run_one(item):
+        filename, image = item
+        try:
+            return run_pipeline(steps, image), None
+        except Exception as e:
+            logger.error(f"Pipeline failed for image {filename}: {e}")
+            return None, str(e)
+
+    results = []
+    finals = []
+    for (filename, image), (outputs, error) in zip(images, image_executor.map(run_one, images)):
+        if error is not None:
+            results.append({'filename': filename, 'error': error})
+            continue
+
+        # Only the requested outputs are written to the store
+        name = filename
+        image_urls = []
+        for index, (step, output) in enumerate(zip(steps, outputs)):
+            name = f"{step}_{name}"
+            if index in keep_steps:
+                image_store.set(name, output, timeout=3600)
+                image_urls.append(f'/uploads/{name}')
+
+        results.append({'filename': filename, 'image_urls': image_urls})
+        finals.append((results[-1], name, outputs[-1] if outputs else image))
+
+    if detect and finals:
+        detections = detect_tumors_batch([to_uint8(final_image) for _, _, final_image in finals])
+        for (result, name, _), (detected_image, tumor_detected, detection_info) in zip(finals, detections):
+            if detected_image is None:
+                result['error'] = 'Tumor detection failed'
+                continue
+
+            detected_image_id = f"detected_{name}"
+            image_store.set(detected_image_id, detected_image, timeout=3600)
+            result['detection'] = {
+                'image_url': f'/uploads/{detected_image_id}',
+                'tumor_detected': tumor_detected,
+                'details': detection_info
+            }
+
+    if not finals:
+        return jsonify({'error': 'Pipeline failed for all images', 'results': results}), 400
+
+    return jsonify({
+        'results': results,
+        'detection_results': [result['detection'] for result in results if 'detection' in result]
+    }), 200
+
 @app.route('/detect', methods=['POST'])
 def detect_tumor_route():
     """
@@ -446,48 +1005,11 @@ def detect_tumor_route():
             logger.warning("Filenames are required.")
             return jsonify({'error': 'Filenames are required'}), 400
 
-        detected_image_urls = []
-        tumor_detected_in_any = False
-        detection_results = []
-
-        for image_id in filenames:
-            # Retrieve the image from memory
-            image_data = image_store.get(image_id)
-
-            if image_data is None:
-                logger.error(f"Image not found: {image_id}")
-                continue
+        if model_loader.get() is None:
+            logger.error("YOLO model not loaded.")
+            return jsonify({'error': 'YOLO model not loaded'}), 500
 
-            if model is None:
-                logger.error("YOLO model not loaded.")
-                return jsonify({'error': 'YOLO model not loaded'}), 500
-
-            # Convert image to uint8 if necessary
-            if image_data.dtype != np.uint8:
-                image_data = np.clip(image_data, 0, 255)
-                image_data = image_data.astype(np.uint8)
-
-            # Detect tumor in the image
-            detected_image, tumor_detected, detection_info = detect_tumor(image_data.copy())
-            tumor_detected_in_any = tumor_detected_in_any or tumor_detected
-
-            if detected_image is None:
-                logger.error(f"Tumor detection failed for image: {image_id}")
-                continue
-
-            # Store the detected image back in memory
-            detected_image_id = f"detected_{image_id}"
-            image_store.set(detected_image_id, detected_image, timeout=3600)
-
-            # Append detection result for this image
-            detection_results.append({
-                'image_url': f'/uploads/{detected_image_id}',
-                'tumor_detected': tumor_detected,
-                'details': detection_info
-            })
-
-            logger.info(f"Tumor detection completed for image: {image_id}")
-            detected_image_urls.append(f'/uploads/{detected_image_id}')
+        detection_results = [result for _, result in detect_stored_images(filenames)]
 
         if detection_results:
             return jsonify({
@@ -500,6 +1022,226 @@ def detect_tumor_route():
         logger.exception(f"Error in /detect route: {e}")
         return jsonify({'error': 'Internal server error'}), 500
 
+@app.route('/similar', methods=['POST'])
+def similar_cases():
+    """
+    Find the labelled dataset slices that look most like the given images.
+
+    The JSON body holds ``filenames`` and an optional ``k`` from 1 to 100 (default 5).
+
+    Returns
+    -------
+    flask.Response
+        JSON response with, per image, the k most similar slices, their cosine
+        similarity and their labelled tumor classes, or an error.
+    """
+    data = request.get_json()
+    filenames = data.get('filenames', [])
+    k = data.get('k', 5)
+
+    if not filenames:
+        return jsonify({'error': 'Filenames are required'}), 400
+
+    if not isinstance(k, int) or isinstance(k, bool) or not 1 <= k <= 100:
+        return jsonify({'error': 'k must be an integer from 1 to 100'}), 400
+
+    if similarity_index is None:
+        logger.error("Similarity index not loaded.")
+        return jsonify({'error': 'Similarity index not built'}), 500
+
+    similar_results = []
+    for filename in filenames:
+        image = image_store.get(filename)
+        if image is None:
+            logger.warning(f"Image not found in store: {filename}")
+            continue
+        similar_results.append({'filename': filename, 'matches': similarity_index.similar_to_image(to_uint8(image), k)})
+
+    if not similar_results:
+        return jsonify({'error': 'No images found'}), 400
+    return jsonify({'similar_results': similar_results}), 200
+
+@app.route('/detect/jobs', methods=['POST'])
+def submit_detection_job():
+    """
+    Queue tumor detection for the given images and return without waiting for it.
+
+    Returns
+    -------
+    flask.Response
+        JSON response with the job id and the URLs to follow its progress, or an error.
+    """
+    data = request.get_json()
+    filenames = data.get('filenames', [])
+
+    if not filenames:
+        logger.warning("Filenames are required.")
+        return jsonify({'error': 'Filenames are required'}), 400
+
+    if model_loader.get() is None:
+        logger.error("YOLO model not loaded.")
+        return jsonify({'error': 'YOLO model not loaded'}), 500
+
+    job_id = detection_jobs.submit(run_detection_job, filenames, config.DETECT_BATCH_SIZE)
+    logger.info(f"Queued detection job {job_id} for {len(filenames)} image(s)")
+
+    return jsonify({
+        'job_id': job_id,
+        'status_url': f'/detect/jobs/{job_id}',
+        'events_url': f'/detect/jobs/{job_id}/events'
+    }), 202
+
+@app.route('/detect/jobs/<job_id>')
+def detection_job_status(job_id: str):
+    """
+    Report the progress of a detection job.
+
+    Parameters
+    ----------
+    job_id : str
+        Id returned by /detect/jobs.
+
+    Returns
+    -------
+    flask.Response
+        JSON response with the job status and the detection results finished so far.
+        The ``since`` query parameter skips results the caller has already received.
+    """
+    job = detection_jobs.get(job_id, since=request.args.get('since', 0, type=int))
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+
+    job['detection_results'] = job.pop('results')
+    return jsonify(job), 200
+
+@app.route('/detect/jobs/<job_id>/events')
+def detection_job_events(job_id: str):
+    """
+    Stream a detection job's results as server-sent events.
+
+    Parameters
+    ----------
+    job_id : str
+        Id returned by /detect/jobs.
+
+    Returns
+    -------
+    flask.Response
+        An event stream with one ``result`` event per image and a final ``done`` event.
+    """
+    if detection_jobs.get(job_id) is None:
+        return jsonify({'error': 'Job not found'}), 404
+
+    def events():
+        seen = 0
+        while True:
+            job = detection_jobs.wait(job_id, seen, timeout=15)
+            if job is None:
+                return
+
+            for result in job['results']:
+                yield f"event: result\ndata: {json.dumps(result)}\n\n"
+            seen += len(job['results'])
+
+            if job['status'] == 'done':
+                summary = {key: job[key] for key in ('job_id', 'total', 'completed', 'errors')}
+                yield f"event: done\ndata: {json.dumps(summary)}\n\n"
+                return
+
+            if not job['results']:
+                # Keep idle connections open through proxies
+                yield ": keep-alive\n\n"
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache'})
+
+@app.route('/volumes', methods=['POST'])
+def process_volumes():
+    """
+    Group stored slices into volumes by their ``volume_<N>_slice_<M>`` names and
+    process each volume as a unit.
+
+    The JSON body holds ``filenames``, optional ``steps`` (names accepted by
+    /process and /augment) and an optional ``detect`` flag. Normalization uses one
+    min/max per volume, skull stripping shares masks between neighbouring slices,
+    and detection runs once per volume. The final slices are stored under the
+    names /pipeline would give them.
+
+    Returns
+    -------
+    flask.Response
+        JSON response with one entry per volume listing its slices in order, and
+        the filenames that carry no volume and slice.
+    """
+    data = request.get_json()
+    filenames = data.get('filenames', [])
+    steps = data.get('steps', [])
+    detect = bool(data.get('detect', False))
+
+    if not filenames:
+        return jsonify({'error': 'Filenames are required'}), 400
+
+    unknown_steps = [step for step in steps if step not in PROCESSING_MAP and step not in AUGMENT_MAP]
+    if unknown_steps:
+        return jsonify({'error': f"Unknown step(s): {', '.join(unknown_steps)}"}), 400
+
+    if detect and model_loader.get() is None:
+        logger.error("YOLO model not loaded.")
+        return jsonify({'error': 'YOLO model not loaded'}), 500
+
+    volumes, ungrouped = group_slices(filenames)
+    results = []
+    for volume_id, slices in volumes.items():
+        loaded = []
+        for slice_index, filename in slices:
+            image = image_store.get(filename)
+            if image is None:
+                logger.warning(f"Image not found in store: {filename}")
+                continue
+            loaded.append((slice_index, filename, image))
+        if not loaded:
+            continue
+
+        try:
+            volume = Volume.from_slices(volume_id, loaded)
+            stack = process_volume(steps, volume)
+        except Exception as e:
+            logger.error(f"Processing failed for volume {volume_id}: {e}")
+            results.append({'volume': volume_id, 'error': str(e)})
+            continue
+
+        slice_results = []
+        for slice_index, filename, image in zip(volume.slice_indices, volume.names, stack):
+            name = filename
+            for step in steps:
+                name = f"{step}_{name}"
+            if steps:
+                image_store.set(name, image, timeout=3600)
+            slice_results.append({'filename': filename, 'slice': slice_index, 'image_url': f'/uploads/{name}'})
+
+        if detect:
+            detections = detect_tumors_batch([to_uint8(image) for image in stack])
+            for slice_result, (detected_image, tumor_detected, detection_info) in zip(slice_results, detections):
+                if detected_image is None:
+                    slice_result['error'] = 'Tumor detection failed'
+                    continue
+
+                detected_image_id = f"detected_{slice_result['image_url'].rsplit('/', 1)[1]}"
+                image_store.set(detected_image_id, detected_image, timeout=3600)
+                slice_result['detection'] = {
+                    'image_url': f'/uploads/{detected_image_id}',
+                    'tumor_detected': tumor_detected,
+                    'details': detection_info
+                }
+
+        results.append({'volume': volume_id, 'slices': slice_results})
+
+    if not any('slices' in result for result in results):
+        return jsonify({'error': 'Processing failed for all volumes', 'volumes': results,
+                        'ungrouped': ungrouped}), 400
+
+    return jsonify({'volumes': results, 'ungrouped': ungrouped}), 200
+
 #------------------------------------------------------------------------------
 # Static File Routes
 #------------------------------------------------------------------------------
@@ -528,4 +1270,5 @@ def favicon(filename: str):
 # MAIN ENTRY POINT
 #==============================================================================
 if __name__ == "__main__":
+    model_loader.start()
     app.run(debug=True, use_reloader=False)
\ No newline at end of file
@@ -0,0 +1,257 @@
+"""
+Augment stacks of images with randomly sampled geometric transforms.
+
+Rotation, scaling, shearing, flipping and translation are composed into one
+affine matrix per image, so every image is resampled once with a single
+``warpAffine`` instead of once per operator. Parameters are drawn per image
+from configurable ranges with a seeded generator, which makes runs repeatable.
+
+Usage
+-----
+    python -m src.augmentation.batch data/TumorDetectionYolov8/train --output data/augmented --copies 4
+"""
+import argparse
+import os
+import sys
+
+import cv2
+import numpy as np
+
+# Ranges each parameter is drawn from uniformly: degrees for rotation, fractions of
+# the image size for translation, factors for scale and shear, a probability for flip
+DEFAULT_RANGES = {
+    'rotation': (-15.0, 15.0),
+    'translate_x': (-0.1, 0.1),
+    'translate_y': (-0.1, 0.1),
+    'scale': (0.9, 1.1),
+    'shear': (-0.1, 0.1),
+    'flip': 0.0,
+}
+
+def sample_parameters(count, ranges=None, seed=None):
+    """
+    Draw augmentation parameters for a batch of images.
+
+    Parameters
+    ----------
+    count : int
+        Number of images.
+    ranges : dict, optional
+        Overrides of DEFAULT_RANGES. A single number instead of a (low, high)
+        pair fixes that parameter.
+    seed : int or numpy.random.Generator, optional
+        Seed or generator, for repeatable batches.
+
+    Returns
+    -------
+    dict of numpy.ndarray
+        One array of length count per parameter; 'flip' is boolean.
+    """
+    ranges = {**DEFAULT_RANGES, **(ranges or {})}
+    rng = np.random.default_rng(seed)
+
+    params = {}
+    for name, value in ranges.items():
+        if name == 'flip':
+            params[name] = rng.random(count) < value
+        elif np.isscalar(value):
+            params[name] = np.full(count, value, dtype=np.float64)
+        else:
+            params[name] = rng.uniform(value[0], value[1], count)
+    return params
+
+def affine_matrices(params, height, width):
+    """
+    Compose the sampled parameters into one affine matrix per image.
+
+    The image is flipped, sheared, scaled and rotated about its centre, then
+    translated. Angles follow ``cv2.getRotationMatrix2D``: positive is counter-clockwise.
+
+    Parameters
+    ----------
+    params : dict of numpy.ndarray
+        Parameters as returned by sample_parameters.
+    height, width : int
+        Image size.
+
+    Returns
+    -------
+    numpy.ndarray
+        Matrices of shape (N, 2, 3), float64, mapping source to destination pixels.
+    """
+    theta = np.deg2rad(params['rotation'])
+    cos, sin = np.cos(theta), np.sin(theta)
+    count = len(theta)
+
+    rotation = np.stack([np.stack([cos, sin], -1), np.stack([-sin, cos], -1)], 1)
+    shear = np.tile(np.eye(2), (count, 1, 1))
+    shear[:, 0, 1] = params['shear']
+    flip = np.tile(np.eye(2), (count, 1, 1))
+    flip[params['flip'], 0, 0] = -1
+
+    linear = rotation * params['scale'][:, None, None] @ shear @ flip
+
+    centre = np.array([width / 2, height / 2])
+    shift = np.stack([params['translate_x'] * width, params['translate_y'] * height], -1)
+
+    matrices = np.empty((count, 2, 3))
+    matrices[:, :, :2] = linear
+    matrices[:, :, 2] = centre + shift - linear @ centre
+    return matrices
+
+def augment_batch(images, ranges=None, seed=None, interpolation=cv2.INTER_LINEAR, border_value=0):
+    """
+    Apply an independently sampled geometric augmentation to every image of a stack.
+
+    Parameters
+    ----------
+    images : numpy.ndarray
+        Stack of shape (N, H, W) or (N, H, W, C).
+    ranges : dict, optional
+        Overrides of DEFAULT_RANGES.
+    seed : int or numpy.random.Generator, optional
+        Seed or generator for the parameters.
+    interpolation : int, optional
+        OpenCV interpolation flag.
+    border_value : int or float, optional
+        Fill value for pixels mapped from outside the image.
+
+    Returns
+    -------
+    tuple
+        (augmented stack with the input's shape and dtype, affine matrices of shape (N, 2, 3)).
+    """
+    count, height, width = images.shape[:3]
+    matrices = affine_matrices(sample_parameters(count, ranges, seed), height, width)
+
+    augmented = np.empty_like(images)
+    for image, matrix, out in zip(images, matrices, augmented):
+        cv2.warpAffine(image, matrix, (width, height), dst=out, flags=interpolation,
+                       borderMode=cv2.BORDER_CONSTANT, borderValue=border_value)
+    return augmented, matrices
+
+def transform_boxes(boxes, matrix, height, width, min_visible=0.25):
+    """
+    Map boxes through an affine matrix, taking the bounding box of the moved corners.
+
+    Parameters
+    ----------
+    boxes : numpy.ndarray
+        Boxes of shape (N, 4) as x1, y1, x2, y2 in pixels.
+    matrix : numpy.ndarray
+        Affine matrix of shape (2, 3).
+    height, width : int
+        Output image size; boxes are clipped to it.
+    min_visible : float, optional
+        Boxes keeping less than this fraction of their transformed area inside
+        the image are dropped.
+
+    Returns
+    -------
+    tuple
+        (transformed boxes, boolean mask of the input boxes that were kept).
+    """
+    x1, y1, x2, y2 = boxes.T
+    corners = np.stack([np.stack([x1, y1], -1), np.stack([x2, y1], -1),
+                        np.stack([x1, y2], -1), np.stack([x2, y2], -1)], 1)
+    moved = corners @ matrix[:, :2].T + matrix[:, 2]
+
+    transformed = np.concatenate([moved.min(axis=1), moved.max(axis=1)], axis=1)
+    area = np.prod(transformed[:, 2:] - transformed[:, :2], axis=1)
+    transformed[:, [0, 2]] = transformed[:, [0, 2]].clip(0, width)
+    transformed[:, [1, 3]] = transformed[:, [1, 3]].clip(0, height)
+    visible = np.prod(transformed[:, 2:] - transformed[:, :2], axis=1)
+
+    keep = visible >= min_visible * np.maximum(area, 1e-9)
+    return transformed[keep], keep
+
+def augment_split(split_dir, output_dir, copies=1, ranges=None, seed=0, batch_size=64):
+    """
+    Write augmented copies of a YOLO dataset split, with labels moved to match.
+
+    Parameters
+    ----------
+    split_dir : str
+        Split directory holding ``images`` and ``labels`` folders.
+    output_dir : str
+        Directory to write ``images`` and ``labels`` folders to.
+    copies : int, optional
+        Augmented copies written per source image.
+    ranges : dict, optional
+        Overrides of DEFAULT_RANGES.
+    seed : int, optional
+        Seed of the whole run.
+    batch_size : int, optional
+        Images of the same size augmented per stack.
+
+    Returns
+    -------
+    int
+        Number of images written.
+    """
+    from src.utils.data_loader import iter_split
+
+    os.makedirs(os.path.join(output_dir, 'images'), exist_ok=True)
+    os.makedirs(os.path.join(output_dir, 'labels'), exist_ok=True)
+    rng = np.random.default_rng(seed)
+    written = 0
+
+    def flush(batch):
+        nonlocal written
+        stack = np.stack([image for _, image, _ in batch])
+        height, width = stack.shape[1:3]
+        for copy in range(copies):
+            augmented, matrices = augment_batch(stack, ranges, rng)
+            for (path, _, labels), image, matrix in zip(batch, augmented, matrices):
+                name = f"{os.path.splitext(os.path.basename(path))[0]}_aug{copy}"
+                cv2.imwrite(os.path.join(output_dir, 'images', f"{name}.jpg"), image)
+
+                # YOLO labels are normalized centre x, centre y, width, height
+                scale = np.array([width, height, width, height])
+                xywh = labels[:, 1:] * scale
+                boxes = np.concatenate([xywh[:, :2] - xywh[:, 2:] / 2, xywh[:, :2] + xywh[:, 2:] / 2], axis=1)
+                boxes, keep = transform_boxes(boxes, matrix, height, width)
+                xywh = np.concatenate([(boxes[:, :2] + boxes[:, 2:]) / 2, boxes[:, 2:] - boxes[:, :2]], axis=1) / scale
+
+                with open(os.path.join(output_dir, 'labels', f"{name}.txt"), 'w') as f:
+                    for class_id, box in zip(labels[keep, 0], xywh):
+                        f.write(f"{int(class_id)} " + " ".join(f"{v:.6f}" for v in box) + "\n")
+                written += 1
+
+    # Only images of the same size can share a stack
+    batches = {}
+    for path, image, labels in iter_split(split_dir):
+        batch = batches.setdefault(image.shape, [])
+        batch.append((path, image, labels))
+        if len(batch) == batch_size:
+            flush(batch)
+            batches[image.shape] = []
+    for batch in batches.values():
+        if batch:
+            flush(batch)
+    return written
+
+def _parse_range(text):
+    values = [float(v) for v in text.split(',')]
+    return values[0] if len(values) == 1 else tuple(values)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('split', help='split directory with images and labels folders')
+    parser.add_argument('--output', required=True, help='directory to write the augmented split to')
+    parser.add_argument('--copies', type=int, default=1, help='augmented copies per image')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--batch-size', type=int, default=64)
+    for name, value in DEFAULT_RANGES.items():
+        default = value if np.isscalar(value) else f"{value[0]},{value[1]}"
+        parser.add_argument(f"--{name.replace('_', '-')}", type=_parse_range, default=None,
+                            help=f"'low,high' or a fixed value (default {default})")
+    args = parser.parse_args(argv)
+
+    ranges = {name: getattr(args, name) for name in DEFAULT_RANGES if getattr(args, name) is not None}
+    written = augment_split(args.split, args.output, max(1, args.copies), ranges, args.seed, max(1, args.batch_size))
+    print(f"Wrote {written} augmented image(s) to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
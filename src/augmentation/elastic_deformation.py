@@ -1,7 +1,77 @@
+from functools import lru_cache
+
 import numpy as np
 import cv2
 
-def elastic_transform(image, alpha):
+@lru_cache(maxsize=16)
+def _base_grid(height, width):
+    """
+    Pixel coordinate grids of an image size, built once per size.
+
+    Returns
+    -------
+    tuple
+        Read-only float32 arrays (x, y) of shape (height, width).
+    """
+    x, y = np.meshgrid(np.arange(width, dtype=np.float32), np.arange(height, dtype=np.float32))
+    x.flags.writeable = False
+    y.flags.writeable = False
+    return x, y
+
+def displacement_field(height, width, alpha, sigma=4.0, mode='smooth', random_state=None):
+    """
+    Draw a random displacement field.
+
+    Parameters
+    ----------
+    height, width : int
+        Image size.
+    alpha : float
+        Magnitude of the distortions: the largest displacement in pixels.
+    sigma : float, optional
+        Smoothness of the field in pixels ('smooth' mode only). Random offsets are
+        drawn on a coarse grid with this spacing, blurred, and upsampled, which
+        approximates Simard's Gaussian-filtered field at a fraction of the cost.
+    mode : str, optional
+        'smooth' for the smoothed field, 'jitter' for independent per-pixel offsets.
+    random_state : int or numpy.random.Generator, optional
+        Seed or generator.
+
+    Returns
+    -------
+    tuple
+        float32 arrays (dx, dy) of shape (height, width).
+    """
+    rng = np.random.default_rng(random_state)
+
+    if mode == 'jitter':
+        dx = rng.random((height, width), dtype=np.float32) * 2 - 1
+        dy = rng.random((height, width), dtype=np.float32) * 2 - 1
+        return dx * alpha, dy * alpha
+    if mode != 'smooth':
+        raise ValueError(f"Unknown elastic deformation mode: {mode}")
+
+    # One random offset per sigma x sigma cell, plus a border cell for the upsampling
+    cell = max(float(sigma), 1.0)
+    coarse_h, coarse_w = int(np.ceil(height / cell)) + 1, int(np.ceil(width / cell)) + 1
+    coarse = rng.random((2, coarse_h, coarse_w), dtype=np.float32) * 2 - 1
+
+    fields = []
+    for component in coarse:
+        component = cv2.GaussianBlur(component, (0, 0), sigmaX=1.0, borderType=cv2.BORDER_REFLECT_101)
+        # Blurring shrinks the offsets; rescale so alpha stays the largest displacement
+        component *= alpha / max(float(np.abs(component).max()), 1e-6)
+        fields.append(cv2.resize(component, (width, height), interpolation=cv2.INTER_CUBIC))
+    return fields[0], fields[1]
+
+def _remap_maps(height, width, alpha, sigma, mode, random_state):
+    x, y = _base_grid(height, width)
+    dx, dy = displacement_field(height, width, alpha, sigma, mode, random_state)
+    dx += x
+    dy += y
+    return dx, dy
+
+def elastic_transform(image, alpha, sigma=4.0, mode='jitter', random_state=None):
     """
     Apply elastic deformation to an image.
 
@@ -11,39 +81,70 @@ def elastic_transform(image, alpha):
         The input image.
     alpha : float
         Magnitude of the distortions.
+    sigma : float, optional
+        Smoothness of the distortions in pixels, for mode 'smooth'.
+    mode : str, optional
+        'jitter' moves every pixel independently; 'smooth' applies a Simard-style
+        smoothly varying deformation.
+    random_state : int or numpy.random.Generator, optional
+        Seed or generator, for repeatable deformations.
 
     Returns
     -------
     numpy.ndarray
-        The deformed image.
+        The deformed image, with the input's shape.
     """
-    # Create a random number generator with a seed of None for randomness
-    random_state = np.random.RandomState(None)
-
-    # Check if the image is grayscale
-    if len(image.shape) == 2:
-        image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
-
     # Get the height and width of the image
     height, width = image.shape[:2]
+    map_x, map_y = _remap_maps(height, width, alpha, sigma, mode, random_state)
 
-    # Generate random distortions for each pixel in the image
-    dx = (random_state.rand(height, width) * 2 - 1) * alpha
-    dy = (random_state.rand(height, width) * 2 - 1) * alpha
+    # Remap the image using the distorted coordinates; remap handles grayscale and
+    # color images alike, so no channel conversion is needed
+    # cv2.BORDER_REFLECT_101: Specifies how to handle pixels outside the image boundaries.
+    #  cv2.INTER_LINEAR: used to calculate the new pixel values
+    return cv2.remap(image, map_x, map_y, interpolation=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REFLECT_101)
 
-    # Create a meshgrid of x and y coordinates
-    x, y = np.meshgrid(np.arange(width), np.arange(height))
+def elastic_transform_batch(images, alpha, sigma=4.0, mode='smooth', shared=True, random_state=None):
+    """
+    Apply elastic deformation to a stack of same-sized images.
 
-    # Apply the distortions to the coordinates
-    map_x = np.float32(x + dx)
-    map_y = np.float32(y + dy)
+    Parameters
+    ----------
+    images : numpy.ndarray
+        Stack of shape (N, H, W) or (N, H, W, C).
+    alpha : float
+        Magnitude of the distortions.
+    sigma : float, optional
+        Smoothness of the distortions in pixels, for mode 'smooth'.
+    mode : str, optional
+        'smooth' or 'jitter', as for elastic_transform.
+    shared : bool, optional
+        Deform every image with the same field, e.g. the slices of a volume or an
+        image and its mask. The field is then computed, and converted to OpenCV's
+        fast fixed-point maps, once for the whole stack. Otherwise each image gets
+        its own field.
+    random_state : int or numpy.random.Generator, optional
+        Seed or generator.
 
-    # Remap the image using the distorted coordinates
-    # cv2.BORDER_REFLECT_101: Specifies how to handle pixels outside the image boundaries. 
-    #  cv2.INTER_LINEAR: used to calculate the new pixel values 
-    deformed = cv2.remap(image, map_x, map_y, interpolation=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REFLECT_101)
+    Returns
+    -------
+    numpy.ndarray
+        The deformed stack, with the input's shape and dtype.
+    """
+    height, width = images.shape[1:3]
+    rng = np.random.default_rng(random_state)
+    deformed = np.empty_like(images)
 
-    if len(image.shape) == 2:
-        deformed = cv2.cvtColor(deformed, cv2.COLOR_BGR2GRAY)
+    if shared:
+        map_x, map_y = _remap_maps(height, width, alpha, sigma, mode, rng)
+        map_1, map_2 = cv2.convertMaps(map_x, map_y, cv2.CV_16SC2)
+        for image, out in zip(images, deformed):
+            cv2.remap(image, map_1, map_2, interpolation=cv2.INTER_LINEAR,
+                      borderMode=cv2.BORDER_REFLECT_101, dst=out)
+        return deformed
 
+    for image, out in zip(images, deformed):
+        map_x, map_y = _remap_maps(height, width, alpha, sigma, mode, rng)
+        cv2.remap(image, map_x, map_y, interpolation=cv2.INTER_LINEAR,
+                  borderMode=cv2.BORDER_REFLECT_101, dst=out)
     return deformed
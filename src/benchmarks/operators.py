@@ -0,0 +1,318 @@
+"""
+Benchmark every preprocessing and augmentation operator.
+
+For each operator, image size and dtype this measures per-call latency
+percentiles, peak memory allocated by one call, and throughput when N threads
+run the operator concurrently. Results are written as JSON; passing a previous
+result with --baseline reports operators that got slower.
+
+Usage
+-----
+    python -m src.benchmarks.operators --output bench.json
+    python -m src.benchmarks.operators --output bench.json --baseline previous.json
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from src.augmentation import elastic_deformation
+from src.utils.data_loader import DATASET_DIR, list_images
+from src.utils.operators import AUGMENT_MAP, PROCESSING_MAP
+
+# The operators the web app runs, plus variants worth tracking that it does not expose
+OPERATORS = {
+    **PROCESSING_MAP,
+    **AUGMENT_MAP,
+    'elastic_deformation_smooth': lambda img: elastic_deformation.elastic_transform(img, alpha=8, sigma=4, mode='smooth'),
+}
+
+def load_inputs(image_dir, count, size, dtype):
+    """
+    Load dataset images resized to a square size and cast to a dtype.
+
+    Parameters
+    ----------
+    image_dir : str
+        Dataset split directory.
+    count : int
+        Number of images.
+    size : int
+        Side of the resized images.
+    dtype : str
+        'uint8' or 'float32' (float images keep the 0-255 range).
+
+    Returns
+    -------
+    list of numpy.ndarray
+        BGR images.
+    """
+    images = []
+    for path in list_images(image_dir)[:count]:
+        image = cv2.resize(cv2.imread(path), (size, size), interpolation=cv2.INTER_LINEAR)
+        images.append(image.astype(dtype))
+    return images
+
+def measure_latency(operator, images, repeats, warmup=2):
+    """
+    Time single calls of an operator.
+
+    Parameters
+    ----------
+    operator : callable
+        Operator taking one image.
+    images : list of numpy.ndarray
+        Inputs, used cyclically.
+    repeats : int
+        Timed calls.
+    warmup : int, optional
+        Untimed calls made first.
+
+    Returns
+    -------
+    dict
+        Mean and 50th/90th/99th percentile latency in ms.
+    """
+    for i in range(warmup):
+        operator(images[i % len(images)])
+
+    timings = np.empty(repeats)
+    for i in range(repeats):
+        image = images[i % len(images)]
+        start = time.perf_counter()
+        operator(image)
+        timings[i] = time.perf_counter() - start
+
+    timings *= 1000
+    return {
+        'mean_ms': float(timings.mean()),
+        'p50_ms': float(np.percentile(timings, 50)),
+        'p90_ms': float(np.percentile(timings, 90)),
+        'p99_ms': float(np.percentile(timings, 99)),
+    }
+
+def measure_peak_memory(operator, image):
+    """
+    Peak memory allocated through Python and NumPy while running an operator once.
+
+    Parameters
+    ----------
+    operator : callable
+        Operator taking one image.
+    image : numpy.ndarray
+        Input image.
+
+    Returns
+    -------
+    int
+        Peak traced allocation in bytes.
+    """
+    tracemalloc.start()
+    try:
+        operator(image)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+def measure_throughput(operator, images, threads, min_seconds=1.0, min_calls=20):
+    """
+    Run an operator from several threads at once for a minimum wall time.
+
+    After an untimed warmup pass of one call per thread, all threads start together
+    and call the operator until both ``min_seconds`` have passed and
+    ``min_calls`` calls have been made in total.
+
+    Parameters
+    ----------
+    operator : callable
+        Operator taking one image.
+    images : list of numpy.ndarray
+        Inputs, used cyclically.
+    threads : int
+        Concurrent threads.
+    min_seconds : float, optional
+        Minimum timed wall time.
+    min_calls : int, optional
+        Minimum number of timed calls across all threads.
+
+    Returns
+    -------
+    float
+        Images per second.
+    """
+    start_together = threading.Barrier(threads + 1)
+    calls_per_thread = -(-min_calls // threads)
+    deadline = None
+
+    def call_repeatedly(offset):
+        start_together.wait()
+        calls = 0
+        while calls < calls_per_thread or time.perf_counter() < deadline:
+            operator(images[(offset + calls * threads) % len(images)])
+            calls += 1
+        return calls
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        # Warmup pass, which also surfaces errors before any thread waits at the barrier
+        list(executor.map(operator, (images[i % len(images)] for i in range(threads))))
+
+        futures = [executor.submit(call_repeatedly, offset) for offset in range(threads)]
+        # Set before the barrier releases the threads that read it
+        deadline = time.perf_counter() + min_seconds
+        start_together.wait()
+        start = time.perf_counter()
+        calls = sum(future.result() for future in futures)
+        elapsed = time.perf_counter() - start
+    return calls / elapsed
+
+def run(operators, sizes, dtypes, thread_counts, image_dir, num_images, repeats, min_seconds=1.0):
+    """
+    Benchmark operators over every size and dtype combination.
+
+    Parameters
+    ----------
+    operators : list of str
+        Names from OPERATORS.
+    sizes : list of int
+        Square image sizes.
+    dtypes : list of str
+        Input dtypes.
+    thread_counts : list of int
+        Thread counts for the throughput measurement.
+    image_dir : str
+        Dataset split the inputs come from.
+    num_images : int
+        Distinct input images.
+    repeats : int
+        Timed calls per latency measurement.
+    min_seconds : float, optional
+        Minimum wall time of each throughput measurement.
+
+    Returns
+    -------
+    list of dict
+        One record per (operator, size, dtype). Operators that reject an input
+        type get an 'error' instead of measurements.
+    """
+    np.random.seed(0)
+    results = []
+    for size in sizes:
+        for dtype in dtypes:
+            images = load_inputs(image_dir, num_images, size, dtype)
+            for name in operators:
+                operator = OPERATORS[name]
+                record = {'operator': name, 'size': size, 'dtype': dtype}
+                try:
+                    record.update(measure_latency(operator, images, repeats))
+                    record['peak_bytes'] = measure_peak_memory(operator, images[0])
+                    record['throughput'] = {
+                        str(threads): measure_throughput(operator, images, threads, min_seconds)
+                        for threads in thread_counts
+                    }
+                except Exception as e:
+                    record['error'] = f"{type(e).__name__}: {e}"
+                results.append(record)
+                print(_format(record), flush=True)
+    return results
+
+def compare(results, baseline, tolerance):
+    """
+    Find operators whose median latency grew beyond a tolerance.
+
+    Parameters
+    ----------
+    results, baseline : list of dict
+        Records produced by run().
+    tolerance : float
+        Accepted relative slowdown, e.g. 0.2 for 20%.
+
+    Returns
+    -------
+    list of str
+        One line per regression.
+    """
+    previous = {(r['operator'], r['size'], r['dtype']): r for r in baseline if 'p50_ms' in r}
+    regressions = []
+    for record in results:
+        before = previous.get((record['operator'], record['size'], record['dtype']))
+        if before is None or 'p50_ms' not in record:
+            continue
+        change = record['p50_ms'] / before['p50_ms'] - 1
+        if change > tolerance:
+            regressions.append(f"{record['operator']} {record['size']}px {record['dtype']}: "
+                               f"p50 {before['p50_ms']:.2f} -> {record['p50_ms']:.2f} ms ({change:+.0%})")
+    return regressions
+
+def _format(record):
+    label = f"{record['operator']:<22}{record['size']:>5}px {record['dtype']:<8}"
+    if 'error' in record:
+        return f"{label} unsupported ({record['error'].splitlines()[0]})"
+    throughput = ', '.join(f"{threads}T {value:.0f}/s" for threads, value in record['throughput'].items())
+    return (f"{label} p50 {record['p50_ms']:8.2f} ms  p99 {record['p99_ms']:8.2f} ms  "
+            f"peak {record['peak_bytes'] / 1e6:7.2f} MB  {throughput}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--operators', default=','.join(OPERATORS), help='comma-separated operator names')
+    parser.add_argument('--sizes', default='128,256,512', help='comma-separated square image sizes')
+    parser.add_argument('--dtypes', default='uint8,float32', help='comma-separated input dtypes')
+    parser.add_argument('--threads', default=f"1,{os.cpu_count()}", help='comma-separated thread counts')
+    parser.add_argument('--images', default=os.path.join(DATASET_DIR, 'test'), help='dataset split to sample')
+    parser.add_argument('--num-images', type=int, default=8)
+    parser.add_argument('--repeats', type=int, default=30)
+    parser.add_argument('--min-seconds', type=float, default=1.0, help='wall time of each throughput run')
+    parser.add_argument('--output', default='bench.json')
+    parser.add_argument('--baseline', default=None, help='previous result file to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='accepted relative p50 slowdown')
+    args = parser.parse_args(argv)
+
+    operators = args.operators.split(',')
+    unknown = [name for name in operators if name not in OPERATORS]
+    if unknown:
+        parser.error(f"unknown operator(s): {', '.join(unknown)}")
+
+    results = run(
+        operators,
+        [int(size) for size in args.sizes.split(',')],
+        args.dtypes.split(','),
+        sorted({int(threads) for threads in args.threads.split(',')}),
+        args.images,
+        args.num_images,
+        args.repeats,
+        args.min_seconds,
+    )
+
+    with open(args.output, 'w') as f:
+        json.dump({
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'machine': {
+                'platform': platform.platform(),
+                'python': platform.python_version(),
+                'cpu_count': os.cpu_count(),
+                'numpy': np.__version__,
+                'opencv': cv2.__version__,
+                'opencv_threads': cv2.getNumThreads(),
+            },
+            'results': results,
+        }, f, indent=2)
+    print(f"Wrote {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f)['results'], args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
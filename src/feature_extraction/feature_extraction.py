@@ -1,6 +1,31 @@
+import threading
+
 import cv2
 import numpy as np
 
+# Window of the fixed-length HOG vector: square, close to the dataset's 132x139 slices
+HOG_WINDOW = (128, 128)
+
+# Descriptor objects are costly to build and not safe to share between threads,
+# so each thread keeps its own
+_local = threading.local()
+
+def _sift():
+    if not hasattr(_local, 'sift'):
+        _local.sift = cv2.SIFT_create()
+    return _local.sift
+
+def _hog():
+    if not hasattr(_local, 'hog'):
+        _local.hog = cv2.HOGDescriptor()
+    return _local.hog
+
+def _hog_window():
+    if not hasattr(_local, 'hog_window'):
+        # 16 px cells in 32 px blocks: 7 x 7 blocks of 4 cells x 9 bins = 1764 values
+        _local.hog_window = cv2.HOGDescriptor(HOG_WINDOW, (32, 32), (16, 16), (16, 16), 9)
+    return _local.hog_window
+
 def extract_histogram(image):
     """Extract color histogram features from an image."""
     histogram = cv2.calcHist([image], [0, 1, 2], None, [8, 8, 8],
@@ -10,17 +35,21 @@ def extract_histogram(image):
 def extract_sift_features(image):
     """Extract SIFT features from an image."""
     gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    sift = cv2.SIFT_create()
-    keypoints, descriptors = sift.detectAndCompute(gray, None)
+    keypoints, descriptors = _sift().detectAndCompute(gray, None)
     return keypoints, descriptors
 
 def extract_hog_features(image):
     """Extract HOG features from an image."""
     gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    hog = cv2.HOGDescriptor()
-    h = hog.compute(gray)
+    h = _hog().compute(gray)
     return h.flatten()
 
+def extract_hog_vector(image):
+    """Extract a fixed-length HOG vector from an image resized to HOG_WINDOW."""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    gray = cv2.resize(gray, HOG_WINDOW, interpolation=cv2.INTER_AREA)
+    return _hog_window().compute(gray).flatten()
+
 # Test code
 if __name__ == "__main__":
     # Load an example image
@@ -0,0 +1,293 @@
+"""
+Extract histogram, HOG and SIFT features for a directory of images into an on-disk store.
+
+Histogram and HOG vectors form one row each of a memory-mapped ``features.npy``
+matrix. SIFT descriptors, whose count varies per image, are concatenated in
+``sift.npy`` and located through ``sift_offsets.npy``. Rows are keyed by the
+image path relative to the dataset root; re-running only extracts new images.
+With ``--packed``, images are read from the splits' packed shards instead of
+being decoded from their files.
+
+Usage
+-----
+    python -m src.feature_extraction.feature_store data/TumorDetectionYolov8 --output features
+    python -m src.feature_extraction.feature_store data/TumorDetectionYolov8 --packed
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from src.feature_extraction.feature_extraction import extract_histogram, extract_hog_vector, extract_sift_features
+from src.utils import config
+from src.utils.data_loader import find_images, packed_sources, read_packed
+from src.utils.executor import prefetch
+
+# Columns of each feature group in the feature matrix
+HISTOGRAM_SIZE = 8 * 8 * 8
+HOG_SIZE = 1764
+COLUMNS = {'histogram': (0, HISTOGRAM_SIZE), 'hog': (HISTOGRAM_SIZE, HISTOGRAM_SIZE + HOG_SIZE)}
+FEATURE_SIZE = HISTOGRAM_SIZE + HOG_SIZE
+
+# SIFT descriptor values are integers in [0, 255], so they are stored as uint8
+SIFT_SIZE = 128
+
+def _init_worker():
+    # One image per worker at a time; the pool provides the parallelism
+    cv2.setNumThreads(1)
+
+def extract_features(root, relative_path, shard=None):
+    """
+    Extract the stored features of one image.
+
+    Parameters
+    ----------
+    root : str
+        Dataset root.
+    relative_path : str
+        Image path relative to root.
+    shard : tuple, optional
+        (shard directory, index) to read the decoded image from a packed split
+        instead of decoding the file.
+
+    Returns
+    -------
+    tuple
+        (relative_path, feature row or None, SIFT descriptors or None, error message or None).
+    """
+    try:
+        if shard is not None:
+            image = read_packed(*shard)[0]
+        else:
+            image = cv2.imread(os.path.join(root, relative_path), cv2.IMREAD_COLOR)
+        if image is None:
+            return relative_path, None, None, 'could not decode image'
+
+        row = np.concatenate([extract_histogram(image), extract_hog_vector(image)]).astype(np.float32)
+        _, descriptors = extract_sift_features(image)
+        if descriptors is None:
+            descriptors = np.empty((0, SIFT_SIZE), dtype=np.uint8)
+        return relative_path, row, descriptors.astype(np.uint8), None
+    except Exception as e:
+        return relative_path, None, None, str(e)
+
+def _grow(path, rows, width, dtype, capacity):
+    """
+    Open a memory-mapped .npy array with room for at least ``capacity`` rows,
+    keeping the first ``rows`` rows of any existing file.
+    """
+    if os.path.exists(path):
+        existing = np.load(path, mmap_mode='r+')
+        if existing.shape[0] >= capacity:
+            return existing
+    else:
+        existing = None
+
+    # Double the size so that repeated small runs do not copy the store every time
+    new_capacity = max(capacity, 2 * (existing.shape[0] if existing is not None else 0))
+    tmp_path = f"{path}.tmp"
+    grown = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=dtype, shape=(new_capacity, width))
+    if existing is not None and rows:
+        grown[:rows] = existing[:rows]
+    grown.flush()
+    del existing
+    os.replace(tmp_path, path)
+    return np.load(path, mmap_mode='r+')
+
+class FeatureStore:
+    """
+    Memory-mapped feature vectors and SIFT descriptors, keyed by image.
+
+    The arrays may hold spare rows past the last stored image; the key list in
+    ``index.json`` is written last and decides what is stored, so an interrupted
+    run never exposes half-written rows.
+
+    Attributes
+    ----------
+    root : str
+        Store directory.
+    keys : list of str
+        Image keys in row order.
+    """
+    def __init__(self, root):
+        self.root = root
+        self._index_path = os.path.join(root, 'index.json')
+        self.keys = []
+        self._sift_count = 0
+        if os.path.exists(self._index_path):
+            with open(self._index_path) as f:
+                index = json.load(f)
+            self.keys = index['keys']
+            self._sift_count = index['sift_count']
+        self._rows = {key: row for row, key in enumerate(self.keys)}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self._rows
+
+    def row(self, key):
+        """
+        Row of an image in the feature matrix.
+
+        Parameters
+        ----------
+        key : str
+            Image key.
+
+        Returns
+        -------
+        int or None
+            Row index, or None if the image is not stored.
+        """
+        return self._rows.get(key)
+
+    def features(self, group=None):
+        """
+        The feature matrix, memory-mapped read-only.
+
+        Parameters
+        ----------
+        group : str, optional
+            'histogram' or 'hog' to select those columns only.
+
+        Returns
+        -------
+        numpy.ndarray
+            float32 array of shape (len(self), width).
+        """
+        if not self.keys:
+            width = FEATURE_SIZE if group is None else COLUMNS[group][1] - COLUMNS[group][0]
+            return np.empty((0, width), dtype=np.float32)
+
+        matrix = np.load(os.path.join(self.root, 'features.npy'), mmap_mode='r')[:len(self.keys)]
+        if group is None:
+            return matrix
+        start, stop = COLUMNS[group]
+        return matrix[:, start:stop]
+
+    def sift(self, key):
+        """
+        SIFT descriptors of one image.
+
+        Parameters
+        ----------
+        key : str
+            Image key.
+
+        Returns
+        -------
+        numpy.ndarray or None
+            uint8 array of shape (keypoints, 128), or None if the image is not stored.
+        """
+        row = self.row(key)
+        if row is None:
+            return None
+        offsets = np.load(os.path.join(self.root, 'sift_offsets.npy'), mmap_mode='r')
+        descriptors = np.load(os.path.join(self.root, 'sift.npy'), mmap_mode='r')
+        return descriptors[offsets[row]:offsets[row + 1]]
+
+    def update(self, root, workers=os.cpu_count(), commit_every=256, packed=False):
+        """
+        Extract the features of every image below root that is not stored yet.
+
+        Parameters
+        ----------
+        root : str
+            Directory of images, searched recursively; keys are paths relative to it.
+        workers : int, optional
+            Extraction processes.
+        commit_every : int, optional
+            Images between index updates, bounding the work lost to an interruption.
+        packed : bool, optional
+            Read images from the packed shards of root's splits, packing them first if needed.
+
+        Returns
+        -------
+        dict
+            Counts of added, skipped and failed images, and throughput in images/second.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        todo = [path for path in find_images(root) if path not in self._rows]
+        skipped = len(self.keys)
+        added = failed = 0
+        start = time.perf_counter()
+        if not todo:
+            return {'added': 0, 'skipped': skipped, 'failed': 0, 'seconds': 0.0, 'images_per_second': 0.0}
+
+        features_path = os.path.join(self.root, 'features.npy')
+        sift_path = os.path.join(self.root, 'sift.npy')
+        offsets_path = os.path.join(self.root, 'sift_offsets.npy')
+
+        rows = len(self.keys)
+        matrix = _grow(features_path, rows, FEATURE_SIZE, np.float32, rows + len(todo))
+        sift = _grow(sift_path, self._sift_count, SIFT_SIZE, np.uint8, max(self._sift_count, 1))
+        offsets = list(np.load(offsets_path)[:rows + 1]) if rows else [0]
+
+        def commit():
+            matrix.flush()
+            sift.flush()
+            np.save(offsets_path, np.asarray(offsets, dtype=np.int64))
+            tmp_path = f"{self._index_path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump({'keys': self.keys, 'sift_count': self._sift_count, 'columns': COLUMNS}, f)
+            os.replace(tmp_path, self._index_path)
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 mp_context=multiprocessing.get_context('spawn')) as executor:
+            sources = packed_sources(root, workers) if packed else {}
+            items = ((root, path, sources.get(path)) for path in todo)
+            for relative_path, row, descriptors, error in prefetch(executor, extract_features, items, window=workers * 8):
+                if row is None:
+                    print(f"Skipping {relative_path}: {error}", file=sys.stderr)
+                    failed += 1
+                    continue
+
+                needed = self._sift_count + len(descriptors)
+                if needed > sift.shape[0]:
+                    sift = _grow(sift_path, self._sift_count, SIFT_SIZE, np.uint8, needed)
+                sift[self._sift_count:needed] = descriptors
+                self._sift_count = needed
+                offsets.append(needed)
+
+                matrix[len(self.keys)] = row
+                self._rows[relative_path] = len(self.keys)
+                self.keys.append(relative_path)
+                added += 1
+                if added % commit_every == 0:
+                    commit()
+            commit()
+
+        elapsed = time.perf_counter() - start
+        return {
+            'added': added,
+            'skipped': skipped,
+            'failed': failed,
+            'seconds': elapsed,
+            'images_per_second': added / elapsed if elapsed else 0.0
+        }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('root', help='directory of images, searched recursively')
+    parser.add_argument('--output', default=config.FEATURE_STORE_DIR, help='store directory')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='extraction processes')
+    parser.add_argument('--packed', action='store_true', help='read images from packed dataset shards')
+    args = parser.parse_args(argv)
+
+    store = FeatureStore(args.output)
+    summary = store.update(args.root, workers=max(1, args.workers), packed=args.packed)
+    print(f"Added {summary['added']} image(s) in {summary['seconds']:.1f} s "
+          f"({summary['images_per_second']:.1f} images/s), {summary['skipped']} already stored, "
+          f"{summary['failed']} failed; {len(store)} image(s) in {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,343 @@
+"""
+Build and query an inverted-file (IVF) index of the feature store for similar-case search.
+
+Histogram and HOG vectors are normalized, reduced with PCA and clustered with
+spherical k-means. A query is compared with the cluster centroids first and then
+only with the slices of its nprobe nearest clusters, instead of the whole dataset.
+
+Usage
+-----
+    python -m src.feature_extraction.similarity_index --dataset data/TumorDetectionYolov8
+    python -m src.feature_extraction.similarity_index --query volume_1_slice_100.jpg --k 5
+"""
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from src.feature_extraction.feature_extraction import extract_histogram, extract_hog_vector
+from src.feature_extraction.feature_store import COLUMNS, FeatureStore
+from src.utils import config
+from src.utils.data_loader import DATASET_DIR, label_path_for, read_yolo_labels
+
+INDEX_FILENAME = 'similarity_index.npz'
+
+def _normalize_rows(matrix):
+    return matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+def combine_features(features):
+    """
+    Weight the histogram and HOG columns of feature rows equally.
+
+    Parameters
+    ----------
+    features : numpy.ndarray
+        Rows laid out as in the feature store, shape (N, histogram + HOG).
+
+    Returns
+    -------
+    numpy.ndarray
+        float32 rows whose histogram and HOG parts each have norm 1/sqrt(2).
+    """
+    parts = [_normalize_rows(np.asarray(features[:, start:stop], dtype=np.float32))
+             for start, stop in COLUMNS.values()]
+    return np.concatenate(parts, axis=1) / np.sqrt(len(parts), dtype=np.float32)
+
+def spherical_kmeans(vectors, clusters, iterations=20, seed=0):
+    """
+    Cluster unit vectors by cosine similarity.
+
+    Parameters
+    ----------
+    vectors : numpy.ndarray
+        Unit rows of shape (N, D).
+    clusters : int
+        Number of clusters.
+    iterations : int, optional
+        Lloyd iterations.
+    seed : int, optional
+        Seed of the initial centroids.
+
+    Returns
+    -------
+    tuple
+        (centroids of shape (clusters, D), cluster of each vector).
+    """
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), clusters, replace=False)].copy()
+
+    for _ in range(iterations):
+        assignment = (vectors @ centroids.T).argmax(axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, vectors)
+        counts = np.bincount(assignment, minlength=clusters)
+
+        # Restart empty clusters from random vectors
+        empty = counts == 0
+        sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()), replace=False)]
+        centroids = _normalize_rows(sums)
+
+    return centroids, (vectors @ centroids.T).argmax(axis=1)
+
+class SimilarityIndex:
+    """
+    IVF index over PCA-reduced, unit-length feature vectors.
+
+    Vectors are stored grouped by cluster, with ``list_offsets`` marking where
+    each cluster's inverted list starts, so probing a cluster is a slice.
+
+    Attributes
+    ----------
+    keys : numpy.ndarray
+        Image key (path relative to the dataset root) of each indexed slice.
+    labels : numpy.ndarray
+        Boolean matrix of shape (N, num_classes): the tumor classes labelled on each slice.
+    class_names : list of str
+        Class name of each label column.
+    nprobe : int
+        Clusters searched per query.
+    """
+    def __init__(self, mean, components, centroids, vectors, ids, list_offsets, keys, labels, class_names,
+                 nprobe=8):
+        self.mean = mean
+        self.components = components
+        self.centroids = centroids
+        self.vectors = vectors
+        self.ids = ids
+        self.list_offsets = list_offsets
+        self.keys = keys
+        self.labels = labels
+        self.class_names = list(class_names)
+        self.nprobe = nprobe
+
+    def __len__(self):
+        return len(self.keys)
+
+    @classmethod
+    def build(cls, store, dataset_root=DATASET_DIR, dims=64, clusters=None, nprobe=8, seed=0):
+        """
+        Build an index over every image of a feature store.
+
+        Parameters
+        ----------
+        store : FeatureStore
+            Store whose keys are paths relative to dataset_root.
+        dataset_root : str, optional
+            Dataset root, used to read each slice's YOLO labels.
+        dims : int, optional
+            PCA dimensions kept.
+        clusters : int, optional
+            Inverted lists; defaults to 4 * sqrt(N).
+        nprobe : int, optional
+            Clusters searched per query.
+        seed : int, optional
+            Seed of the PCA sample and k-means initialization.
+
+        Returns
+        -------
+        SimilarityIndex
+            The built index.
+        """
+        features = combine_features(store.features())
+        rng = np.random.default_rng(seed)
+
+        # PCA from a sample is enough to find the main directions
+        mean = features.mean(axis=0)
+        sample = features[rng.choice(len(features), min(len(features), 5000), replace=False)] - mean
+        components = np.linalg.svd(sample, full_matrices=False)[2][:dims].astype(np.float32)
+        vectors = _normalize_rows((features - mean) @ components.T).astype(np.float32)
+
+        clusters = clusters or max(1, min(len(vectors), int(4 * np.sqrt(len(vectors)))))
+        centroids, assignment = spherical_kmeans(vectors, clusters, seed=seed)
+
+        order = np.argsort(assignment, kind='stable')
+        list_offsets = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=clusters))])
+
+        labels = np.zeros((len(store), len(config.CLASS_NAMES)), dtype=bool)
+        for row, key in enumerate(store.keys):
+            label_path = label_path_for(os.path.join(dataset_root, key))
+            if os.path.exists(label_path):
+                labels[row, read_yolo_labels(label_path)[:, 0].astype(int)] = True
+
+        return cls(mean.astype(np.float32), components, centroids.astype(np.float32), vectors[order],
+                   order.astype(np.int64), list_offsets.astype(np.int64), np.asarray(store.keys), labels,
+                   config.CLASS_NAMES, nprobe)
+
+    def save(self, path):
+        """
+        Write the index to an .npz file.
+
+        Parameters
+        ----------
+        path : str
+            Output path.
+        """
+        np.savez(path, mean=self.mean, components=self.components, centroids=self.centroids,
+                 vectors=self.vectors, ids=self.ids, list_offsets=self.list_offsets, keys=self.keys,
+                 labels=self.labels, class_names=np.asarray(self.class_names), nprobe=self.nprobe)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Read an index written by save.
+
+        Parameters
+        ----------
+        path : str
+            .npz file.
+
+        Returns
+        -------
+        SimilarityIndex
+            The loaded index.
+        """
+        with np.load(path) as data:
+            return cls(data['mean'], data['components'], data['centroids'], data['vectors'], data['ids'],
+                       data['list_offsets'], data['keys'], data['labels'], data['class_names'].tolist(),
+                       int(data['nprobe']))
+
+    def embed(self, features):
+        """
+        Project feature rows into the index space.
+
+        Parameters
+        ----------
+        features : numpy.ndarray
+            Rows laid out as in the feature store.
+
+        Returns
+        -------
+        numpy.ndarray
+            Unit vectors of shape (N, dims).
+        """
+        return _normalize_rows((combine_features(features) - self.mean) @ self.components.T)
+
+    def search(self, queries, k=5, nprobe=None):
+        """
+        Find the most similar indexed slices for each query vector.
+
+        Parameters
+        ----------
+        queries : numpy.ndarray
+            Unit vectors of shape (Q, dims), as returned by embed.
+        k : int, optional
+            Neighbours per query.
+        nprobe : int, optional
+            Clusters searched; defaults to the index's nprobe.
+
+        Returns
+        -------
+        list of tuple
+            One (rows, scores) per query, best first, where rows index keys and
+            labels and scores are cosine similarities.
+        """
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        probed = np.argpartition(-(queries @ self.centroids.T), nprobe - 1, axis=1)[:, :nprobe]
+
+        results = []
+        for query, lists in zip(queries, probed):
+            candidates = np.concatenate([np.arange(self.list_offsets[i], self.list_offsets[i + 1]) for i in lists])
+            scores = self.vectors[candidates] @ query
+            top = np.argpartition(-scores, k - 1)[:k] if len(scores) > k else np.arange(len(scores))
+            top = top[np.argsort(-scores[top])]
+            results.append((self.ids[candidates[top]], scores[top]))
+        return results
+
+    def similar_to_image(self, image, k=5):
+        """
+        Find the indexed slices most similar to an image.
+
+        Parameters
+        ----------
+        image : numpy.ndarray
+            BGR or grayscale image.
+        k : int, optional
+            Neighbours returned.
+
+        Returns
+        -------
+        list of dict
+            Key, cosine similarity and labelled tumor classes of each neighbour, best first.
+        """
+        if image.ndim == 2:
+            image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+        features = np.concatenate([extract_histogram(image), extract_hog_vector(image)])[None]
+        rows, scores = self.search(self.embed(features), k)[0]
+        return [{
+            'image': str(self.keys[row]),
+            'score': round(float(score), 4),
+            'labels': [name for name, present in zip(self.class_names, self.labels[row]) if present]
+        } for row, score in zip(rows, scores)]
+
+def measure_recall(index, queries=200, k=10, seed=0):
+    """
+    Compare the index against exhaustive search over the same vectors.
+
+    Parameters
+    ----------
+    index : SimilarityIndex
+        Index to check.
+    queries : int, optional
+        Indexed vectors used as queries.
+    k : int, optional
+        Neighbours compared.
+    seed : int, optional
+        Seed of the query sample.
+
+    Returns
+    -------
+    dict
+        Recall at k and mean milliseconds per query for the index and for exhaustive search.
+    """
+    rng = np.random.default_rng(seed)
+    sample = index.vectors[rng.choice(len(index.vectors), min(queries, len(index.vectors)), replace=False)]
+
+    start = time.perf_counter()
+    approximate = [index.search(query[None], k)[0][0] for query in sample]
+    index_ms = (time.perf_counter() - start) * 1000 / len(sample)
+
+    start = time.perf_counter()
+    exact = [index.ids[np.argsort(-(index.vectors @ query))[:k]] for query in sample]
+    exhaustive_ms = (time.perf_counter() - start) * 1000 / len(sample)
+
+    recall = np.mean([len(set(a) & set(b)) / len(b) for a, b in zip(approximate, exact)])
+    return {'recall': float(recall), 'index_ms': index_ms, 'exhaustive_ms': exhaustive_ms}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--store', default=config.FEATURE_STORE_DIR, help='feature store directory')
+    parser.add_argument('--dataset', default=DATASET_DIR, help='dataset root the store was built from')
+    parser.add_argument('--dims', type=int, default=64, help='PCA dimensions')
+    parser.add_argument('--clusters', type=int, default=None, help='inverted lists (default 4 * sqrt(N))')
+    parser.add_argument('--nprobe', type=int, default=8, help='lists searched per query')
+    parser.add_argument('--query', default=None, help='image to search for, instead of building')
+    parser.add_argument('--k', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    index_path = os.path.join(args.store, INDEX_FILENAME)
+    if args.query:
+        index = SimilarityIndex.load(index_path)
+        for match in index.similar_to_image(cv2.imread(args.query), args.k):
+            print(f"{match['score']:.4f}  {match['image']}  {', '.join(match['labels']) or 'no tumor'}")
+        return 0
+
+    store = FeatureStore(args.store)
+    if not len(store):
+        parser.error(f"feature store {args.store} is empty; run src.feature_extraction.feature_store first")
+
+    start = time.perf_counter()
+    index = SimilarityIndex.build(store, args.dataset, args.dims, args.clusters, args.nprobe)
+    index.save(index_path)
+    print(f"Indexed {len(index)} slice(s) in {len(index.centroids)} lists in "
+          f"{time.perf_counter() - start:.1f} s, wrote {index_path}")
+
+    report = measure_recall(index, k=10)
+    print(f"Recall@10 {report['recall']:.3f}, {report['index_ms']:.2f} ms/query "
+          f"(exhaustive {report['exhaustive_ms']:.2f} ms/query)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,298 @@
+import ast
+import logging
+import threading
+
+import cv2
+import numpy as np
+
+from src.utils import config
+
+logger = logging.getLogger(__name__)
+
+#==============================================================================
+# PRE- AND POST-PROCESSING
+#==============================================================================
+def letterbox(image, size, pad_value=114):
+    """
+    Resize an image to fit a square canvas, keeping its aspect ratio, and pad the rest.
+
+    Parameters
+    ----------
+    image : numpy.ndarray
+        Image of shape (height, width, 3), in either channel order.
+    size : int
+        Side of the square canvas.
+    pad_value : int, optional
+        Gray level of the padding.
+
+    Returns
+    -------
+    tuple
+        (canvas, ratio, (pad_left, pad_top)), where ratio is the resize factor
+        applied to the image.
+    """
+    h, w = image.shape[:2]
+    ratio = min(size / h, size / w)
+    new_w, new_h = int(round(w * ratio)), int(round(h * ratio))
+    pad_w, pad_h = (size - new_w) / 2, (size - new_h) / 2
+
+    if (new_w, new_h) != (w, h):
+        image = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+
+    # Split odd padding the same way Ultralytics does
+    top, bottom = int(round(pad_h - 0.1)), int(round(pad_h + 0.1))
+    left, right = int(round(pad_w - 0.1)), int(round(pad_w + 0.1))
+    canvas = cv2.copyMakeBorder(image, top, bottom, left, right, cv2.BORDER_CONSTANT,
+                                value=(pad_value, pad_value, pad_value))
+    return canvas, ratio, (left, top)
+
+def nms(boxes, scores, iou_threshold, over_smaller=False):
+    """
+    Greedy non-maximum suppression.
+
+    Parameters
+    ----------
+    boxes : numpy.ndarray
+        Boxes of shape (N, 4) as x1, y1, x2, y2.
+    scores : numpy.ndarray
+        Box scores of shape (N,).
+    iou_threshold : float
+        Boxes overlapping a kept box by more than this IoU are suppressed.
+    over_smaller : bool, optional
+        Measure overlap as intersection over the smaller box's area instead of
+        IoU, so that a box lying mostly inside a kept box is suppressed too.
+
+    Returns
+    -------
+    numpy.ndarray
+        Indices of the kept boxes, highest score first.
+    """
+    x1, y1, x2, y2 = boxes.T
+    areas = (x2 - x1) * (y2 - y1)
+    order = scores.argsort()[::-1]
+
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+
+        inter_w = np.clip(np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]), 0, None)
+        inter_h = np.clip(np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]), 0, None)
+        inter = inter_w * inter_h
+        if over_smaller:
+            iou = inter / (np.minimum(areas[i], areas[rest]) + 1e-9)
+        else:
+            iou = inter / (areas[i] + areas[rest] - inter + 1e-9)
+        order = rest[iou <= iou_threshold]
+
+    return np.asarray(keep, dtype=np.int64)
+
+def postprocess(output, conf, iou, max_det=300):
+    """
+    Turn one image's raw YOLOv8 head output into final detections.
+
+    Parameters
+    ----------
+    output : numpy.ndarray
+        Raw predictions of shape (4 + num_classes, num_anchors), boxes as
+        centre x, centre y, width, height.
+    conf : float
+        Minimum class score.
+    iou : float
+        NMS IoU threshold, applied per class.
+    max_det : int, optional
+        Maximum number of detections kept.
+
+    Returns
+    -------
+    tuple
+        (boxes, scores, class_ids) with boxes as x1, y1, x2, y2 in network input pixels.
+    """
+    predictions = output.T
+    class_scores = predictions[:, 4:]
+    class_ids = class_scores.argmax(axis=1)
+    scores = class_scores[np.arange(len(class_scores)), class_ids]
+
+    mask = scores > conf
+    xywh, scores, class_ids = predictions[mask, :4], scores[mask], class_ids[mask]
+
+    boxes = np.empty_like(xywh)
+    boxes[:, :2] = xywh[:, :2] - xywh[:, 2:] / 2
+    boxes[:, 2:] = xywh[:, :2] + xywh[:, 2:] / 2
+
+    # Offset boxes by class so a single NMS pass never suppresses across classes
+    keep = nms(boxes + class_ids[:, None] * 7680.0, scores, iou)[:max_det]
+    return boxes[keep], scores[keep], class_ids[keep]
+
+#==============================================================================
+# BACKENDS
+#==============================================================================
+class UltralyticsBackend:
+    """
+    Runs the detector through Ultralytics with PyTorch eager inference.
+
+    Attributes
+    ----------
+    names : dict
+        Class names by class id.
+    """
+    def __init__(self, weights_path, num_threads=config.MODEL_THREADS):
+        from ultralytics import YOLO
+
+        if num_threads > 0:
+            import torch
+            torch.set_num_threads(num_threads)
+
+        self._model = YOLO(weights_path)
+        self.names = dict(self._model.names)
+        # The Ultralytics predictor is not thread-safe; callers take turns
+        self._lock = threading.Lock()
+
+    def predict(self, images, conf, iou):
+        """
+        Detect objects in a batch of images.
+
+        Parameters
+        ----------
+        images : list of numpy.ndarray
+            BGR images as read by cv2, which may differ in size.
+        conf : float
+            Minimum box confidence.
+        iou : float
+            NMS IoU threshold.
+
+        Returns
+        -------
+        list of tuple
+            One (boxes, scores, class_ids) per image, boxes as x1, y1, x2, y2 in image pixels.
+        """
+        # Ultralytics takes NumPy arrays as BGR, like cv2
+        with self._lock:
+            results = self._model(images, conf=conf, iou=iou, verbose=False)
+
+        detections = []
+        for result in results:
+            boxes = result.boxes
+            detections.append((
+                boxes.xyxy.cpu().numpy(),
+                boxes.conf.cpu().numpy(),
+                boxes.cls.cpu().numpy().astype(np.int64)
+            ))
+        return detections
+
+class OnnxBackend:
+    """
+    Runs an exported YOLOv8 ONNX graph with ONNX Runtime.
+
+    Letterboxing, box decoding and NMS are done in NumPy, so serving needs
+    neither PyTorch nor Ultralytics. ``InferenceSession.run`` is thread-safe.
+
+    Attributes
+    ----------
+    names : dict
+        Class names by class id.
+    imgsz : int
+        Side of the square network input.
+    """
+    def __init__(self, onnx_path, imgsz=config.MODEL_IMGSZ, num_threads=config.MODEL_THREADS,
+                 providers=config.ONNX_PROVIDERS):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = num_threads
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+
+        available = ort.get_available_providers()
+        providers = [provider for provider in providers if provider in available] or ['CPUExecutionProvider']
+        self._session = ort.InferenceSession(onnx_path, sess_options=options, providers=providers)
+        logger.info(f"ONNX Runtime session using {self._session.get_providers()}")
+
+        model_input = self._session.get_inputs()[0]
+        self._input_name = model_input.name
+        # Exports without dynamic axes only accept one image per run
+        self._dynamic_batch = not isinstance(model_input.shape[0], int)
+
+        # Ultralytics exports record the input size and class names as metadata
+        metadata = self._session.get_modelmeta().custom_metadata_map
+        self.imgsz = int(ast.literal_eval(metadata['imgsz'])[0]) if 'imgsz' in metadata else imgsz
+        if 'names' in metadata:
+            self.names = ast.literal_eval(metadata['names'])
+        else:
+            self.names = dict(enumerate(config.CLASS_NAMES))
+
+    def predict(self, images, conf, iou):
+        """
+        Detect objects in a batch of images.
+
+        Parameters
+        ----------
+        images : list of numpy.ndarray
+            BGR images as read by cv2, which may differ in size.
+        conf : float
+            Minimum box confidence.
+        iou : float
+            NMS IoU threshold.
+
+        Returns
+        -------
+        list of tuple
+            One (boxes, scores, class_ids) per image, boxes as x1, y1, x2, y2 in image pixels.
+        """
+        if not images:
+            return []
+
+        canvases, transforms = [], []
+        for image in images:
+            canvas, ratio, pad = letterbox(image, self.imgsz)
+            canvases.append(canvas)
+            transforms.append((ratio, pad, image.shape[:2]))
+
+        # NHWC BGR uint8 -> NCHW RGB float32 in [0, 1], the input the exported graph expects
+        batch = np.ascontiguousarray(np.stack(canvases)[..., ::-1].transpose(0, 3, 1, 2), dtype=np.float32)
+        batch /= 255.0
+
+        if self._dynamic_batch:
+            outputs = self._session.run(None, {self._input_name: batch})[0]
+        else:
+            outputs = np.concatenate([self._session.run(None, {self._input_name: batch[i:i + 1]})[0]
+                                      for i in range(len(batch))])
+
+        detections = []
+        for output, (ratio, (pad_left, pad_top), (h, w)) in zip(outputs, transforms):
+            boxes, scores, class_ids = postprocess(output, conf, iou)
+
+            # Map boxes from the letterboxed canvas back onto the image
+            boxes -= (pad_left, pad_top, pad_left, pad_top)
+            boxes /= ratio
+            boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, w)
+            boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, h)
+            detections.append((boxes, scores, class_ids))
+        return detections
+
+def load_backend(backend=config.MODEL_BACKEND, model_path=config.MODEL_PATH):
+    """
+    Build the detector backend selected by configuration.
+
+    Parameters
+    ----------
+    backend : str, optional
+        'ultralytics' for PyTorch weights (.pt) or 'onnxruntime' for an exported graph (.onnx).
+    model_path : str, optional
+        Path of the weights or graph.
+
+    Returns
+    -------
+    UltralyticsBackend or OnnxBackend
+        The loaded backend.
+
+    Raises
+    ------
+    ValueError
+        If the backend is unknown.
+    """
+    if backend == 'ultralytics':
+        return UltralyticsBackend(model_path)
+    if backend == 'onnxruntime':
+        return OnnxBackend(model_path)
+    raise ValueError(f"Unknown model backend: {backend}")
@@ -0,0 +1,291 @@
+"""
+Run tumor detection over a directory of images without the web server.
+
+Worker processes decode (and optionally preprocess) images ahead of the model,
+which runs batched in the main process. Detections are appended to a JSONL file
+as each batch finishes, so an interrupted run picks up where it stopped.
+
+Usage
+-----
+    python -m src.models.bulk_detect data/TumorDetectionYolov8 --output detections.jsonl
+    python -m src.models.bulk_detect data/TumorDetectionYolov8 --preprocess normalization,skull_stripping \\
+        --output detections.parquet
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+
+from src.models.backends import load_backend
+from src.models.tiling import predict_tiled
+from src.utils import config
+from src.utils.data_loader import find_images
+from src.utils.executor import prefetch
+from src.utils.operators import PROCESSING_MAP
+
+def read_done(output_path):
+    """
+    Collect the images already recorded in a JSONL output file.
+
+    Parameters
+    ----------
+    output_path : str
+        JSONL file written by a previous run.
+
+    Returns
+    -------
+    set of str
+        Relative image paths already processed, including those recorded as failed.
+        A truncated last line is ignored.
+    """
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+
+    with open(output_path) as f:
+        for line in f:
+            try:
+                done.add(json.loads(line)['image'])
+            except (ValueError, KeyError):
+                continue
+    return done
+
+def repair_partial_line(output_path):
+    """
+    Truncate a JSONL file back to its last complete line.
+
+    A run killed mid-write leaves the last record without its newline; appending to it
+    would merge the next run's first record into the same unreadable line.
+
+    Parameters
+    ----------
+    output_path : str
+        JSONL file written by a previous run. Nothing is done if it does not exist.
+    """
+    if not os.path.exists(output_path):
+        return
+
+    with open(output_path, 'rb+') as f:
+        end = f.seek(0, os.SEEK_END)
+        position = end
+        while position > 0:
+            step = min(65536, position)
+            f.seek(position - step)
+            newline = f.read(step).rfind(b'\n')
+            if newline != -1:
+                position = position - step + newline + 1
+                break
+            position -= step
+        if position != end:
+            print(f"Dropping an incomplete record at the end of {output_path}", file=sys.stderr)
+            f.truncate(position)
+
+def _init_worker():
+    # Each worker decodes one image at a time; let the pool provide the parallelism
+    cv2.setNumThreads(1)
+
+def load_image(root, relative_path, steps):
+    """
+    Decode an image, apply preprocessing steps and prepare it for the model.
+
+    Parameters
+    ----------
+    root : str
+        Dataset root.
+    relative_path : str
+        Image path relative to root.
+    steps : list of str
+        Names of PROCESSING_MAP steps to apply, in order.
+
+    Returns
+    -------
+    tuple
+        (relative_path, BGR image or None, error message or None).
+    """
+    try:
+        image = cv2.imread(os.path.join(root, relative_path), cv2.IMREAD_COLOR)
+        if image is None:
+            return relative_path, None, 'could not decode image'
+
+        for step in steps:
+            image = PROCESSING_MAP[step](image)
+
+        if image.ndim == 2:
+            return relative_path, cv2.cvtColor(image, cv2.COLOR_GRAY2BGR), None
+        return relative_path, image, None
+    except Exception as e:
+        return relative_path, None, str(e)
+
+def write_parquet(jsonl_path, parquet_path):
+    """
+    Convert the JSONL detections to a Parquet file with one row per image.
+
+    Lines that do not decode, such as a record cut off by an interruption, are skipped.
+
+    Parameters
+    ----------
+    jsonl_path : str
+        Completed JSONL output.
+    parquet_path : str
+        Parquet file to write.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    records = []
+    with open(jsonl_path) as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+    pq.write_table(pa.Table.from_pylist(records), parquet_path)
+
+def run(root, output_path, steps, batch_size, workers, backend, conf, iou, report_every=20):
+    """
+    Detect tumors in every image below root that output_path does not already record.
+
+    Parameters
+    ----------
+    root : str
+        Directory of images.
+    output_path : str
+        JSONL file to append detections to.
+    steps : list of str
+        Preprocessing steps applied before detection.
+    batch_size : int
+        Images per model call.
+    workers : int
+        Decoding processes.
+    backend : object
+        Model backend with ``predict(images, conf, iou)`` and ``names``.
+    conf, iou : float
+        Detection thresholds.
+    report_every : int, optional
+        Batches between progress lines.
+
+    Returns
+    -------
+    dict
+        Counts of processed, skipped and failed images, and throughput in images/second.
+        Failed images are written as records with an ``error`` field and are not retried.
+    """
+    repair_partial_line(output_path)
+    done = read_done(output_path)
+    todo = [path for path in find_images(root) if path not in done]
+    print(f"{len(todo)} image(s) to process, {len(done)} already done")
+
+    processed = failed = 0
+    start = time.perf_counter()
+
+    # Spawn rather than fork: the parent already holds the model runtime's threads
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             mp_context=multiprocessing.get_context('spawn')) as executor, \
+            open(output_path, 'a') as out:
+
+        def write(record):
+            # Every record has the same fields so the Parquet schema does not depend on row order
+            out.write(json.dumps({'image': record['image'], 'height': None, 'width': None,
+                                  'tumor_detected': None, 'detections': [], 'error': None,
+                                  **record}) + '\n')
+
+        def flush(batch):
+            nonlocal processed
+            detections = predict_tiled(backend, [image for _, image in batch], conf, iou)
+            for (relative_path, image), (boxes, scores, class_ids) in zip(batch, detections):
+                write({
+                    'image': relative_path,
+                    'height': image.shape[0],
+                    'width': image.shape[1],
+                    'tumor_detected': bool(len(boxes)),
+                    'detections': [
+                        {'box': [round(float(v), 1) for v in box], 'confidence': round(float(score), 4),
+                         'type': backend.names[int(class_id)]}
+                        for box, score, class_id in zip(boxes, scores, class_ids)
+                    ]
+                })
+            # Flush per batch so an interruption loses at most one batch
+            out.flush()
+            processed += len(batch)
+
+        batch = []
+        batches = 0
+        items = ((root, path, steps) for path in todo)
+        for relative_path, image, error in prefetch(executor, load_image, items, window=batch_size * 4):
+            if image is None:
+                print(f"Skipping {relative_path}: {error}", file=sys.stderr)
+                # Record the failure so that resuming does not retry the image forever
+                write({'image': relative_path, 'error': error})
+                out.flush()
+                failed += 1
+                continue
+
+            batch.append((relative_path, image))
+            if len(batch) == batch_size:
+                flush(batch)
+                batch = []
+                batches += 1
+                if batches % report_every == 0:
+                    elapsed = time.perf_counter() - start
+                    print(f"{processed}/{len(todo)} images, {processed / elapsed:.1f} images/s")
+        if batch:
+            flush(batch)
+
+    elapsed = time.perf_counter() - start
+    return {
+        'processed': processed,
+        'skipped': len(done),
+        'failed': failed,
+        'seconds': elapsed,
+        'images_per_second': processed / elapsed if elapsed else 0.0
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('root', help='directory of images, searched recursively')
+    parser.add_argument('--output', default='detections.jsonl', help='.jsonl or .parquet output path')
+    parser.add_argument('--preprocess', default='', help=f"comma-separated steps from {sorted(PROCESSING_MAP)}")
+    parser.add_argument('--batch-size', type=int, default=config.DETECT_BATCH_SIZE)
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='decoding processes')
+    parser.add_argument('--backend', default=config.MODEL_BACKEND)
+    parser.add_argument('--model', default=config.MODEL_PATH)
+    parser.add_argument('--conf', type=float, default=config.DETECT_CONFIDENCE)
+    parser.add_argument('--iou', type=float, default=config.DETECT_IOU)
+    args = parser.parse_args(argv)
+
+    steps = [step for step in args.preprocess.split(',') if step]
+    unknown = [step for step in steps if step not in PROCESSING_MAP]
+    if unknown:
+        parser.error(f"unknown preprocessing step(s): {', '.join(unknown)}")
+
+    # Parquet cannot be appended to, so detections go to a JSONL log that is converted at the
+    # end; the log is kept so that later runs can resume from it
+    parquet_path = args.output if args.output.endswith('.parquet') else None
+    jsonl_path = f"{parquet_path}.jsonl" if parquet_path else args.output
+
+    # Fail before the run rather than after it when the Parquet writer is missing
+    if parquet_path:
+        try:
+            import pyarrow.parquet
+        except ImportError:
+            parser.error("Parquet output needs pyarrow (pip install pyarrow); use a .jsonl output instead")
+
+    backend = load_backend(args.backend, args.model)
+    summary = run(args.root, jsonl_path, steps, max(1, args.batch_size), max(1, args.workers),
+                  backend, args.conf, args.iou)
+    print(f"Processed {summary['processed']} image(s) in {summary['seconds']:.1f} s "
+          f"({summary['images_per_second']:.1f} images/s), {summary['skipped']} already done, "
+          f"{summary['failed']} failed")
+
+    if parquet_path:
+        write_parquet(jsonl_path, parquet_path)
+        print(f"Wrote {parquet_path}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
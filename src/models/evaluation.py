@@ -0,0 +1,251 @@
+import time
+
+import numpy as np
+
+# IoU thresholds of mAP50-95
+IOU_THRESHOLDS = np.linspace(0.5, 0.95, 10)
+
+def box_iou(a, b):
+    """
+    Pairwise IoU between two sets of x1, y1, x2, y2 boxes.
+
+    Parameters
+    ----------
+    a : numpy.ndarray
+        Boxes of shape (N, 4).
+    b : numpy.ndarray
+        Boxes of shape (M, 4).
+
+    Returns
+    -------
+    numpy.ndarray
+        IoU matrix of shape (N, M).
+    """
+    top_left = np.maximum(a[:, None, :2], b[None, :, :2])
+    bottom_right = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:] - b[:, :2], axis=1)
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+def labels_to_boxes(labels, height, width):
+    """
+    Convert normalized YOLO labels to pixel boxes.
+
+    Parameters
+    ----------
+    labels : numpy.ndarray
+        Array of shape (N, 5): class id, centre x, centre y, width, height.
+    height, width : int
+        Image size in pixels.
+
+    Returns
+    -------
+    tuple
+        (boxes, class_ids) with boxes as x1, y1, x2, y2 in pixels.
+    """
+    xywh = labels[:, 1:] * (width, height, width, height)
+    boxes = np.concatenate([xywh[:, :2] - xywh[:, 2:] / 2, xywh[:, :2] + xywh[:, 2:] / 2], axis=1)
+    return boxes, labels[:, 0].astype(np.int64)
+
+def match_predictions(pred_boxes, pred_classes, true_boxes, true_classes):
+    """
+    Mark each prediction as a true positive or not at every IoU threshold.
+
+    Each ground-truth box is matched to at most one prediction of its class,
+    highest IoU first.
+
+    Parameters
+    ----------
+    pred_boxes, true_boxes : numpy.ndarray
+        Boxes of shape (P, 4) and (T, 4).
+    pred_classes, true_classes : numpy.ndarray
+        Class ids of shape (P,) and (T,).
+
+    Returns
+    -------
+    numpy.ndarray
+        Boolean array of shape (P, len(IOU_THRESHOLDS)).
+    """
+    correct = np.zeros((len(pred_boxes), len(IOU_THRESHOLDS)), dtype=bool)
+    if not len(pred_boxes) or not len(true_boxes):
+        return correct
+
+    iou = box_iou(true_boxes, pred_boxes) * (true_classes[:, None] == pred_classes[None, :])
+    for i, threshold in enumerate(IOU_THRESHOLDS):
+        matches = np.argwhere(iou >= threshold)
+        if len(matches) > 1:
+            matches = matches[iou[matches[:, 0], matches[:, 1]].argsort()[::-1]]
+            matches = matches[np.unique(matches[:, 1], return_index=True)[1]]
+            matches = matches[np.unique(matches[:, 0], return_index=True)[1]]
+        correct[matches[:, 1], i] = True
+    return correct
+
+def average_precision(recall, precision):
+    """
+    Area under a precision-recall curve with 101-point interpolation.
+
+    Parameters
+    ----------
+    recall, precision : numpy.ndarray
+        Curve points ordered by decreasing confidence.
+
+    Returns
+    -------
+    float
+        Average precision.
+    """
+    recall = np.concatenate(([0.0], recall, [1.0]))
+    precision = np.concatenate(([1.0], precision, [0.0]))
+    # Precision envelope: best precision achievable at this recall or higher
+    precision = np.flip(np.maximum.accumulate(np.flip(precision)))
+
+    x = np.linspace(0, 1, 101)
+    y = np.interp(x, recall, precision)
+    return float(np.sum((x[1:] - x[:-1]) * (y[1:] + y[:-1]) / 2))
+
+def mean_average_precision(correct, scores, pred_classes, true_classes, num_classes):
+    """
+    Compute per-class AP at every IoU threshold.
+
+    Parameters
+    ----------
+    correct : numpy.ndarray
+        True-positive flags of shape (P, len(IOU_THRESHOLDS)) over the whole dataset.
+    scores, pred_classes : numpy.ndarray
+        Confidence and class id of each prediction.
+    true_classes : numpy.ndarray
+        Class id of every ground-truth box in the dataset.
+    num_classes : int
+        Number of classes.
+
+    Returns
+    -------
+    numpy.ndarray
+        AP array of shape (num_classes, len(IOU_THRESHOLDS)); NaN for classes without ground truth.
+    """
+    order = np.argsort(-scores)
+    correct, pred_classes = correct[order], pred_classes[order]
+
+    ap = np.full((num_classes, len(IOU_THRESHOLDS)), np.nan)
+    for class_id in range(num_classes):
+        num_true = int((true_classes == class_id).sum())
+        if num_true == 0:
+            continue
+
+        class_correct = correct[pred_classes == class_id]
+        true_positives = np.cumsum(class_correct, axis=0)
+        false_positives = np.cumsum(~class_correct, axis=0)
+        recall = true_positives / num_true
+        precision = true_positives / np.maximum(true_positives + false_positives, 1)
+        for i in range(len(IOU_THRESHOLDS)):
+            ap[class_id, i] = average_precision(recall[:, i], precision[:, i])
+    return ap
+
+def evaluate(backend, samples, conf=0.001, iou=0.7, batch_size=16):
+    """
+    Measure a detector backend's accuracy and latency on labelled images.
+
+    Parameters
+    ----------
+    backend : object
+        Model backend with ``predict(images, conf, iou)`` and ``names``.
+    samples : iterable
+        (BGR image, labels) pairs, labels as read by data_loader.read_yolo_labels.
+    conf : float, optional
+        Minimum box confidence; kept low so the whole precision-recall curve is measured.
+    iou : float, optional
+        NMS IoU threshold.
+    batch_size : int, optional
+        Images per predict() call.
+
+    Returns
+    -------
+    dict
+        Image count, mAP50, mAP50-95, AP50 per class and mean inference time per image in ms.
+    """
+    num_classes = len(backend.names)
+    all_correct, all_scores, all_pred_classes, all_true_classes = [], [], [], []
+    inference_seconds = 0.0
+    num_images = 0
+
+    def flush(batch):
+        nonlocal inference_seconds
+        start = time.perf_counter()
+        detections = backend.predict([image for image, _ in batch], conf, iou)
+        inference_seconds += time.perf_counter() - start
+
+        for (image, labels), (boxes, scores, class_ids) in zip(batch, detections):
+            true_boxes, true_classes = labels_to_boxes(labels, *image.shape[:2])
+            all_correct.append(match_predictions(boxes, class_ids, true_boxes, true_classes))
+            all_scores.append(scores)
+            all_pred_classes.append(class_ids)
+            all_true_classes.append(true_classes)
+
+    batch = []
+    for image, labels in samples:
+        batch.append((image, labels))
+        num_images += 1
+        if len(batch) == batch_size:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+
+    if not num_images:
+        raise ValueError("No images to evaluate.")
+
+    ap = mean_average_precision(
+        np.concatenate(all_correct), np.concatenate(all_scores),
+        np.concatenate(all_pred_classes), np.concatenate(all_true_classes), num_classes
+    )
+    return {
+        'images': num_images,
+        'map50': float(np.nanmean(ap[:, 0])),
+        'map50_95': float(np.nanmean(ap)),
+        'ap50_per_class': {backend.names[i]: float(ap[i, 0]) for i in range(num_classes)},
+        'ms_per_image': inference_seconds * 1000 / num_images
+    }
+
+def measure_latency(backend, images, conf=0.25, iou=0.7, batch_size=1, warmup=5, repeats=50):
+    """
+    Time predict() calls on a fixed set of images.
+
+    Parameters
+    ----------
+    backend : object
+        Model backend with ``predict(images, conf, iou)``.
+    images : list of numpy.ndarray
+        BGR images; batches are drawn from them cyclically.
+    conf, iou : float, optional
+        Detection thresholds.
+    batch_size : int, optional
+        Images per call.
+    warmup : int, optional
+        Untimed calls made first.
+    repeats : int, optional
+        Timed calls.
+
+    Returns
+    -------
+    dict
+        Median and 90th percentile latency per call in ms, and images per second.
+    """
+    batches = [[images[(i * batch_size + j) % len(images)] for j in range(batch_size)]
+               for i in range(warmup + repeats)]
+    for batch in batches[:warmup]:
+        backend.predict(batch, conf, iou)
+
+    timings = []
+    for batch in batches[warmup:]:
+        start = time.perf_counter()
+        backend.predict(batch, conf, iou)
+        timings.append(time.perf_counter() - start)
+
+    timings = np.asarray(timings)
+    return {
+        'batch_size': batch_size,
+        'p50_ms': float(np.percentile(timings, 50) * 1000),
+        'p90_ms': float(np.percentile(timings, 90) * 1000),
+        'images_per_second': float(batch_size * len(timings) / timings.sum())
+    }
@@ -0,0 +1,148 @@
+"""
+Export the YOLOv8 weights to ONNX and check the ONNX Runtime backend against Ultralytics.
+
+Usage
+-----
+    python -m src.models.export_onnx --weights "runs/detect 70_30/train/weights/best.pt"
+    python -m src.models.export_onnx --onnx "runs/detect 70_30/train/weights/best.onnx" --check-parity
+"""
+import argparse
+import glob
+import os
+import shutil
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from src.models.backends import OnnxBackend, UltralyticsBackend
+from src.models.evaluation import box_iou
+from src.utils import config
+
+def export_onnx(weights_path, output_path=None, imgsz=config.MODEL_IMGSZ):
+    """
+    Export YOLOv8 weights to an ONNX graph with a dynamic batch axis.
+
+    Parameters
+    ----------
+    weights_path : str
+        Path of the Ultralytics weights (.pt).
+    output_path : str, optional
+        Where to write the graph; defaults to the weights path with a .onnx suffix.
+    imgsz : int, optional
+        Square network input size.
+
+    Returns
+    -------
+    str
+        Path of the exported graph.
+    """
+    from ultralytics import YOLO
+
+    exported_path = YOLO(weights_path).export(format='onnx', imgsz=imgsz, dynamic=True, simplify=True)
+    if output_path and os.path.abspath(output_path) != os.path.abspath(exported_path):
+        shutil.move(exported_path, output_path)
+        exported_path = output_path
+    return exported_path
+
+def check_parity(weights_path, onnx_path, image_dir, conf=config.DETECT_CONFIDENCE, iou=config.DETECT_IOU,
+                 min_iou=0.9, max_score_diff=0.05):
+    """
+    Run both backends over a directory of images and compare their detections.
+
+    A reference box counts as matched when the ONNX backend returns a box of the
+    same class overlapping it by at least min_iou, with a score within max_score_diff.
+
+    Parameters
+    ----------
+    weights_path : str
+        Ultralytics weights (.pt).
+    onnx_path : str
+        Exported graph (.onnx).
+    image_dir : str
+        Directory of .jpg images.
+    conf : float, optional
+        Minimum box confidence.
+    iou : float, optional
+        NMS IoU threshold.
+    min_iou : float, optional
+        Overlap needed for two boxes to match.
+    max_score_diff : float, optional
+        Largest accepted confidence difference for matched boxes.
+
+    Returns
+    -------
+    dict
+        Image count, box counts, matched boxes, mismatching images and mean latency per backend.
+    """
+    reference = UltralyticsBackend(weights_path)
+    candidate = OnnxBackend(onnx_path)
+
+    paths = sorted(glob.glob(os.path.join(image_dir, '*.jpg')))
+    report = {'images': len(paths), 'reference_boxes': 0, 'candidate_boxes': 0, 'matched_boxes': 0,
+              'mismatched_images': [], 'ultralytics_ms': 0.0, 'onnxruntime_ms': 0.0}
+
+    for path in paths:
+        image = cv2.imread(path)
+
+        start = time.perf_counter()
+        ref_boxes, ref_scores, ref_classes = reference.predict([image], conf, iou)[0]
+        report['ultralytics_ms'] += (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        cand_boxes, cand_scores, cand_classes = candidate.predict([image], conf, iou)[0]
+        report['onnxruntime_ms'] += (time.perf_counter() - start) * 1000
+
+        matched = 0
+        if len(ref_boxes) and len(cand_boxes):
+            overlaps = box_iou(ref_boxes, cand_boxes)
+            same_class = ref_classes[:, None] == cand_classes[None, :]
+            close_score = np.abs(ref_scores[:, None] - cand_scores[None, :]) <= max_score_diff
+            matched = int(((overlaps >= min_iou) & same_class & close_score).any(axis=1).sum())
+
+        report['reference_boxes'] += len(ref_boxes)
+        report['candidate_boxes'] += len(cand_boxes)
+        report['matched_boxes'] += matched
+        if matched != len(ref_boxes) or len(cand_boxes) != len(ref_boxes):
+            report['mismatched_images'].append(os.path.basename(path))
+
+    if paths:
+        report['ultralytics_ms'] /= len(paths)
+        report['onnxruntime_ms'] /= len(paths)
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--weights', default='./runs/detect 70_30/train/weights/best.pt',
+                        help='Ultralytics weights to export and to compare against')
+    parser.add_argument('--onnx', default=None, help='ONNX graph path (exported to when --export is given)')
+    parser.add_argument('--export', action='store_true', help='export the weights before anything else')
+    parser.add_argument('--check-parity', action='store_true', help='compare both backends on --images')
+    parser.add_argument('--images', default='data/TumorDetectionYolov8/test/images')
+    parser.add_argument('--max-mismatch', type=float, default=0.02,
+                        help='largest accepted fraction of images whose detections differ')
+    args = parser.parse_args(argv)
+
+    onnx_path = args.onnx or os.path.splitext(args.weights)[0] + '.onnx'
+    if args.export or not os.path.exists(onnx_path):
+        onnx_path = export_onnx(args.weights, onnx_path)
+        print(f"Exported {args.weights} to {onnx_path}")
+
+    if not args.check_parity:
+        return 0
+
+    report = check_parity(args.weights, onnx_path, args.images)
+    mismatch_rate = len(report['mismatched_images']) / max(report['images'], 1)
+    print(f"Images: {report['images']}")
+    print(f"Boxes: ultralytics {report['reference_boxes']}, onnxruntime {report['candidate_boxes']}, "
+          f"matched {report['matched_boxes']}")
+    print(f"Mean latency: ultralytics {report['ultralytics_ms']:.1f} ms, "
+          f"onnxruntime {report['onnxruntime_ms']:.1f} ms")
+    print(f"Images with differing detections: {len(report['mismatched_images'])} ({mismatch_rate:.1%})")
+    for name in report['mismatched_images'][:20]:
+        print(f"  {name}")
+    return 0 if mismatch_rate <= args.max_mismatch else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
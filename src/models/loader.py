@@ -0,0 +1,133 @@
+import logging
+import threading
+import time
+
+import numpy as np
+
+from src.models.backends import load_backend
+from src.utils import config
+from src.utils.result_cache import file_digest
+
+logger = logging.getLogger(__name__)
+
+class ModelLoader:
+    """
+    Loads the detector on first use or in the background, and warms it up.
+
+    Nothing is imported or read from disk until ``load`` or ``start`` is called,
+    so importing the app stays fast. ``load`` may be called in a gunicorn master
+    before it forks (``preload_app``), so workers share the weights copy-on-write;
+    each worker then calls ``start`` to run the warmup in its own process.
+
+    Attributes
+    ----------
+    state : str
+        'idle', 'loading', 'loaded' (awaiting warmup), 'warming', 'ready' or 'failed'.
+    error : str or None
+        Why loading failed.
+    model_id : str or None
+        Digest of the model file, identifying the weights in memoized results.
+    """
+    def __init__(self, backend: str = config.MODEL_BACKEND, model_path: str = config.MODEL_PATH,
+                 warmup: bool = config.MODEL_WARMUP):
+        self.backend = backend
+        self.model_path = model_path
+        self.warmup_enabled = warmup
+        self.state = 'idle'
+        self.error = None
+        self.model_id = None
+        self._model = None
+        self._thread = None
+        self._lock = threading.Lock()
+        # Separate from _lock so that start() never waits for a load in progress
+        self._start_lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        """True once the model is loaded and warmed up."""
+        return self.state == 'ready'
+
+    def load(self):
+        """
+        Load the model if it is not loaded yet, waiting for a load in progress.
+
+        Returns
+        -------
+        object or None
+            The backend, or None if loading failed.
+        """
+        with self._lock:
+            # A failed load is not retried: the next requests would only pay for it again
+            if self.state == 'idle':
+                self.state = 'loading'
+                start = time.perf_counter()
+                try:
+                    logger.info(f"Loading YOLOv8 model with the {self.backend} backend...")
+                    self._model = load_backend(self.backend, self.model_path)
+                    self.model_id = file_digest(self.model_path)
+                    self.error = None
+                    # Without a warmup the model is ready as soon as it is loaded
+                    self.state = 'loaded' if self.warmup_enabled else 'ready'
+                    logger.info(f"Model loaded successfully in {time.perf_counter() - start:.1f} s.")
+                except Exception as e:
+                    logger.error(f"Error loading YOLOv8 model: {e}")
+                    self.state = 'failed'
+                    self.error = str(e)
+            return self._model
+
+    def get(self):
+        """
+        The model, loading it first if needed.
+
+        Returns
+        -------
+        object or None
+            The backend, or None if loading failed.
+        """
+        if self._model is not None:
+            return self._model
+        return self.load()
+
+    def warmup(self, batch_sizes: tuple = (1, 2)) -> None:
+        """
+        Run the model on synthetic inputs so the first request does not pay for
+        lazy initialization (layer fusion, kernel selection, memory pools).
+
+        Parameters
+        ----------
+        batch_sizes : tuple of int, optional
+            Batch sizes to run once each.
+        """
+        model = self.get()
+        if model is None:
+            return
+
+        self.state = 'warming'
+        start = time.perf_counter()
+        rng = np.random.default_rng(0)
+        try:
+            for batch_size in batch_sizes:
+                images = [rng.integers(0, 256, (config.MODEL_IMGSZ, config.MODEL_IMGSZ, 3), dtype=np.uint8)
+                          for _ in range(batch_size)]
+                model.predict(images, conf=config.DETECT_CONFIDENCE, iou=config.DETECT_IOU)
+            logger.info(f"Model warmed up in {time.perf_counter() - start:.1f} s.")
+        except Exception as e:
+            # A failed warmup only means the first request is slower
+            logger.warning(f"Model warmup failed: {e}")
+        self.state = 'ready'
+
+    def start(self) -> None:
+        """
+        Load (if needed) and warm up the model in a background thread.
+
+        Only the first call in a process starts the thread; later calls return immediately.
+        """
+        with self._start_lock:
+            if self._thread is not None or self.state == 'ready':
+                return
+            self._thread = threading.Thread(target=self._load_and_warm, name='model-loader', daemon=True)
+        self._thread.start()
+
+    def _load_and_warm(self) -> None:
+        if self.get() is not None and self.warmup_enabled:
+            self.warmup()
@@ -0,0 +1,206 @@
+"""
+Quantize the ONNX detector to static INT8 and compare it with FP32.
+
+Calibration uses a random sample of the training images; accuracy (mAP) and
+latency are measured on the validation split.
+
+Usage
+-----
+    python -m src.models.quantize --fp32 "runs/detect 70_30/train/weights/best.onnx"
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+
+import cv2
+import numpy as np
+
+from src.models.backends import OnnxBackend, letterbox
+from src.models.evaluation import evaluate, measure_latency
+from src.utils import config
+from src.utils.data_loader import DATASET_DIR, list_images, open_split
+
+class ImageCalibrationReader:
+    """
+    Feeds letterboxed dataset images to the ONNX Runtime calibrator, one per call.
+
+    Parameters
+    ----------
+    image_paths : list of str
+        Calibration images.
+    input_name : str
+        Name of the graph input.
+    imgsz : int
+        Square network input size.
+    """
+    def __init__(self, image_paths, input_name, imgsz=config.MODEL_IMGSZ):
+        self._image_paths = iter(image_paths)
+        self._input_name = input_name
+        self._imgsz = imgsz
+
+    def get_next(self):
+        path = next(self._image_paths, None)
+        if path is None:
+            return None
+
+        image = cv2.cvtColor(cv2.imread(path), cv2.COLOR_BGR2RGB)
+        canvas, _, _ = letterbox(image, self._imgsz)
+        batch = canvas.transpose(2, 0, 1)[None].astype(np.float32) / 255.0
+        return {self._input_name: batch}
+
+def head_nodes(model_path):
+    """
+    Find the nodes of the detection head (the last ``/model.N/`` block of an Ultralytics export).
+
+    Box decoding in the head is sensitive to quantization error, so it is kept in FP32.
+
+    Parameters
+    ----------
+    model_path : str
+        ONNX graph exported by Ultralytics.
+
+    Returns
+    -------
+    list of str
+        Node names of the head, empty if the graph does not use Ultralytics naming.
+    """
+    import onnx
+
+    graph = onnx.load(model_path).graph
+    indices = {}
+    for node in graph.node:
+        match = re.match(r'/model\.(\d+)/', node.name)
+        if match:
+            indices[node.name] = int(match.group(1))
+    if not indices:
+        return []
+
+    head_index = max(indices.values())
+    return [name for name, index in indices.items() if index == head_index]
+
+def quantize(fp32_path, int8_path, calibration_paths, exclude_head=True, imgsz=config.MODEL_IMGSZ):
+    """
+    Write a statically quantized INT8 (QDQ) copy of an ONNX detector.
+
+    Parameters
+    ----------
+    fp32_path : str
+        FP32 graph.
+    int8_path : str
+        Output path of the quantized graph.
+    calibration_paths : list of str
+        Images used to calibrate activation ranges.
+    exclude_head : bool, optional
+        Keep the detection head in FP32.
+    imgsz : int, optional
+        Square network input size.
+    """
+    import onnx
+    import onnxruntime as ort
+    from onnxruntime.quantization import CalibrationMethod, QuantFormat, QuantType, quantize_static
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    input_name = ort.InferenceSession(fp32_path, providers=['CPUExecutionProvider']).get_inputs()[0].name
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # Fold constants and infer shapes first, as recommended before static quantization
+        prepared_path = os.path.join(tmp_dir, 'prepared.onnx')
+        quant_pre_process(fp32_path, prepared_path, skip_symbolic_shape=True)
+
+        quantize_static(
+            prepared_path,
+            int8_path,
+            ImageCalibrationReader(calibration_paths, input_name, imgsz),
+            quant_format=QuantFormat.QDQ,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+            per_channel=True,
+            calibrate_method=CalibrationMethod.MinMax,
+            nodes_to_exclude=head_nodes(fp32_path) if exclude_head else [],
+        )
+
+    # Keep the export metadata (class names, input size) that OnnxBackend reads
+    fp32_model, int8_model = onnx.load(fp32_path), onnx.load(int8_path)
+    onnx.helper.set_model_props(int8_model, {prop.key: prop.value for prop in fp32_model.metadata_props})
+    onnx.save(int8_model, int8_path)
+
+def compare(fp32_path, int8_path, split_dir, batch_size=config.DETECT_BATCH_SIZE):
+    """
+    Evaluate the FP32 and INT8 graphs on a labelled split.
+
+    Parameters
+    ----------
+    fp32_path, int8_path : str
+        Graphs to compare.
+    split_dir : str
+        Split directory with ``images`` and ``labels``.
+    batch_size : int, optional
+        Batch size for the throughput measurement.
+
+    Returns
+    -------
+    dict
+        Accuracy and latency of each graph, keyed 'fp32' and 'int8'.
+    """
+    # Both graphs are evaluated on the split, so decode it once into a packed shard
+    split = open_split(split_dir)
+    sample_images = [split[index][1] for index in range(min(64, len(split)))]
+
+    report = {}
+    for name, path in (('fp32', fp32_path), ('int8', int8_path)):
+        backend = OnnxBackend(path)
+        report[name] = {
+            'accuracy': evaluate(backend, ((image, labels) for _, image, labels in split)),
+            'latency_batch_1': measure_latency(backend, sample_images, batch_size=1),
+            f'latency_batch_{batch_size}': measure_latency(backend, sample_images, batch_size=batch_size, repeats=10),
+        }
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--fp32', default='./runs/detect 70_30/train/weights/best.onnx', help='FP32 ONNX graph')
+    parser.add_argument('--output', default=None, help='INT8 graph path (default: <fp32>.int8.onnx)')
+    parser.add_argument('--calibration-split', default=os.path.join(DATASET_DIR, 'train'))
+    parser.add_argument('--calibration-images', type=int, default=300, help='number of calibration images')
+    parser.add_argument('--eval-split', default=os.path.join(DATASET_DIR, 'valid'))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--quantize-head', action='store_true', help='also quantize the detection head')
+    parser.add_argument('--skip-eval', action='store_true')
+    parser.add_argument('--report', default=None, help='write the comparison as JSON to this path')
+    args = parser.parse_args(argv)
+
+    int8_path = args.output or os.path.splitext(args.fp32)[0] + '.int8.onnx'
+    calibration_paths = list_images(args.calibration_split)
+    random.Random(args.seed).shuffle(calibration_paths)
+    calibration_paths = calibration_paths[:args.calibration_images]
+
+    print(f"Calibrating on {len(calibration_paths)} images from {args.calibration_split}")
+    quantize(args.fp32, int8_path, calibration_paths, exclude_head=not args.quantize_head)
+    print(f"Wrote {int8_path} ({os.path.getsize(int8_path) / 1e6:.1f} MB, "
+          f"FP32 {os.path.getsize(args.fp32) / 1e6:.1f} MB)")
+
+    if args.skip_eval:
+        return 0
+
+    report = compare(args.fp32, int8_path, args.eval_split)
+    for name, result in report.items():
+        accuracy = result['accuracy']
+        print(f"{name}: mAP50 {accuracy['map50']:.4f}, mAP50-95 {accuracy['map50_95']:.4f}, "
+              + ", ".join(f"{key[len('latency_'):]} p50 {value['p50_ms']:.1f} ms ({value['images_per_second']:.1f} img/s)"
+                          for key, value in result.items() if key.startswith('latency_')))
+    speedup = (report['int8']['latency_batch_1']['images_per_second']
+               / report['fp32']['latency_batch_1']['images_per_second'])
+    print(f"INT8 speedup at batch 1: {speedup:.2f}x, "
+          f"mAP50 change: {report['int8']['accuracy']['map50'] - report['fp32']['accuracy']['map50']:+.4f}")
+
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
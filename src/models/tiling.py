@@ -0,0 +1,198 @@
+import numpy as np
+
+from src.models.backends import nms
+from src.utils import config
+
+# Boxes of one tile that overlap another box by this fraction of the smaller box are merged
+MERGE_THRESHOLD = 0.5
+
+# Largest number of tiles and whole images passed to one predict() call
+MAX_BATCH = 64
+
+def tile_starts(length, tile, overlap):
+    """
+    Start offsets of tiles covering one image axis.
+
+    Parameters
+    ----------
+    length : int
+        Image size along the axis.
+    tile : int
+        Tile size.
+    overlap : int
+        Minimum overlap between neighbouring tiles.
+
+    Returns
+    -------
+    list of int
+        Offsets, evenly spread so that the first tile starts at 0 and the last ends at length.
+    """
+    if length <= tile:
+        return [0]
+    count = int(np.ceil((length - tile) / max(1, tile - overlap))) + 1
+    return np.linspace(0, length - tile, count).round().astype(int).tolist()
+
+def split_tiles(image, tile=config.MODEL_IMGSZ, overlap=config.DETECT_TILE_OVERLAP):
+    """
+    Cut an image into overlapping square tiles.
+
+    Parameters
+    ----------
+    image : numpy.ndarray
+        Image of shape (H, W) or (H, W, C).
+    tile : int, optional
+        Tile side; the detector's input size, so tiles are seen at full resolution.
+    overlap : int, optional
+        Minimum overlap between neighbouring tiles.
+
+    Returns
+    -------
+    tuple
+        (tiles, origins): views into the image, and the (x, y) offset of each.
+    """
+    height, width = image.shape[:2]
+    origins = [(x, y) for y in tile_starts(height, tile, overlap) for x in tile_starts(width, tile, overlap)]
+    return [image[y:y + tile, x:x + tile] for x, y in origins], origins
+
+def _join_cut_boxes(boxes, scores, class_ids, cut):
+    """
+    Replace overlapping cut boxes of the same class by their union, keeping the best score.
+
+    A lesion larger than the tile overlap is never seen whole; its pieces from
+    neighbouring tiles overlap across the seams and are joined back together.
+    """
+    boxes, scores = boxes.copy(), scores.copy()
+    alive = np.ones(len(boxes), dtype=bool)
+    merged = True
+    while merged:
+        merged = False
+        for i in np.flatnonzero(cut & alive):
+            for j in np.flatnonzero(cut & alive):
+                if j <= i or class_ids[i] != class_ids[j]:
+                    continue
+                if (min(boxes[i, 2], boxes[j, 2]) > max(boxes[i, 0], boxes[j, 0]) and
+                        min(boxes[i, 3], boxes[j, 3]) > max(boxes[i, 1], boxes[j, 1])):
+                    boxes[i, :2] = np.minimum(boxes[i, :2], boxes[j, :2])
+                    boxes[i, 2:] = np.maximum(boxes[i, 2:], boxes[j, 2:])
+                    scores[i] = max(scores[i], scores[j])
+                    alive[j] = False
+                    merged = True
+    return boxes[alive], scores[alive], class_ids[alive], cut[alive]
+
+def merge_tiles(detections, origins, image_shape, tile=config.MODEL_IMGSZ, edge_margin=2):
+    """
+    Combine the detections of an image's tiles into detections on the image.
+
+    A lesion crossing a seam is cut off in one tile but, if it fits within the
+    overlap, seen whole in its neighbour. Boxes touching an inner tile edge are
+    therefore ranked below whole ones, and a box lying mostly inside a better
+    ranked box of the same class is dropped. Overlapping cut boxes of one class,
+    the pieces of a lesion larger than the overlap, are first joined into one.
+
+    Parameters
+    ----------
+    detections : list of tuple
+        (boxes, scores, class_ids) per tile, boxes in tile pixels.
+    origins : list of tuple
+        (x, y) offset of each tile.
+    image_shape : tuple
+        Shape of the tiled image.
+    tile : int, optional
+        Tile side.
+    edge_margin : int, optional
+        Distance in pixels from an inner tile edge within which a box counts as cut.
+
+    Returns
+    -------
+    tuple
+        (boxes, scores, class_ids) with boxes as x1, y1, x2, y2 in image pixels, highest rank first.
+    """
+    height, width = image_shape[:2]
+    all_boxes, all_scores, all_classes, all_cut = [], [], [], []
+    for (boxes, scores, class_ids), (x, y) in zip(detections, origins):
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4) + np.float32([x, y, x, y])
+        cut = np.zeros(len(boxes), dtype=bool)
+        if x > 0:
+            cut |= boxes[:, 0] <= x + edge_margin
+        if y > 0:
+            cut |= boxes[:, 1] <= y + edge_margin
+        if x + tile < width:
+            cut |= boxes[:, 2] >= x + tile - edge_margin
+        if y + tile < height:
+            cut |= boxes[:, 3] >= y + tile - edge_margin
+
+        all_boxes.append(boxes)
+        all_scores.append(np.asarray(scores, dtype=np.float32))
+        all_classes.append(np.asarray(class_ids, dtype=np.int64))
+        all_cut.append(cut)
+
+    boxes, scores = np.concatenate(all_boxes), np.concatenate(all_scores)
+    class_ids, cut = np.concatenate(all_classes), np.concatenate(all_cut)
+    if not len(boxes):
+        return boxes, scores, class_ids
+    boxes, scores, class_ids, cut = _join_cut_boxes(boxes, scores, class_ids, cut)
+
+    # Whole boxes outrank cut ones whatever their score; scores lie in [0, 1]
+    rank = scores - cut
+    # Offset boxes by class so that boxes of different classes never suppress each other
+    offset = class_ids[:, None] * np.float32(max(height, width) + 1)
+    keep = nms(boxes + offset, rank, MERGE_THRESHOLD, over_smaller=True)
+    return boxes[keep], scores[keep], class_ids[keep]
+
+def predict_tiled(model, images, conf, iou, threshold=config.DETECT_TILE_THRESHOLD,
+                  tile=config.MODEL_IMGSZ, overlap=config.DETECT_TILE_OVERLAP, max_batch=MAX_BATCH):
+    """
+    Detect objects in images, tiling the ones larger than a threshold.
+
+    A drop-in replacement for ``model.predict``. Small images are passed to the
+    model whole; large ones are split into overlapping tiles at the detector's
+    input size, so small lesions keep their full resolution and the cost grows
+    with the image area rather than with a larger network input. The tiles of all
+    images are batched together.
+
+    Parameters
+    ----------
+    model : object
+        Backend with ``predict(images, conf, iou)``.
+    images : list of numpy.ndarray
+        BGR images.
+    conf : float
+        Minimum box confidence.
+    iou : float
+        NMS IoU threshold within each tile or whole image.
+    threshold : int, optional
+        Images whose longer side exceeds this are tiled; 0 disables tiling.
+    tile : int, optional
+        Tile side.
+    overlap : int, optional
+        Minimum overlap between neighbouring tiles.
+    max_batch : int, optional
+        Largest number of inputs per predict() call.
+
+    Returns
+    -------
+    list of tuple
+        One (boxes, scores, class_ids) per image, boxes as x1, y1, x2, y2 in image pixels.
+    """
+    inputs, owners, tiled = [], [], {}
+    for index, image in enumerate(images):
+        if threshold and max(image.shape[:2]) > threshold:
+            tiles, origins = split_tiles(image, tile, overlap)
+            tiled[index] = origins
+            inputs.extend(tiles)
+            owners.extend([index] * len(tiles))
+        else:
+            inputs.append(image)
+            owners.append(index)
+
+    outputs = []
+    max_batch = max(1, max_batch)
+    for start in range(0, len(inputs), max_batch):
+        outputs.extend(model.predict(inputs[start:start + max_batch], conf, iou))
+
+    per_image = [[] for _ in images]
+    for index, output in zip(owners, outputs):
+        per_image[index].append(output)
+
+    return [merge_tiles(per_image[index], tiled[index], images[index].shape, tile) if index in tiled
+            else per_image[index][0] for index in range(len(images))]
@@ -1,40 +1,108 @@
+from concurrent.futures import ThreadPoolExecutor
+
 import cv2
 import numpy as np
-import pywt
+
+from src.utils import config
+from src.utils.executor import in_worker_thread
+
+# Noise levels (standard deviation on the 0-255 scale) separating the denoisers:
+# below NOISE_FLOOR the image is returned as is, below NLM_THRESHOLD a bilateral
+# filter is enough, above it Non-Local Means is used
+NOISE_FLOOR = 2.55
+NLM_THRESHOLD = 8.0
+
+# Immerkaer's noise estimation kernel: the difference of two Laplacians, which
+# cancels image structure up to second order and leaves mostly noise
+_NOISE_KERNEL = np.array([[1, -2, 1], [-2, 4, -2], [1, -2, 1]], dtype=np.float32)
+
+# Threads denoising the tiles of one image: the same per-thread share of the thread
+# budget that an ImageExecutor worker gets, so a tiled call costs no more than one worker
+_TILE_WORKERS = max(1, config.THREAD_BUDGET // max(1, config.IMAGE_WORKERS))
+_tile_pool = ThreadPoolExecutor(max_workers=_TILE_WORKERS, thread_name_prefix='denoise')
+
+def estimate_noise(image, step=2):
+    """
+    Estimate the standard deviation of additive Gaussian noise in an image.
+
+    Uses Immerkaer's fast estimator: the mean absolute response of a Laplacian
+    difference kernel, evaluated on a subsampled image.
+
+    Parameters
+    ----------
+    image : numpy.ndarray
+        Grayscale image.
+    step : int, optional
+        Subsampling stride of the residual; 1 uses every pixel.
+
+    Returns
+    -------
+    float
+        Estimated noise sigma, in the image's intensity units.
+    """
+    residual = cv2.filter2D(image.astype(np.float32, copy=False), -1, _NOISE_KERNEL)
+    residual = residual[1:-1:step, 1:-1:step]
+    if residual.size == 0:
+        return 0.0
+    return float(np.sqrt(np.pi / 2) * np.abs(residual).mean() / 6)
 
 def has_noise(image, threshold=0.01):
     """
-    Determine if the image has significant noise using wavelet-based thresholding.
+    Determine if the image has significant noise.
 
     Parameters
     ----------
     image : numpy.ndarray
-        Input image.
+        Grayscale uint8 image.
     threshold : float, optional
-        Noise threshold level.
+        Noise threshold level, as a fraction of the 0-255 range.
 
     Returns
     -------
     bool
         True if noise level is above the threshold, otherwise False.
     """
-    # Convert image to grayscale if it's not already
-    if len(image.shape) == 3:
-        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return estimate_noise(image) / 255.0 > threshold
 
-    # Normalize the image for wavelet processing
-    image_float = image.astype(np.float32) / 255.0
+def _nlm_tiled(image, h, template_window, search_window, min_tile_rows=64):
+    """
+    Run Non-Local Means on horizontal strips of an image in parallel.
+
+    Each strip is extended by the radius of the search and template windows, so
+    every output pixel sees the same neighbourhood as in a whole-image run.
 
-    # Perform wavelet decomposition
-    coeffs = pywt.wavedec2(image_float, 'db1', level=1)
-    
-    # Estimate noise by calculating the median of the absolute detail coefficients
-    sigma_est = np.median(np.abs(coeffs[-1][0])) / 0.6745  # A robust noise estimation
-    return sigma_est > threshold
+    Images are only split when the caller is not already running in parallel: on an
+    image executor thread, or where OpenCV is limited to one thread (as in the bulk
+    detection workers), the whole image is denoised in the calling thread.
+    """
+    height = image.shape[0]
+    if in_worker_thread():
+        tiles = 1
+    else:
+        tiles = max(1, min(_TILE_WORKERS, cv2.getNumThreads(), height // min_tile_rows))
+    if tiles == 1:
+        return cv2.fastNlMeansDenoising(image, None, h=h, templateWindowSize=template_window,
+                                        searchWindowSize=search_window)
+
+    overlap = search_window // 2 + template_window // 2
+    bounds = np.linspace(0, height, tiles + 1).astype(int)
+
+    def denoise_strip(index):
+        top, bottom = bounds[index], bounds[index + 1]
+        start, stop = max(top - overlap, 0), min(bottom + overlap, height)
+        strip = cv2.fastNlMeansDenoising(image[start:stop], None, h=h, templateWindowSize=template_window,
+                                         searchWindowSize=search_window)
+        return strip[top - start:bottom - start]
+
+    return np.concatenate(list(_tile_pool.map(denoise_strip, range(tiles))))
 
 def reduce_noise(image):
     """
-    Apply Non-Local Means denoising to reduce noise in the image.
+    Reduce noise with a denoiser chosen by the estimated noise level.
+
+    Clean images are returned unchanged, lightly noisy ones get an edge-preserving
+    bilateral filter, and noisy ones Non-Local Means with a strength matched to the
+    noise, run tile-parallel.
 
     Parameters
     ----------
@@ -44,16 +112,20 @@ def reduce_noise(image):
     Returns
     -------
     numpy.ndarray
-        Noise-reduced image.
+        Noise-reduced grayscale image.
     """
     # Convert to grayscale for consistency
     if len(image.shape) == 3:
         image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
 
-    # Check for noise and apply denoising if needed
-    if has_noise(image):
-        # Apply Non-Local Means denoising
-        denoised_image = cv2.fastNlMeansDenoising(image, None, h=10, templateWindowSize=7, searchWindowSize=21)
-        return denoised_image
-    else:
-        return image  # Return original image if noise level is below threshold
\ No newline at end of file
+    sigma = estimate_noise(image)
+    if sigma <= NOISE_FLOOR:
+        return image  # Return original image if noise level is below threshold
+
+    if sigma <= NLM_THRESHOLD:
+        return cv2.bilateralFilter(image, d=5, sigmaColor=3 * sigma, sigmaSpace=3)
+
+    # Filter strength tracks the noise (the estimate runs slightly low on MRI slices). On the
+    # dataset a 21 px search window was never more accurate than 11 px, and is ~3x slower
+    h = float(np.clip(1.1 * sigma, 5, 30))
+    return _nlm_tiled(image, h, template_window=7, search_window=11)
@@ -1,4 +1,5 @@
 import cv2
+import numpy as np
 
 def normalize_image(image):
     """
@@ -16,3 +17,24 @@ def normalize_image(image):
     """
     normalized_image = cv2.normalize(image, None, 0, 255, cv2.NORM_MINMAX)
     return normalized_image
+
+def normalize_volume(stack):
+    """
+    Normalize all slices of a volume to the range [0, 255] with one shared min/max.
+
+    Unlike normalizing slice by slice, this keeps intensities comparable across
+    the volume and needs a single pass.
+
+    Parameters
+    ----------
+    stack : numpy.ndarray
+        Slices of shape (N, H, W) or (N, H, W, C).
+
+    Returns
+    -------
+    numpy.ndarray
+        The normalized stack, with the input's shape and dtype.
+    """
+    # A 2D view of the whole stack lets one cv2.normalize call see every slice
+    flat = np.ascontiguousarray(stack).reshape(-1, stack.shape[-1])
+    return cv2.normalize(flat, None, 0, 255, cv2.NORM_MINMAX).reshape(stack.shape)
@@ -24,14 +24,82 @@ def skull_strip(image):
     if len(image.shape) == 3:
         image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
 
+    mask = skull_mask(image)
+    skull_stripped_image = cv2.bitwise_and(image, image, mask=mask)
+    return skull_stripped_image
+
+def skull_mask(image):
+    """
+    Compute the brain mask of a grayscale image: the filled largest bright contour.
+
+    Parameters
+    ----------
+    image : numpy.ndarray
+        Grayscale uint8 image.
+
+    Returns
+    -------
+    numpy.ndarray
+        uint8 mask with 255 inside the brain.
+
+    Raises
+    ------
+    ValueError
+        If no contours are found in the image.
+    """
     thresh = cv2.threshold(image, 50, 255, cv2.THRESH_BINARY)[1]
     contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
     if len(contours) == 0:
         raise ValueError("No contours found in the image.")
-    
+
     largest_contour = max(contours, key=cv2.contourArea)
     mask = np.zeros_like(image)
     cv2.drawContours(mask, [largest_contour], -1, 255, cv2.FILLED)
-    skull_stripped_image = cv2.bitwise_and(image, image, mask=mask)
-    return skull_stripped_image
+    return mask
+
+def skull_strip_volume(stack, slice_indices=None, span=5):
+    """
+    Skull strip the slices of a volume, sharing one mask between neighbouring slices.
+
+    Neighbouring slices of a study have nearly the same brain outline. Slices are
+    split into runs covering at most span consecutive slice positions, and one
+    mask, computed on the run's maximum intensity projection, is applied to the
+    whole run.
+
+    Parameters
+    ----------
+    stack : numpy.ndarray
+        Slices of shape (N, H, W) or (N, H, W, 3), in slice order.
+    slice_indices : list of int, optional
+        Position of each slice in the study; defaults to consecutive slices.
+    span : int, optional
+        Slice positions covered by one mask; 1 computes a mask for every slice.
+
+    Returns
+    -------
+    numpy.ndarray
+        Skull-stripped grayscale slices of shape (N, H, W).
+
+    Raises
+    ------
+    ValueError
+        If a run has no contours.
+    """
+    if stack.ndim == 4:
+        stack = np.stack([cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) for image in stack])
+    if slice_indices is None:
+        slice_indices = list(range(len(stack)))
+
+    stripped = np.empty_like(stack)
+    start = 0
+    while start < len(stack):
+        end = start + 1
+        while end < len(stack) and slice_indices[end] - slice_indices[start] < span:
+            end += 1
 
+        # The brightest value of each pixel over the run outlines the brain of every slice in it
+        mask = skull_mask(stack[start:end].max(axis=0))
+        for position in range(start, end):
+            cv2.bitwise_and(stack[position], stack[position], dst=stripped[position], mask=mask)
+        start = end
+    return stripped
@@ -0,0 +1,96 @@
+import os
+import shutil
+import tarfile
+import tempfile
+import zipfile
+from typing import BinaryIO, Iterator, Optional
+
+from src.utils import config
+
+# Archive kind by file name suffix and by request content type
+ARCHIVE_EXTENSIONS = {
+    '.zip': 'zip',
+    '.tar': 'tar',
+    '.tar.gz': 'tar',
+    '.tgz': 'tar',
+    '.tar.bz2': 'tar',
+    '.tar.xz': 'tar',
+}
+ARCHIVE_MIMETYPES = {
+    'application/zip': 'zip',
+    'application/x-zip-compressed': 'zip',
+    'application/x-tar': 'tar',
+    'application/gzip': 'tar',
+    'application/x-gzip': 'tar',
+    'application/x-gtar': 'tar',
+}
+
+def archive_kind(filename: Optional[str] = None, mimetype: Optional[str] = None) -> Optional[str]:
+    """
+    Recognise an archive by its file name or content type.
+
+    Parameters
+    ----------
+    filename : str, optional
+        Uploaded file name.
+    mimetype : str, optional
+        Content type of the upload.
+
+    Returns
+    -------
+    str or None
+        'zip', 'tar', or None if the upload is not an archive.
+    """
+    if filename:
+        lower = filename.lower()
+        for extension, kind in ARCHIVE_EXTENSIONS.items():
+            if lower.endswith(extension):
+                return kind
+    return ARCHIVE_MIMETYPES.get(mimetype)
+
+def iter_archive(stream: BinaryIO, kind: str,
+                 max_entry_bytes: int = config.UPLOAD_MAX_ENTRY_BYTES) -> Iterator[tuple]:
+    """
+    Read the files of an archive one at a time.
+
+    Tar archives (optionally compressed) are read strictly sequentially from the
+    stream. ZIP archives keep their directory at the end, so a stream that cannot
+    seek is first spooled to a temporary file, kept in memory only while small.
+
+    Parameters
+    ----------
+    stream : file-like
+        Archive data.
+    kind : str
+        'zip' or 'tar'.
+    max_entry_bytes : int, optional
+        Larger entries are skipped without being read.
+
+    Yields
+    ------
+    tuple
+        (base name, file bytes) for every regular file of the archive.
+    """
+    if kind == 'tar':
+        with tarfile.open(fileobj=stream, mode='r|*') as archive:
+            for member in archive:
+                if member.isfile() and member.size <= max_entry_bytes:
+                    yield os.path.basename(member.name), archive.extractfile(member).read()
+        return
+
+    seekable = getattr(stream, 'seekable', lambda: False)()
+    spool = None
+    if not seekable:
+        spool = tempfile.SpooledTemporaryFile(max_size=config.UPLOAD_SPOOL_BYTES)
+        shutil.copyfileobj(stream, spool)
+        spool.seek(0)
+        stream = spool
+
+    try:
+        with zipfile.ZipFile(stream) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and info.file_size <= max_entry_bytes:
+                    yield os.path.basename(info.filename), archive.read(info)
+    finally:
+        if spool is not None:
+            spool.close()
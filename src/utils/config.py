@@ -0,0 +1,128 @@
+import os
+import tempfile
+
+#==============================================================================
+# INFERENCE
+#==============================================================================
+# Detector runtime: 'ultralytics' (PyTorch eager) or 'onnxruntime' (exported ONNX graph)
+MODEL_BACKEND = os.environ.get('NEUROSCAN_MODEL_BACKEND', 'ultralytics')
+
+# Weights (.pt) or graph (.onnx) loaded by the backend
+MODEL_PATH = os.environ.get(
+    'NEUROSCAN_MODEL_PATH',
+    './runs/detect 70_30/train/weights/best.onnx' if MODEL_BACKEND == 'onnxruntime'
+    else './runs/detect 70_30/train/weights/best.pt'
+)
+
+# Network input size the detector was trained at (runs/detect 70_30/train/args.yaml)
+MODEL_IMGSZ = int(os.environ.get('NEUROSCAN_MODEL_IMGSZ', 320))
+
+# Threads used inside one inference call (0 leaves the runtime's default)
+MODEL_THREADS = int(os.environ.get('NEUROSCAN_MODEL_THREADS', 0))
+
+# ONNX Runtime execution providers in order of preference, e.g.
+# 'OpenVINOExecutionProvider,CPUExecutionProvider'; unavailable ones are skipped
+ONNX_PROVIDERS = os.environ.get('NEUROSCAN_ONNX_PROVIDERS', 'CPUExecutionProvider').split(',')
+
+# Class names, in class id order (data/TumorDetectionYolov8/data.yaml)
+CLASS_NAMES = ['Glioma', 'Meningioma', 'Pituitary']
+
+# Minimum box confidence and NMS IoU threshold (Ultralytics defaults)
+DETECT_CONFIDENCE = float(os.environ.get('NEUROSCAN_DETECT_CONFIDENCE', 0.25))
+DETECT_IOU = float(os.environ.get('NEUROSCAN_DETECT_IOU', 0.7))
+
+# Run the model on synthetic inputs after loading, before /readyz reports ready
+MODEL_WARMUP = os.environ.get('NEUROSCAN_MODEL_WARMUP', '1') == '1'
+
+# Maximum number of images grouped into a single model call by /detect
+DETECT_BATCH_SIZE = int(os.environ.get('NEUROSCAN_DETECT_BATCH_SIZE', 16))
+
+# Images whose longer side exceeds this many pixels are detected in overlapping
+# MODEL_IMGSZ tiles at full resolution instead of being shrunk whole (0 disables tiling)
+DETECT_TILE_THRESHOLD = int(os.environ.get('NEUROSCAN_DETECT_TILE_THRESHOLD', 1024))
+
+# Minimum overlap between neighbouring tiles, in pixels; lesions up to this size are
+# seen whole by at least one tile
+DETECT_TILE_OVERLAP = int(os.environ.get('NEUROSCAN_DETECT_TILE_OVERLAP', 64))
+
+#==============================================================================
+# IMAGE STORE
+#==============================================================================
+# Upper bound on the pixel bytes held by the image store before LRU eviction
+STORE_MAX_BYTES = int(os.environ.get('NEUROSCAN_STORE_MAX_MB', 1024)) * 1024 * 1024
+
+# Seconds between background sweeps for expired images (0 disables the sweeper)
+STORE_SWEEP_INTERVAL = float(os.environ.get('NEUROSCAN_STORE_SWEEP_INTERVAL', 60))
+
+# 'memory' keeps images in each process; 'shared' memory-maps them from
+# STORE_SHARED_DIR so every gunicorn worker can serve every upload
+STORE_BACKEND = os.environ.get('NEUROSCAN_STORE_BACKEND', 'memory')
+
+# Store images compactly: 3-channel images with identical channels as 1 channel, and
+# float, bool and wider integer images clipped to uint8, as they are served and detected
+STORE_COMPACT = os.environ.get('NEUROSCAN_STORE_COMPACT', '1') == '1'
+
+# Seconds an image may go unread before the in-process store keeps it PNG-compressed,
+# decoding it again on the next read (0 disables compression)
+STORE_COMPRESS_AFTER = float(os.environ.get('NEUROSCAN_STORE_COMPRESS_AFTER', 0))
+
+# Directory for the shared store's image files and index (RAM-backed when /dev/shm exists)
+STORE_SHARED_DIR = os.environ.get(
+    'NEUROSCAN_STORE_SHARED_DIR',
+    '/dev/shm/neuroscan' if os.path.isdir('/dev/shm') else os.path.join(tempfile.gettempdir(), 'neuroscan')
+)
+
+#==============================================================================
+# BACKGROUND JOBS
+#==============================================================================
+# Worker threads running queued detection jobs
+JOB_WORKERS = int(os.environ.get('NEUROSCAN_JOB_WORKERS', 2))
+
+# Seconds a finished job's results stay available for polling
+JOB_RETENTION = float(os.environ.get('NEUROSCAN_JOB_RETENTION', 3600))
+
+# Default encoding of images served by /uploads/<filename>: 'jpg', 'png' or 'webp'
+IMAGE_FORMAT = os.environ.get('NEUROSCAN_IMAGE_FORMAT', 'jpg')
+
+# Largest single image accepted from an uploaded ZIP or tar archive
+UPLOAD_MAX_ENTRY_BYTES = int(os.environ.get('NEUROSCAN_UPLOAD_MAX_ENTRY_MB', 64)) * 1024 * 1024
+
+# ZIP archives need random access; bodies larger than this are spooled to disk first
+UPLOAD_SPOOL_BYTES = int(os.environ.get('NEUROSCAN_UPLOAD_SPOOL_MB', 32)) * 1024 * 1024
+
+#==============================================================================
+# RESULT CACHE
+#==============================================================================
+# Upper bound on the bytes held by memoized detection and preprocessing results
+RESULT_CACHE_MAX_BYTES = int(os.environ.get('NEUROSCAN_RESULT_CACHE_MAX_MB', 256)) * 1024 * 1024
+
+#==============================================================================
+# PARALLELISM
+#==============================================================================
+# Threads that process the images of one /process, /augment or /pipeline request in parallel
+IMAGE_WORKERS = int(os.environ.get('NEUROSCAN_IMAGE_WORKERS', min(4, os.cpu_count() or 1)))
+
+# Total CPU threads image processing may use; OpenCV gets an equal share per pool thread
+THREAD_BUDGET = int(os.environ.get('NEUROSCAN_THREAD_BUDGET', os.cpu_count() or 1))
+
+#==============================================================================
+# FEATURES
+#==============================================================================
+# Directory of the feature store written by src.feature_extraction.feature_store
+FEATURE_STORE_DIR = os.environ.get('NEUROSCAN_FEATURE_STORE_DIR', './features')
+
+#==============================================================================
+# PROFILING
+#==============================================================================
+# Secret that enables profiling a single /detect, /process or /augment request, sent as the
+# X-Profile header or ?profile= parameter (empty disables profiling)
+PROFILE_TOKEN = os.environ.get('NEUROSCAN_PROFILE_TOKEN', '')
+
+# Directory that collapsed stacks and allocation reports of profiled requests are written to
+PROFILE_DIR = os.environ.get('NEUROSCAN_PROFILE_DIR', './profiles')
+
+# Seconds between stack samples of a profiled request
+PROFILE_INTERVAL = float(os.environ.get('NEUROSCAN_PROFILE_INTERVAL', 0.005))
+
+# Allocation sites listed in the report of a profiled request
+PROFILE_TOP_ALLOCATIONS = int(os.environ.get('NEUROSCAN_PROFILE_TOP_ALLOCATIONS', 15))
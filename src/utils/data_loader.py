@@ -0,0 +1,431 @@
+import os
+import glob
+import uuid
+import hashlib
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+# Dataset in YOLO layout: <split>/images/*.jpg with matching <split>/labels/*.txt
+DATASET_DIR = 'data/TumorDetectionYolov8'
+
+# Extensions find_images picks up
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+def list_images(split_dir):
+    """
+    List the images of a dataset split.
+
+    Parameters
+    ----------
+    split_dir : str
+        Split directory holding an ``images`` folder, e.g. data/TumorDetectionYolov8/valid.
+
+    Returns
+    -------
+    list of str
+        Sorted image paths.
+    """
+    return sorted(glob.glob(os.path.join(split_dir, 'images', '*.jpg')))
+
+def label_path_for(image_path):
+    """
+    Locate the YOLO label file of an image.
+
+    Parameters
+    ----------
+    image_path : str
+        Path of an image inside an ``images`` folder.
+
+    Returns
+    -------
+    str
+        Path of the matching ``.txt`` file in the sibling ``labels`` folder.
+    """
+    images_dir, name = os.path.split(image_path)
+    return os.path.join(os.path.dirname(images_dir), 'labels', os.path.splitext(name)[0] + '.txt')
+
+def read_yolo_labels(label_path):
+    """
+    Read a YOLO label file.
+
+    Parameters
+    ----------
+    label_path : str
+        Path of the label file. A missing file means the image has no objects.
+
+    Returns
+    -------
+    numpy.ndarray
+        Array of shape (N, 5) holding class id, centre x, centre y, width and
+        height, the last four normalized to [0, 1].
+    """
+    if not os.path.exists(label_path):
+        return np.zeros((0, 5), dtype=np.float32)
+
+    with open(label_path) as f:
+        rows = [line.split() for line in f if line.strip()]
+    return np.asarray(rows, dtype=np.float32).reshape(-1, 5)
+
+def find_images(root):
+    """
+    List every image below a directory.
+
+    Parameters
+    ----------
+    root : str
+        Directory to search recursively.
+
+    Returns
+    -------
+    list of str
+        Sorted image paths relative to root.
+    """
+    found = []
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            if filename.lower().endswith(IMAGE_EXTENSIONS):
+                found.append(os.path.relpath(os.path.join(dirpath, filename), root))
+    return sorted(found)
+
+def iter_split(split_dir):
+    """
+    Read a dataset split image by image.
+
+    Parameters
+    ----------
+    split_dir : str
+        Split directory holding ``images`` and ``labels`` folders.
+
+    Yields
+    ------
+    tuple
+        (image_path, BGR image, labels) for every image of the split.
+    """
+    for image_path in list_images(split_dir):
+        yield image_path, cv2.imread(image_path), read_yolo_labels(label_path_for(image_path))
+
+#==============================================================================
+# PACKED SHARDS
+#==============================================================================
+# Bump when the shard layout changes, so old shards are rebuilt
+SHARD_VERSION = 2
+
+def shard_dir_for(split_dir):
+    """
+    Locate the packed shard of a dataset split.
+
+    Parameters
+    ----------
+    split_dir : str
+        Split directory holding ``images`` and ``labels`` folders.
+
+    Returns
+    -------
+    str
+        Shard directory, kept next to the split's ``images`` folder.
+    """
+    return os.path.join(split_dir, 'packed')
+
+def split_fingerprint(split_dir):
+    """
+    Summarize the names, sizes and modification times of a split's images and labels.
+
+    Parameters
+    ----------
+    split_dir : str
+        Split directory.
+
+    Returns
+    -------
+    str
+        Hex digest that changes whenever an image or label file is added, removed or modified.
+    """
+    digest = hashlib.sha1()
+    for image_path in list_images(split_dir):
+        for path in (image_path, label_path_for(image_path)):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            digest.update(f"{os.path.relpath(path, split_dir)}:{stat.st_size}:{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()
+
+def _decode(image_path):
+    image = cv2.imread(image_path, cv2.IMREAD_COLOR)
+    return image, read_yolo_labels(label_path_for(image_path))
+
+def pack_split(split_dir, output_dir=None, workers=os.cpu_count()):
+    """
+    Decode every image and label of a split once into a packed shard.
+
+    The shard holds the decoded BGR pixels of all images back to back in a
+    ``pixels-<id>.bin`` file, and an ``index.npz`` naming that file, with the byte
+    offset and shape of each image, the YOLO label rows of all images with
+    per-image offsets, and the image names.
+
+    Every pack writes a new pixels file and then replaces the index, so an
+    interrupted run leaves the previous shard intact, and a process that mapped
+    the previous pixels file keeps reading consistent data: the file is unlinked,
+    never rewritten or truncated.
+
+    Parameters
+    ----------
+    split_dir : str
+        Split directory holding ``images`` and ``labels`` folders.
+    output_dir : str, optional
+        Shard directory; defaults to shard_dir_for(split_dir).
+    workers : int, optional
+        Decoding processes.
+
+    Returns
+    -------
+    str
+        The shard directory.
+
+    Raises
+    ------
+    ValueError
+        If an image cannot be decoded.
+    """
+    output_dir = output_dir or shard_dir_for(split_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    fingerprint = split_fingerprint(split_dir)
+    image_paths = list_images(split_dir)
+    pixels_name = f"pixels-{uuid.uuid4().hex}.bin"
+
+    offsets, shapes, label_counts, labels = [0], [], [], []
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) \
+        if workers > 1 else None
+    try:
+        decoded = executor.map(_decode, image_paths, chunksize=64) if executor else map(_decode, image_paths)
+        with open(os.path.join(output_dir, pixels_name), 'wb') as pixels:
+            for image_path, (image, image_labels) in zip(image_paths, decoded):
+                if image is None:
+                    raise ValueError(f"Could not decode {image_path}")
+                pixels.write(np.ascontiguousarray(image).data)
+                offsets.append(offsets[-1] + image.nbytes)
+                shapes.append(image.shape)
+                label_counts.append(len(image_labels))
+                labels.append(image_labels)
+    finally:
+        if executor:
+            executor.shutdown(cancel_futures=True)
+
+    tmp_path = os.path.join(output_dir, 'index.tmp.npz')
+    np.savez(tmp_path,
+             offsets=np.asarray(offsets, dtype=np.int64),
+             shapes=np.asarray(shapes, dtype=np.int32).reshape(-1, 3),
+             label_offsets=np.concatenate([[0], np.cumsum(label_counts)]).astype(np.int64),
+             labels=np.concatenate(labels).astype(np.float32) if labels else np.zeros((0, 5), np.float32),
+             names=np.asarray([os.path.relpath(path, split_dir) for path in image_paths]),
+             fingerprint=np.asarray(fingerprint),
+             version=np.asarray(SHARD_VERSION),
+             pixels=np.asarray(pixels_name))
+
+    index_path = os.path.join(output_dir, 'index.npz')
+    previous_pixels = None
+    if os.path.exists(index_path):
+        with np.load(index_path) as index:
+            previous_pixels = _pixels_name(index)
+    os.replace(tmp_path, index_path)
+
+    # Drop older pixels files and those of interrupted runs. The previous one is kept for
+    # readers that loaded the old index but have not mapped its pixels yet
+    for path in glob.glob(os.path.join(output_dir, 'pixels*.bin')):
+        if os.path.basename(path) not in (pixels_name, previous_pixels):
+            os.unlink(path)
+    return output_dir
+
+def _pixels_name(index):
+    # Shards from before SHARD_VERSION 2 rewrote a fixed pixels.bin in place
+    return str(index['pixels']) if 'pixels' in index else 'pixels.bin'
+
+# Shards opened by this process for read_packed, by shard directory
+_open_shards = {}
+
+def read_packed(shard_dir, index):
+    """
+    Read one image of a packed shard, keeping the shard open for later calls.
+
+    Meant for worker processes, which receive (shard directory, index) pairs
+    instead of pickled images.
+
+    Parameters
+    ----------
+    shard_dir : str
+        Shard directory.
+    index : int
+        Image index.
+
+    Returns
+    -------
+    tuple
+        (read-only BGR image, labels).
+    """
+    split = _open_shards.get(shard_dir)
+    if split is None:
+        split = _open_shards[shard_dir] = PackedSplit(shard_dir)
+    _, image, labels = split[index]
+    return image, labels
+
+def _load_item(shard_dir, index, transform):
+    image, labels = read_packed(shard_dir, index)
+    return transform(image) if transform is not None else np.array(image), labels
+
+class PackedSplit:
+    """
+    A dataset split packed by pack_split, memory-mapped for random access.
+
+    Images are read-only views into the mapped pixels file: indexing costs
+    no file open and no decode, and pages are shared by every process reading
+    the shard. Iterating yields the same (path, image, labels) tuples as
+    iter_split.
+
+    Attributes
+    ----------
+    shard_dir : str
+        Shard directory.
+    names : list of str
+        Image path of each image, relative to the split directory.
+    """
+    def __init__(self, shard_dir, split_dir=None):
+        self.shard_dir = shard_dir
+        self.split_dir = split_dir or os.path.dirname(os.path.abspath(shard_dir))
+        with np.load(os.path.join(shard_dir, 'index.npz')) as index:
+            self.offsets = index['offsets']
+            self.shapes = index['shapes']
+            self.label_offsets = index['label_offsets']
+            self.labels = index['labels']
+            self.names = index['names'].tolist()
+            self.fingerprint = str(index['fingerprint'])
+            self.version = int(index['version'])
+            pixels_name = _pixels_name(index)
+        # np.memmap cannot map an empty file
+        self.pixels = np.memmap(os.path.join(shard_dir, pixels_name), dtype=np.uint8, mode='r') \
+            if self.offsets[-1] else np.zeros(0, dtype=np.uint8)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, index):
+        """
+        Read one image and its labels.
+
+        Parameters
+        ----------
+        index : int
+            Image index, in image name order.
+
+        Returns
+        -------
+        tuple
+            (image_path, read-only BGR image, labels), labels as read by read_yolo_labels.
+        """
+        start, stop = self.offsets[index], self.offsets[index + 1]
+        image = self.pixels[start:stop].reshape(self.shapes[index])
+        labels = self.labels[self.label_offsets[index]:self.label_offsets[index + 1]]
+        return os.path.join(self.split_dir, self.names[index]), image, labels
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def stream(self, transform=None, workers=0, window=0, indices=None):
+        """
+        Iterate over images, optionally transforming them in prefetching worker processes.
+
+        Without workers, images are read in the calling process, which is the
+        fastest way to walk a shard. Workers pay off when ``transform`` is
+        expensive (preprocessing, augmentation): each opens the shard itself and
+        works ahead of the consumer, up to ``window`` images.
+
+        Parameters
+        ----------
+        transform : callable, optional
+            Picklable function applied to each image.
+        workers : int, optional
+            Worker processes; 0 runs everything in the calling process.
+        window : int, optional
+            Maximum number of images in flight; defaults to four per worker.
+        indices : iterable of int, optional
+            Images to read, in order; defaults to all of them.
+
+        Yields
+        ------
+        tuple
+            (image_path, image or transform(image), labels), in the order of indices.
+        """
+        indices = range(len(self)) if indices is None else indices
+        if workers <= 0:
+            for index in indices:
+                path, image, labels = self[index]
+                yield path, transform(image) if transform is not None else image, labels
+            return
+
+        window = window or 4 * workers
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+            pending = deque()
+            for index in indices:
+                pending.append((index, executor.submit(_load_item, self.shard_dir, index, transform)))
+                if len(pending) >= window:
+                    index, future = pending.popleft()
+                    yield (os.path.join(self.split_dir, self.names[index]), *future.result())
+            while pending:
+                index, future = pending.popleft()
+                yield (os.path.join(self.split_dir, self.names[index]), *future.result())
+
+def open_split(split_dir, workers=os.cpu_count(), rebuild=False):
+    """
+    Open the packed shard of a split, packing it first if it is missing or stale.
+
+    Parameters
+    ----------
+    split_dir : str
+        Split directory holding ``images`` and ``labels`` folders.
+    workers : int, optional
+        Decoding processes if the split has to be packed.
+    rebuild : bool, optional
+        Pack the split even if an up-to-date shard exists.
+
+    Returns
+    -------
+    PackedSplit
+        The split's shard.
+    """
+    shard_dir = shard_dir_for(split_dir)
+    if not rebuild and os.path.exists(os.path.join(shard_dir, 'index.npz')):
+        split = PackedSplit(shard_dir, split_dir)
+        if split.version == SHARD_VERSION and split.fingerprint == split_fingerprint(split_dir):
+            return split
+    pack_split(split_dir, shard_dir, workers)
+    return PackedSplit(shard_dir, split_dir)
+
+def packed_sources(root, workers=os.cpu_count()):
+    """
+    Open the packed shards of every split below a dataset root.
+
+    Parameters
+    ----------
+    root : str
+        Dataset root holding split directories, or a single split directory.
+    workers : int, optional
+        Decoding processes for splits that have to be packed first.
+
+    Returns
+    -------
+    dict
+        (shard directory, index) for read_packed, keyed by image path relative to root.
+    """
+    split_names = [''] if os.path.isdir(os.path.join(root, 'images')) else sorted(
+        name for name in os.listdir(root) if os.path.isdir(os.path.join(root, name, 'images')))
+
+    sources = {}
+    for split_name in split_names:
+        split = open_split(os.path.join(root, split_name), workers)
+        for index, name in enumerate(split.names):
+            sources[os.path.normpath(os.path.join(split_name, name))] = (split.shard_dir, index)
+    return sources
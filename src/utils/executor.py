@@ -0,0 +1,140 @@
+import contextvars
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator
+
+import cv2
+
+from src.utils import config
+
+logger = logging.getLogger(__name__)
+
+# Name prefix of the ImageExecutor's pool threads
+THREAD_NAME_PREFIX = 'image-worker'
+
+def in_worker_thread() -> bool:
+    """
+    Check whether the calling thread belongs to an ImageExecutor pool.
+
+    Code running there already holds its share of the thread budget and should not
+    start threads of its own.
+
+    Returns
+    -------
+    bool
+        True on an image executor thread.
+    """
+    return threading.current_thread().name.startswith(THREAD_NAME_PREFIX)
+
+class ImageExecutor:
+    """
+    Fans per-image work out over a shared thread pool.
+
+    OpenCV releases the GIL inside its heavy functions, so threads scale across
+    cores. To keep the pool and OpenCV's own threading from oversubscribing the
+    machine, OpenCV is limited to ``thread_budget // workers`` threads per call.
+
+    Attributes
+    ----------
+    workers : int
+        Pool threads.
+    opencv_threads : int
+        Threads OpenCV may use inside a single call.
+    """
+    def __init__(self, workers: int = config.IMAGE_WORKERS, thread_budget: int = config.THREAD_BUDGET):
+        self.workers = max(1, workers)
+        self.opencv_threads = max(1, thread_budget // self.workers)
+        cv2.setNumThreads(self.opencv_threads)
+        logger.info(f"Image executor: {self.workers} worker(s), {self.opencv_threads} OpenCV thread(s) each")
+
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=THREAD_NAME_PREFIX) \
+            if self.workers > 1 else None
+
+    def map(self, func: Callable, items: Iterable) -> list:
+        """
+        Apply a function to every item, in parallel, keeping the input order.
+
+        Parameters
+        ----------
+        func : callable
+            Function of one item.
+        items : iterable
+            Items to process.
+
+        Returns
+        -------
+        list
+            func(item) for every item, in input order. The first exception raised
+            by any call is re-raised.
+        """
+        items = list(items)
+        if self._pool is None or len(items) < 2:
+            return [func(item) for item in items]
+        # Each call runs in a copy of the caller's context, so request ids and metric labels follow it
+        futures = [self._pool.submit(contextvars.copy_context().run, func, item) for item in items]
+        return [future.result() for future in futures]
+
+    def imap(self, func: Callable, items: Iterable, window: int = 0) -> Iterator:
+        """
+        Apply a function to a stream of items, in parallel, with a bounded number in flight.
+
+        Items are drawn from the iterable only as results are consumed, so memory
+        stays bounded however long the stream is.
+
+        Parameters
+        ----------
+        func : callable
+            Function of one item.
+        items : iterable
+            Items to process, consumed lazily.
+        window : int, optional
+            Maximum number of submitted but unconsumed calls; defaults to twice the workers.
+
+        Yields
+        ------
+        object
+            func(item) for every item, in input order.
+        """
+        if self._pool is None:
+            for item in items:
+                yield func(item)
+            return
+
+        window = window or 2 * self.workers
+        pending = deque()
+        for item in items:
+            pending.append(self._pool.submit(contextvars.copy_context().run, func, item))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def prefetch(executor: Executor, function: Callable, items: Iterable[tuple], window: int) -> Iterator:
+    """
+    Map a function over items in a pool, keeping at most ``window`` results in flight.
+
+    Parameters
+    ----------
+    executor : concurrent.futures.Executor
+        Pool to run on.
+    function : callable
+        Picklable function applied to each item (a tuple of arguments).
+    items : iterable of tuple
+        Argument tuples.
+    window : int
+        Maximum number of submitted but unconsumed calls.
+
+    Yields
+    ------
+    object
+        Results in input order.
+    """
+    pending = deque()
+    for item in items:
+        pending.append(executor.submit(function, *item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
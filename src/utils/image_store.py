@@ -0,0 +1,743 @@
+import os
+import glob
+import time
+import uuid
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Optional
+
+import cv2
+import numpy as np
+
+from src.utils import config
+
+logger = logging.getLogger(__name__)
+
+def compact_image(image: np.ndarray) -> np.ndarray:
+    """
+    Convert an image to the smallest layout that displays and detects the same.
+
+    Non-uint8 images are clipped to [0, 255] and cast to uint8, the same conversion
+    applied before serving and detection. Color images whose channels are all
+    equal are reduced to one channel. The result is C-contiguous.
+
+    Parameters
+    ----------
+    image : numpy.ndarray
+        Image to store.
+
+    Returns
+    -------
+    numpy.ndarray
+        uint8 image of shape (H, W) or (H, W, C).
+    """
+    if image.dtype == np.bool_:
+        image = image.astype(np.uint8) * 255
+    elif image.dtype != np.uint8:
+        image = np.clip(image, 0, 255).astype(np.uint8)
+
+    if image.ndim == 3 and image.shape[2] == 1:
+        image = image[:, :, 0]
+    elif image.ndim == 3 and image.shape[2] == 3 and \
+            np.array_equal(image[:, :, 0], image[:, :, 1]) and np.array_equal(image[:, :, 1], image[:, :, 2]):
+        image = image[:, :, 0]
+    return np.ascontiguousarray(image)
+
+#==============================================================================
+# IN-PROCESS STORE
+#==============================================================================
+class ImageStore:
+    """
+    Manages in-memory storage of images with expiration times and a byte budget.
+
+    Images are kept in least-recently-used order. Once the pixel bytes held,
+    plus any cached encodings of them, exceed ``max_bytes``, the least recently
+    used images are evicted, and a background sweeper periodically drops expired
+    images that are never read again. With ``compress_after`` set, the sweeper
+    also PNG-compresses images left unread that long; they are decoded again on
+    the next ``get()``.
+
+    Attributes
+    ----------
+    store : collections.OrderedDict
+        Internal dictionary to hold images and their expiration metadata, oldest first.
+    max_bytes : int
+        Upper bound on the total ``nbytes`` of the stored images.
+    resident_bytes : int
+        Total ``nbytes`` of the images currently stored.
+    hits, misses, evictions, expirations : int
+        Lookup and reclamation counters.
+    """
+    def __init__(self, max_bytes: int = config.STORE_MAX_BYTES,
+                 sweep_interval: float = config.STORE_SWEEP_INTERVAL,
+                 compress_after: float = config.STORE_COMPRESS_AFTER):
+        self.store = OrderedDict()
+        self.max_bytes = max_bytes
+        self.compress_after = compress_after
+        self.resident_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sweep_interval = sweep_interval
+
+        self._start_sweeper()
+        # Threads do not survive fork(), e.g. from a gunicorn master with preload_app
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _start_sweeper(self) -> None:
+        if self._sweep_interval > 0:
+            sweeper = threading.Thread(target=self._sweep_loop, args=(self._sweep_interval,),
+                                       name='image-store-sweeper', daemon=True)
+            sweeper.start()
+
+    def _after_fork(self) -> None:
+        # The parent's sweeper may have held the lock when the process forked
+        self._lock = threading.Lock()
+        self._start_sweeper()
+
+    def set(self, key: str, image: np.ndarray, timeout: int = 3600) -> None:
+        """
+        Store an image in the cache with an expiration time.
+
+        Parameters
+        ----------
+        key : str
+            Unique identifier for the image.
+        image : numpy.ndarray
+            Image data to be stored.
+        timeout : int, optional
+            Time (seconds) before the image expires.
+        """
+        if config.STORE_COMPACT:
+            image = compact_image(image)
+        nbytes = image.nbytes
+        with self._lock:
+            self._remove(key)
+
+            if nbytes > self.max_bytes:
+                logger.warning(f"Image {key} ({nbytes} bytes) exceeds the store budget, not stored")
+                return
+
+            now = time.time()
+            self.store[key] = {
+                'image': image,
+                'compressed': None,
+                'expires': now + timeout,
+                'nbytes': nbytes,
+                'modified': now,
+                'accessed': now,
+                'version': uuid.uuid4().hex,
+                'encoded': {}
+            }
+            self.resident_bytes += nbytes
+            self._evict()
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """
+        Retrieve an image from the cache if valid.
+
+        Parameters
+        ----------
+        key : str
+            Unique identifier for the image.
+
+        Returns
+        -------
+        numpy.ndarray or None
+            The stored image or None if expired/absent.
+        """
+        with self._lock:
+            item = self.store.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+
+            if time.time() > item['expires']:
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self.store.move_to_end(key)
+            self.hits += 1
+            item['accessed'] = time.time()
+            if item['image'] is not None:
+                return item['image']
+            compressed, version = item['compressed'], item['version']
+
+        # Decode outside the lock, then keep the decoded copy for the next reads
+        image = cv2.imdecode(np.frombuffer(compressed, np.uint8), cv2.IMREAD_UNCHANGED)
+        with self._lock:
+            item = self.store.get(key)
+            if item is not None and item['version'] == version and item['image'] is None:
+                item['image'], item['compressed'] = image, None
+                item['nbytes'] += image.nbytes - len(compressed)
+                self.resident_bytes += image.nbytes - len(compressed)
+                self._evict()
+        return image
+
+    def get_encoded(self, key: str, fmt: str) -> Optional[tuple]:
+        """
+        Retrieve the cached encoding of an image.
+
+        Parameters
+        ----------
+        key : str
+            Unique identifier for the image.
+        fmt : str
+            Encoding format, e.g. 'jpg'.
+
+        Returns
+        -------
+        tuple or None
+            (data, etag, modified) if the image is stored and was encoded in this
+            format, otherwise None.
+        """
+        with self._lock:
+            item = self.store.get(key)
+            if item is None or fmt not in item['encoded'] or time.time() > item['expires']:
+                return None
+
+            self.store.move_to_end(key)
+            # Serving the encoding counts as a read, so the image is not compressed as cold
+            item['accessed'] = time.time()
+            self.hits += 1
+            return item['encoded'][fmt], f"{item['version']}-{fmt}", item['modified']
+
+    def set_encoded(self, key: str, fmt: str, data: bytes) -> Optional[tuple]:
+        """
+        Cache the encoding of a stored image; it is dropped along with the image.
+
+        Parameters
+        ----------
+        key : str
+            Unique identifier for the image.
+        fmt : str
+            Encoding format, e.g. 'jpg'.
+        data : bytes
+            Encoded image.
+
+        Returns
+        -------
+        tuple or None
+            (data, etag, modified) as get_encoded() will return it, or None if the
+            image is no longer stored.
+        """
+        with self._lock:
+            item = self.store.get(key)
+            if item is None:
+                return None
+
+            old = item['encoded'].pop(fmt, None)
+            if old is not None:
+                item['nbytes'] -= len(old)
+                self.resident_bytes -= len(old)
+
+            item['encoded'][fmt] = data
+            item['nbytes'] += len(data)
+            self.resident_bytes += len(data)
+            self.store.move_to_end(key)
+            self._evict()
+            return data, f"{item['version']}-{fmt}", item['modified']
+
+    def delete(self, key: str) -> None:
+        """
+        Remove an image from the cache if present.
+
+        Parameters
+        ----------
+        key : str
+            Unique identifier for the image.
+        """
+        with self._lock:
+            self._remove(key)
+
+    def sweep(self) -> int:
+        """
+        Drop every expired image.
+
+        Returns
+        -------
+        int
+            Number of images removed.
+        """
+        now = time.time()
+        with self._lock:
+            expired = [key for key, item in self.store.items() if now > item['expires']]
+            for key in expired:
+                self._remove(key)
+            self.expirations += len(expired)
+        return len(expired)
+
+    def compress_cold(self) -> int:
+        """
+        PNG-compress the images that have not been read for ``compress_after`` seconds.
+
+        Returns
+        -------
+        int
+            Number of images compressed.
+        """
+        if self.compress_after <= 0:
+            return 0
+
+        cutoff = time.time() - self.compress_after
+        with self._lock:
+            # PNG holds uint8 images with 1, 3 or 4 channels; anything else stays as it is
+            cold = [(key, item['image'], item['version'], item['accessed']) for key, item in self.store.items()
+                    if item['image'] is not None and item['accessed'] < cutoff and item['image'].dtype == np.uint8
+                    and (item['image'].ndim == 2 or item['image'].shape[2] in (1, 3, 4))]
+
+        compressed = 0
+        for key, image, version, accessed in cold:
+            # Encode outside the lock; fastest zlib level, PNG is lossless either way
+            ok, buffer = cv2.imencode('.png', image, [cv2.IMWRITE_PNG_COMPRESSION, 1])
+            if not ok or buffer.nbytes >= image.nbytes:
+                continue
+
+            with self._lock:
+                item = self.store.get(key)
+                # Skip images replaced or read while they were being encoded
+                if item is None or item['version'] != version or item['accessed'] != accessed:
+                    continue
+                item['image'], item['compressed'] = None, buffer.tobytes()
+                item['nbytes'] -= image.nbytes - buffer.nbytes
+                self.resident_bytes -= image.nbytes - buffer.nbytes
+                compressed += 1
+        return compressed
+
+    def stats(self) -> dict:
+        """
+        Report the store's size and counters.
+
+        Returns
+        -------
+        dict
+            Entry count, compressed entry count, resident and maximum bytes, hits,
+            misses, evictions and expirations.
+        """
+        with self._lock:
+            return {
+                'entries': len(self.store),
+                'compressed_entries': sum(item['image'] is None for item in self.store.values()),
+                'resident_bytes': self.resident_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
+
+    def close(self) -> None:
+        """
+        Stop the background sweeper.
+        """
+        self._stop.set()
+
+    def _evict(self) -> None:
+        # Evict least recently used images until the budget is respected; callers must hold self._lock
+        while self.resident_bytes > self.max_bytes:
+            evicted_key = next(iter(self.store))
+            self._remove(evicted_key)
+            self.evictions += 1
+            logger.info(f"Evicted image from store: {evicted_key}")
+
+    def _remove(self, key: str) -> None:
+        # Callers must hold self._lock
+        item = self.store.pop(key, None)
+        if item is not None:
+            self.resident_bytes -= item['nbytes']
+
+    def _sweep_loop(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            # Keep sweeping after a failed pass; an uncaught error would end the thread silently
+            try:
+                removed = self.sweep()
+                if removed:
+                    logger.info(f"Swept {removed} expired image(s) from store")
+                compressed = self.compress_cold()
+                if compressed:
+                    logger.info(f"Compressed {compressed} cold image(s) in store")
+            except Exception:
+                logger.exception("Error sweeping image store")
+
+#==============================================================================
+# SHARED (CROSS-PROCESS) STORE
+#==============================================================================
+class SharedImageStore:
+    """
+    Stores images as memory-mapped ``.npy`` files shared by every worker process.
+
+    Pixel buffers live in one file per image under ``root`` (``/dev/shm`` by
+    default, so they stay in RAM) and a small SQLite index records their size,
+    expiry and last access. Any process pointing at the same ``root`` sees the
+    same images, and ``get()`` maps the file read-only instead of copying it.
+
+    Attributes
+    ----------
+    root : str
+        Directory holding the image files and the index.
+    max_bytes : int
+        Upper bound on the total ``nbytes`` of the stored images, shared by all processes.
+    """
+    _COUNTERS = ('hits', 'misses', 'evictions', 'expirations')
+
+    def __init__(self, root: str = config.STORE_SHARED_DIR, max_bytes: int = config.STORE_MAX_BYTES,
+                 sweep_interval: float = config.STORE_SWEEP_INTERVAL):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._index_path = os.path.join(root, 'index.sqlite3')
+        self._local = threading.local()
+        self._stop = threading.Event()
+
+        os.makedirs(root, exist_ok=True)
+        with self._transaction() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS images ('
+                'key TEXT PRIMARY KEY, path TEXT NOT NULL, nbytes INTEGER NOT NULL, '
+                'expires REAL NOT NULL, accessed REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS images_accessed ON images (accessed)')
+            conn.execute('CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+            conn.executemany('INSERT OR IGNORE INTO counters VALUES (?, 0)', [(name,) for name in self._COUNTERS])
+
+        self._sweep_interval = sweep_interval
+        self._start_sweeper()
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _start_sweeper(self) -> None:
+        if self._sweep_interval > 0:
+            sweeper = threading.Thread(target=self._sweep_loop, args=(self._sweep_interval,),
+                                       name='shared-image-store-sweeper', daemon=True)
+            sweeper.start()
+
+    def _after_fork(self) -> None:
+        # SQLite connections must not be used across fork(); the child opens its own
+        self._local = threading.local()
+        self._start_sweeper()
+
+    def set(self, key: str, image: np.ndarray, timeout: int = 3600) -> None:
+        """
+        Store an image in the shared cache with an expiration time.
+
+        Parameters
+        ----------
+        key : str
+            Unique identifier for the image.
+        image : numpy.ndarray
+            Image data to be stored.
+        timeout : int, optional
+            Time (seconds) before the image expires.
+        """
+        image = compact_image(image) if config.STORE_COMPACT else np.ascontiguousarray(image)
+        nbytes = image.nbytes
+        if nbytes > self.max_bytes:
+            logger.warning(f"Image {key} ({nbytes} bytes) exceeds the store budget, not stored")
+            return
+
+        # Write the pixels to a fresh file first so readers never map a partial one
+        path = self._image_path(key)
+        with open(f"{path}.tmp", 'wb') as f:
+            np.save(f, image, allow_pickle=False)
+        os.replace(f"{path}.tmp", path)
+
+        now = time.time()
+        stale_paths = []
+        with self._transaction() as conn:
+            row = conn.execute('SELECT path FROM images WHERE key = ?', (key,)).fetchone()
+            if row is not None:
+                stale_paths.append(row[0])
+            conn.execute('INSERT OR REPLACE INTO images VALUES (?, ?, ?, ?, ?)',
+                         (key, path, nbytes, now + timeout, now))
+
+            stale_paths.extend(self._evict(conn, key))
+
+        self._unlink(stale_paths)
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """
+        Retrieve an image from the shared cache if valid.
+
+        Parameters
+        ----------
+        key : str
+            Unique identifier for the image.
+
+        Returns
+        -------
+        numpy.ndarray or None
+            A read-only, memory-mapped view of the stored image, or None if expired/absent.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute('SELECT path, expires FROM images WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self._bump(conn, 'misses')
+                return None
+
+            path, expires = row
+            if now > expires:
+                conn.execute('DELETE FROM images WHERE key = ?', (key,))
+                self._bump(conn, 'expirations')
+                self._bump(conn, 'misses')
+                self._unlink([path])
+                return None
+
+            try:
+                image = np.asarray(np.load(path, mmap_mode='r', allow_pickle=False))
+            except FileNotFoundError:
+                logger.error(f"Indexed image file is missing: {path}")
+                conn.execute('DELETE FROM images WHERE key = ?', (key,))
+                self._bump(conn, 'misses')
+                return None
+
+            conn.execute('UPDATE images SET accessed = ? WHERE key = ?', (now, key))
+            self._bump(conn, 'hits')
+            return image
+
+    def get_encoded(self, key: str, fmt: str) -> Optional[tuple]:
+        """
+        Retrieve the cached encoding of an image.
+
+        Parameters
+        ----------
+        key : str
+            Unique identifier for the image.
+        fmt : str
+            Encoding format, e.g. 'jpg'.
+
+        Returns
+        -------
+        tuple or None
+            (data, etag, modified) if the image is stored and was encoded in this
+            format, otherwise None.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute('SELECT path, expires FROM images WHERE key = ?', (key,)).fetchone()
+            if row is None or now > row[1]:
+                return None
+
+            path = row[0]
+            try:
+                with open(f"{path}.{fmt}", 'rb') as f:
+                    data = f.read()
+                modified = os.path.getmtime(path)
+            except FileNotFoundError:
+                return None
+
+            conn.execute('UPDATE images SET accessed = ? WHERE key = ?', (now, key))
+            self._bump(conn, 'hits')
+            return data, self._etag(path, fmt), modified
+
+    def set_encoded(self, key: str, fmt: str, data: bytes) -> Optional[tuple]:
+        """
+        Cache the encoding of a stored image next to its pixels; it is dropped along with the image.
+
+        Parameters
+        ----------
+        key : str
+            Unique identifier for the image.
+        fmt : str
+            Encoding format, e.g. 'jpg'.
+        data : bytes
+            Encoded image.
+
+        Returns
+        -------
+        tuple or None
+            (data, etag, modified) as get_encoded() will return it, or None if the
+            image is no longer stored.
+        """
+        with self._transaction() as conn:
+            row = conn.execute('SELECT path FROM images WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+
+            path = row[0]
+            encoded_path = f"{path}.{fmt}"
+            if not os.path.exists(encoded_path):
+                with open(f"{encoded_path}.tmp", 'wb') as f:
+                    f.write(data)
+                os.replace(f"{encoded_path}.tmp", encoded_path)
+                conn.execute('UPDATE images SET nbytes = nbytes + ? WHERE key = ?', (len(data), key))
+                # The encoding counts towards the budget, so it may push other images out
+                stale_paths = self._evict(conn, key)
+            else:
+                stale_paths = []
+            modified = os.path.getmtime(path)
+
+        self._unlink(stale_paths)
+        return data, self._etag(path, fmt), modified
+
+    def delete(self, key: str) -> None:
+        """
+        Remove an image from the shared cache if present.
+
+        Parameters
+        ----------
+        key : str
+            Unique identifier for the image.
+        """
+        with self._transaction() as conn:
+            row = conn.execute('SELECT path FROM images WHERE key = ?', (key,)).fetchone()
+            conn.execute('DELETE FROM images WHERE key = ?', (key,))
+        if row is not None:
+            self._unlink([row[0]])
+
+    def sweep(self) -> int:
+        """
+        Drop every expired image, and image files left behind by crashed writers.
+
+        Returns
+        -------
+        int
+            Number of expired images removed.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            expired = [row[0] for row in conn.execute('SELECT path FROM images WHERE expires < ?', (now,))]
+            conn.execute('DELETE FROM images WHERE expires < ?', (now,))
+            self._bump(conn, 'expirations', len(expired))
+            indexed = {row[0] for row in conn.execute('SELECT path FROM images')}
+        self._unlink(expired)
+
+        # Files written but never indexed because the writer died in between
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            image_path = path[:path.find('.npy') + len('.npy')]
+            if '.npy' in name and image_path not in indexed:
+                try:
+                    if now - os.path.getmtime(path) > 60:
+                        os.unlink(path)
+                except FileNotFoundError:
+                    pass
+
+        return len(expired)
+
+    def stats(self) -> dict:
+        """
+        Report the shared store's size and counters, aggregated over all processes.
+
+        Returns
+        -------
+        dict
+            Entry count, resident and maximum bytes, hits, misses, evictions and expirations.
+        """
+        conn = self._connect()
+        entries, resident_bytes = conn.execute('SELECT COUNT(*), COALESCE(SUM(nbytes), 0) FROM images').fetchone()
+        stats = {'entries': entries, 'resident_bytes': resident_bytes, 'max_bytes': self.max_bytes}
+        stats.update(conn.execute('SELECT name, value FROM counters').fetchall())
+        return stats
+
+    def close(self) -> None:
+        """
+        Stop the background sweeper.
+        """
+        self._stop.set()
+
+    def _connect(self) -> sqlite3.Connection:
+        # sqlite3 connections must not be shared between threads
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self._index_path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        # Take the write lock up front; upgrading a read transaction can fail under contention
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def _image_path(self, key: str) -> str:
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.root, f"{digest}-{uuid.uuid4().hex}.npy")
+
+    def _etag(self, path: str, fmt: str) -> str:
+        # Image file names are unique per set(), so they identify the version
+        return f"{os.path.basename(path)[:-len('.npy')]}-{fmt}"
+
+    def _evict(self, conn: sqlite3.Connection, keep_key: str) -> list:
+        # Evict least recently used images other than keep_key until the budget is respected;
+        # returns the evicted files, to be unlinked once the transaction has committed
+        stale_paths = []
+        resident_bytes = conn.execute('SELECT COALESCE(SUM(nbytes), 0) FROM images').fetchone()[0]
+        if resident_bytes > self.max_bytes:
+            for evicted_key, evicted_path, evicted_nbytes in conn.execute(
+                    'SELECT key, path, nbytes FROM images WHERE key != ? ORDER BY accessed', (keep_key,)).fetchall():
+                if resident_bytes <= self.max_bytes:
+                    break
+                conn.execute('DELETE FROM images WHERE key = ?', (evicted_key,))
+                stale_paths.append(evicted_path)
+                resident_bytes -= evicted_nbytes
+                logger.info(f"Evicted image from shared store: {evicted_key}")
+            self._bump(conn, 'evictions', len(stale_paths))
+        return stale_paths
+
+    def _bump(self, conn: sqlite3.Connection, name: str, amount: int = 1) -> None:
+        if amount:
+            conn.execute('UPDATE counters SET value = value + ? WHERE name = ?', (amount, name))
+
+    def _unlink(self, paths: list) -> None:
+        # Processes that already mapped a file keep reading it after the unlink
+        for path in paths:
+            for related_path in [path, *glob.glob(f"{glob.escape(path)}.*")]:
+                try:
+                    os.unlink(related_path)
+                except FileNotFoundError:
+                    pass
+
+    def _sweep_loop(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            # Keep sweeping after a failed pass; an uncaught error would end the thread silently
+            try:
+                removed = self.sweep()
+                if removed:
+                    logger.info(f"Swept {removed} expired image(s) from shared store")
+            except Exception:
+                logger.exception("Error sweeping shared image store")
+
+#==============================================================================
+# BACKEND SELECTION
+#==============================================================================
+def create_image_store(backend: str = config.STORE_BACKEND):
+    """
+    Build the image store selected by configuration.
+
+    Parameters
+    ----------
+    backend : str, optional
+        'memory' for a per-process store, or 'shared' for a store visible to
+        every worker process on the machine.
+
+    Returns
+    -------
+    ImageStore or SharedImageStore
+        The image store.
+
+    Raises
+    ------
+    ValueError
+        If the backend is unknown.
+    """
+    if backend == 'memory':
+        return ImageStore()
+    if backend == 'shared':
+        return SharedImageStore()
+    raise ValueError(f"Unknown image store backend: {backend}")
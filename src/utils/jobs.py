@@ -0,0 +1,382 @@
+import os
+import json
+import time
+import contextvars
+import uuid
+import sqlite3
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+from src.utils import config
+
+logger = logging.getLogger(__name__)
+
+class JobQueue:
+    """
+    Runs work in the background and collects its results as they finish.
+
+    A job's items are split into chunks and each chunk is handed to the worker
+    pool separately, so one large job spreads over all workers. Results are
+    appended to the job as soon as their chunk completes. Jobs live in the
+    memory of the process that accepted them; see SharedJobQueue for jobs that
+    every worker process can report on.
+
+    Attributes
+    ----------
+    jobs : dict
+        Job records by job id.
+    retention : float
+        Seconds a finished job is kept before it is discarded.
+    """
+    def __init__(self, max_workers: int = config.JOB_WORKERS, retention: float = config.JOB_RETENTION):
+        self.jobs = {}
+        self.retention = retention
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix='job-worker')
+        self._changed = threading.Condition()
+
+    def submit(self, task: Callable[[list], list], items: list, chunk_size: int) -> str:
+        """
+        Queue a job and return immediately.
+
+        Parameters
+        ----------
+        task : callable
+            Called with one chunk of items; returns the list of results for that chunk.
+        items : list
+            Items to process.
+        chunk_size : int
+            Maximum number of items per task call.
+
+        Returns
+        -------
+        str
+            The job id.
+        """
+        self._discard_expired()
+
+        job_id = uuid.uuid4().hex
+        chunks = [items[i:i + chunk_size] for i in range(0, len(items), max(1, chunk_size))]
+        with self._changed:
+            self.jobs[job_id] = {
+                'status': 'queued' if chunks else 'done',
+                'total': len(items),
+                'pending_chunks': len(chunks),
+                'results': [],
+                'errors': [],
+                'finished': None if chunks else time.time()
+            }
+
+        for chunk in chunks:
+            self._executor.submit(contextvars.copy_context().run, self._run_chunk, job_id, task, chunk)
+        return job_id
+
+    def get(self, job_id: str, since: int = 0) -> Optional[dict]:
+        """
+        Snapshot a job's progress.
+
+        Parameters
+        ----------
+        job_id : str
+            Id returned by submit().
+        since : int, optional
+            Number of results the caller has already seen; only later results are returned.
+
+        Returns
+        -------
+        dict or None
+            Status, item total, number of results so far and the new results,
+            or None if the job is unknown.
+        """
+        with self._changed:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            return {
+                'job_id': job_id,
+                'status': job['status'],
+                'total': job['total'],
+                'completed': len(job['results']),
+                'results': job['results'][since:],
+                'errors': list(job['errors'])
+            }
+
+    def wait(self, job_id: str, since: int, timeout: float) -> Optional[dict]:
+        """
+        Block until a job has results beyond ``since``, finishes, or the timeout passes.
+
+        Parameters
+        ----------
+        job_id : str
+            Id returned by submit().
+        since : int
+            Number of results the caller has already seen.
+        timeout : float
+            Maximum seconds to wait.
+
+        Returns
+        -------
+        dict or None
+            Same snapshot as get().
+        """
+        with self._changed:
+            self._changed.wait_for(
+                lambda: job_id not in self.jobs
+                or self.jobs[job_id]['status'] == 'done'
+                or len(self.jobs[job_id]['results']) > since,
+                timeout=timeout
+            )
+            return self.get(job_id, since)
+
+    def _run_chunk(self, job_id: str, task: Callable[[list], list], chunk: list) -> None:
+        with self._changed:
+            self.jobs[job_id]['status'] = 'running'
+
+        try:
+            results = task(chunk)
+            error = None
+        except Exception as e:
+            logger.exception(f"Error in job {job_id}: {e}")
+            results = []
+            error = str(e)
+
+        with self._changed:
+            job = self.jobs[job_id]
+            job['results'].extend(results)
+            if error:
+                job['errors'].append(error)
+            job['pending_chunks'] -= 1
+            if job['pending_chunks'] == 0:
+                job['status'] = 'done'
+                job['finished'] = time.time()
+            self._changed.notify_all()
+
+    def _discard_expired(self) -> None:
+        cutoff = time.time() - self.retention
+        with self._changed:
+            expired = [job_id for job_id, job in self.jobs.items()
+                       if job['finished'] is not None and job['finished'] < cutoff]
+            for job_id in expired:
+                del self.jobs[job_id]
+
+class SharedJobQueue:
+    """
+    Runs work in the background and records its progress where every worker process can read it.
+
+    Chunks run on the thread pool of the process that accepted the job, as in
+    JobQueue, but job state and results are kept in a SQLite database under
+    ``root``, next to the shared image store's index. Any process pointing at
+    the same ``root`` can report on and stream any job, so status requests may
+    land on a different gunicorn worker than the one that accepted the job.
+
+    Attributes
+    ----------
+    root : str
+        Directory holding the job database.
+    retention : float
+        Seconds a finished job is kept before it is discarded.
+    poll_interval : float
+        Seconds between checks for new results in wait().
+    """
+    def __init__(self, root: str = config.STORE_SHARED_DIR, max_workers: int = config.JOB_WORKERS,
+                 retention: float = config.JOB_RETENTION, poll_interval: float = 0.2):
+        self.root = root
+        self.retention = retention
+        self.poll_interval = poll_interval
+        self._db_path = os.path.join(root, 'jobs.sqlite3')
+        self._local = threading.local()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix='job-worker')
+
+        os.makedirs(root, exist_ok=True)
+        with self._transaction() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS jobs ('
+                'job_id TEXT PRIMARY KEY, status TEXT NOT NULL, total INTEGER NOT NULL, '
+                'pending_chunks INTEGER NOT NULL, finished REAL)'
+            )
+            conn.execute('CREATE TABLE IF NOT EXISTS job_results (job_id TEXT NOT NULL, result TEXT NOT NULL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS job_results_job ON job_results (job_id)')
+            conn.execute('CREATE TABLE IF NOT EXISTS job_errors (job_id TEXT NOT NULL, error TEXT NOT NULL)')
+
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self) -> None:
+        # SQLite connections must not be used across fork(); the child opens its own
+        self._local = threading.local()
+
+    def submit(self, task: Callable[[list], list], items: list, chunk_size: int) -> str:
+        """
+        Queue a job and return immediately.
+
+        Parameters
+        ----------
+        task : callable
+            Called with one chunk of items; returns the list of results for that chunk,
+            which must be JSON-serializable.
+        items : list
+            Items to process.
+        chunk_size : int
+            Maximum number of items per task call.
+
+        Returns
+        -------
+        str
+            The job id.
+        """
+        self._discard_expired()
+
+        job_id = uuid.uuid4().hex
+        chunks = [items[i:i + chunk_size] for i in range(0, len(items), max(1, chunk_size))]
+        with self._transaction() as conn:
+            conn.execute('INSERT INTO jobs VALUES (?, ?, ?, ?, ?)',
+                         (job_id, 'queued' if chunks else 'done', len(items), len(chunks),
+                          None if chunks else time.time()))
+
+        for chunk in chunks:
+            self._executor.submit(contextvars.copy_context().run, self._run_chunk, job_id, task, chunk)
+        return job_id
+
+    def get(self, job_id: str, since: int = 0) -> Optional[dict]:
+        """
+        Snapshot a job's progress.
+
+        Parameters
+        ----------
+        job_id : str
+            Id returned by submit(), in this or any other process.
+        since : int, optional
+            Number of results the caller has already seen; only later results are returned.
+
+        Returns
+        -------
+        dict or None
+            Status, item total, number of results so far and the new results,
+            or None if the job is unknown.
+        """
+        # One read transaction, so the status and the results are consistent
+        with self._transaction('BEGIN') as conn:
+            row = conn.execute('SELECT status, total FROM jobs WHERE job_id = ?', (job_id,)).fetchone()
+            if row is None:
+                return None
+            completed = conn.execute('SELECT COUNT(*) FROM job_results WHERE job_id = ?', (job_id,)).fetchone()[0]
+            # Only decode the results the caller has not seen; wait() calls this repeatedly
+            results = [json.loads(result) for (result,) in conn.execute(
+                'SELECT result FROM job_results WHERE job_id = ? ORDER BY rowid LIMIT -1 OFFSET ?',
+                (job_id, max(since, 0)))]
+            errors = [error for (error,) in conn.execute(
+                'SELECT error FROM job_errors WHERE job_id = ? ORDER BY rowid', (job_id,))]
+
+        return {
+            'job_id': job_id,
+            'status': row[0],
+            'total': row[1],
+            'completed': completed,
+            'results': results,
+            'errors': errors
+        }
+
+    def wait(self, job_id: str, since: int, timeout: float) -> Optional[dict]:
+        """
+        Block until a job has results beyond ``since``, finishes, or the timeout passes.
+
+        Other processes cannot signal this one, so the database is polled every
+        ``poll_interval`` seconds.
+
+        Parameters
+        ----------
+        job_id : str
+            Id returned by submit().
+        since : int
+            Number of results the caller has already seen.
+        timeout : float
+            Maximum seconds to wait.
+
+        Returns
+        -------
+        dict or None
+            Same snapshot as get().
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.get(job_id, since)
+            if job is None or job['status'] == 'done' or job['results'] or time.monotonic() >= deadline:
+                return job
+            time.sleep(min(self.poll_interval, max(deadline - time.monotonic(), 0)))
+
+    def _run_chunk(self, job_id: str, task: Callable[[list], list], chunk: list) -> None:
+        with self._transaction() as conn:
+            conn.execute("UPDATE jobs SET status = 'running' WHERE job_id = ? AND status = 'queued'", (job_id,))
+
+        try:
+            results = [json.dumps(result) for result in task(chunk)]
+            error = None
+        except Exception as e:
+            logger.exception(f"Error in job {job_id}: {e}")
+            results = []
+            error = str(e)
+
+        with self._transaction() as conn:
+            conn.executemany('INSERT INTO job_results VALUES (?, ?)', [(job_id, result) for result in results])
+            if error:
+                conn.execute('INSERT INTO job_errors VALUES (?, ?)', (job_id, error))
+            conn.execute('UPDATE jobs SET pending_chunks = pending_chunks - 1 WHERE job_id = ?', (job_id,))
+            conn.execute("UPDATE jobs SET status = 'done', finished = ? WHERE job_id = ? AND pending_chunks = 0",
+                         (time.time(), job_id))
+
+    def _discard_expired(self) -> None:
+        cutoff = time.time() - self.retention
+        with self._transaction() as conn:
+            expired = [(job_id,) for (job_id,) in conn.execute(
+                'SELECT job_id FROM jobs WHERE finished IS NOT NULL AND finished < ?', (cutoff,))]
+            for table in ('job_results', 'job_errors', 'jobs'):
+                conn.executemany(f'DELETE FROM {table} WHERE job_id = ?', expired)
+
+    def _connect(self) -> sqlite3.Connection:
+        # sqlite3 connections must not be shared between threads
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self._db_path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self, begin: str = 'BEGIN IMMEDIATE'):
+        # Writers take the write lock up front; upgrading a read transaction can fail under contention
+        conn = self._connect()
+        conn.execute(begin)
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+def create_job_queue(backend: str = config.STORE_BACKEND):
+    """
+    Build the job queue matching the configured image store.
+
+    Parameters
+    ----------
+    backend : str, optional
+        'memory' for jobs visible to the accepting process only, or 'shared' for
+        jobs every worker process can report on.
+
+    Returns
+    -------
+    JobQueue or SharedJobQueue
+        The job queue.
+
+    Raises
+    ------
+    ValueError
+        If the backend is unknown.
+    """
+    if backend == 'memory':
+        return JobQueue()
+    if backend == 'shared':
+        return SharedJobQueue()
+    raise ValueError(f"Unknown job queue backend: {backend}")
@@ -0,0 +1,240 @@
+import time
+import uuid
+import logging
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Iterable, Iterator, Optional
+
+# Route and id of the request being handled; ImageExecutor copies them into its threads
+current_route: ContextVar[str] = ContextVar('current_route', default='none')
+current_request_id: ContextVar[str] = ContextVar('current_request_id', default='-')
+
+_EXHAUSTED = object()
+
+# Latency buckets in seconds, from a fast OpenCV call to a large batch detection
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+class Histogram:
+    """
+    Latency histogram with labels, rendered in the Prometheus text format.
+
+    Attributes
+    ----------
+    name : str
+        Metric name.
+    labelnames : tuple of str
+        Label names, in the order values are recorded.
+    buckets : tuple of float
+        Upper bounds of the buckets, in seconds.
+    """
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # Per label values: [bucket counts..., +Inf count], sum
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        """
+        Record one observation.
+
+        Parameters
+        ----------
+        value : float
+            Observed value, in seconds.
+        **labels
+            Value of every label in labelnames.
+        """
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """
+        Observe the duration of a with block.
+
+        Parameters
+        ----------
+        **labels
+            Value of every label in labelnames.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> list:
+        """
+        Format the histogram for a /metrics response.
+
+        Returns
+        -------
+        list of str
+            Exposition lines.
+        """
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(key, list(counts), total) for key, (counts, total) in self._series.items()]
+
+        for key, counts, total in sorted(series):
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': le})} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+class Registry:
+    """
+    Collects the metrics served by /metrics.
+
+    Histograms are recorded as requests run; gauges are read from callbacks at
+    scrape time, so values such as the image store's size cost nothing in between.
+    Metrics cover the process serving the scrape.
+    """
+    def __init__(self):
+        self._histograms = []
+        self._gauges = []
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple = (),
+                  buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        """
+        Create and register a histogram.
+
+        Returns
+        -------
+        Histogram
+            The new histogram.
+        """
+        histogram = Histogram(name, documentation, labelnames, buckets)
+        self._histograms.append(histogram)
+        return histogram
+
+    def gauge(self, name: str, documentation: str, callback: Callable[[], Optional[float]], kind: str = 'gauge') -> None:
+        """
+        Register a value read at scrape time.
+
+        Parameters
+        ----------
+        name : str
+            Metric name.
+        documentation : str
+            Help text.
+        callback : callable
+            Returns the current value, or None to omit it.
+        kind : str, optional
+            Prometheus type: 'gauge' or 'counter'.
+        """
+        self._gauges.append((name, documentation, callback, kind))
+
+    def render(self) -> str:
+        """
+        Format every metric in the Prometheus text exposition format.
+
+        Returns
+        -------
+        str
+            Response body for /metrics.
+        """
+        lines = []
+        for name, documentation, callback, kind in self._gauges:
+            try:
+                value = callback()
+            except Exception as e:
+                logging.getLogger(__name__).warning(f"Metric {name} unavailable: {e}")
+                continue
+            if value is not None:
+                lines += [f"# HELP {name} {documentation}", f"# TYPE {name} {kind}", f"{name} {value}"]
+        for histogram in self._histograms:
+            lines += histogram.render()
+        return '\n'.join(lines) + '\n'
+
+REGISTRY = Registry()
+
+REQUEST_SECONDS = REGISTRY.histogram(
+    'neuroscan_request_seconds', 'Request latency by route, method and status.', ('route', 'method', 'status'))
+STAGE_SECONDS = REGISTRY.histogram(
+    'neuroscan_stage_seconds', 'Latency of request stages (read, decode, inference, ...) by route.', ('route', 'stage'))
+OPERATOR_SECONDS = REGISTRY.histogram(
+    'neuroscan_operator_seconds', 'Latency of one preprocessing or augmentation operator call.', ('operator',))
+
+def stage(name: str):
+    """
+    Time a stage of the current request.
+
+    Parameters
+    ----------
+    name : str
+        Stage name, e.g. 'decode' or 'inference'.
+
+    Returns
+    -------
+    contextmanager
+        Context manager recording the with block into neuroscan_stage_seconds.
+    """
+    return STAGE_SECONDS.time(route=current_route.get(), stage=name)
+
+def timed_iter(items: Iterable, name: str) -> Iterator:
+    """
+    Time how long a lazy iterable takes to produce each item, as a stage of the current request.
+
+    Parameters
+    ----------
+    items : iterable
+        Items produced on demand, e.g. entries read from an upload stream.
+    name : str
+        Stage name.
+
+    Yields
+    ------
+    object
+        The items, unchanged.
+    """
+    iterator = iter(items)
+    while True:
+        with stage(name):
+            item = next(iterator, _EXHAUSTED)
+        if item is _EXHAUSTED:
+            return
+        yield item
+
+def new_request_id() -> str:
+    """
+    Generate a short id for a request that arrived without one.
+
+    Returns
+    -------
+    str
+        16 hex characters.
+    """
+    return uuid.uuid4().hex[:16]
+
+class RequestIdFilter(logging.Filter):
+    """
+    Adds the current request id to log records as ``request_id``.
+    """
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = current_request_id.get()
+        return True
@@ -0,0 +1,26 @@
+from src.preprocessing import normalization, noise_reduction, skull_stripping, artifact_removal
+from src.augmentation import rotation, translation, scaling, flipping, elastic_deformation, intensity_adjustment, noise_injection, shearing, random_cropping
+from src.augmentation.batch import augment_batch
+
+# Preprocessing methods by name
+PROCESSING_MAP = {
+    'normalization': normalization.normalize_image,
+    'noise_reduction': noise_reduction.reduce_noise,
+    'skull_stripping': skull_stripping.skull_strip,
+    'artifact_removal': artifact_removal.remove_artifacts,
+}
+
+# Augmentation methods by name, with the parameters the web interface uses
+AUGMENT_MAP = {
+    'rotation': lambda img: rotation.rotate_image(img, 90),
+    'translation': lambda img: translation.translate_image(img, 20, 20),
+    'scaling': lambda img: scaling.scale_image(img, 3, 3),
+    'flipping': lambda img: flipping.flip_image(img, 1),
+    'elastic_deformation': lambda img: elastic_deformation.elastic_transform(img, alpha=3),
+    'intensity_adjustment': lambda img: intensity_adjustment.adjust_intensity(img, alpha=1.9, beta=20),
+    'noise_injection': lambda img: noise_injection.inject_noise(img / 255.0) * 255,
+    'shearing': lambda img: shearing.shear_image(img, shear_factor=0.3),
+    'random_cropping': lambda img: random_cropping.random_crop(img, crop_size=(100, 100)),
+    # Rotation, translation, scale and shear drawn from batch.DEFAULT_RANGES, applied in one warp
+    'random_affine': lambda img: augment_batch(img[None])[0][0],
+}
@@ -0,0 +1,155 @@
+import os
+import sys
+import json
+import time
+import uuid
+import logging
+import threading
+import tracemalloc
+from collections import Counter
+from typing import Optional
+
+from src.utils import config
+
+logger = logging.getLogger(__name__)
+
+# Pool threads doing work on behalf of a request, sampled along with the request's own thread
+WORKER_THREAD_PREFIXES = ('image-worker', 'denoise')
+
+# The sampler and tracemalloc see the whole process, so one request is profiled at a time
+_active = threading.Lock()
+
+def _collapse(frame, root: str) -> str:
+    # Outermost frame first, as in flamegraph.pl's collapsed format
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    names.append(root)
+    return ';'.join(reversed(names))
+
+def _idle(frame) -> bool:
+    # A pool thread waiting for work sits in concurrent.futures' worker loop
+    return frame.f_code.co_name == '_worker' and frame.f_code.co_filename.endswith('thread.py')
+
+class RequestProfile:
+    """
+    Sample the stacks of one request and trace the memory it allocates.
+
+    A background thread records the stack of the request's thread, and of any
+    image executor or denoising thread that is busy, every ``interval`` seconds.
+    The stacks are written in the collapsed format read by flamegraph.pl and
+    speedscope, and the largest allocation sites as a JSON report. Pool threads
+    are shared, so work of concurrent requests on them is sampled too.
+
+    Attributes
+    ----------
+    name : str
+        Base name of the output files.
+    samples : int
+        Sampling rounds taken.
+    stacks : collections.Counter
+        Sample count per collapsed stack.
+    """
+    def __init__(self, route: str, request_id: str, interval: float = config.PROFILE_INTERVAL,
+                 top: int = config.PROFILE_TOP_ALLOCATIONS):
+        self.route = route
+        self.request_id = request_id
+        self.interval = interval
+        self.top = top
+        self.name = f"{time.strftime('%Y%m%d-%H%M%S')}-{route.strip('/').replace('/', '_')}-{uuid.uuid4().hex[:8]}"
+        self.samples = 0
+        self.stacks = Counter()
+        self._thread_id = None
+        self._sampler = None
+        self._stopped = threading.Event()
+        self._started_tracing = False
+        self._start = None
+
+    def start(self) -> bool:
+        """
+        Start profiling the calling thread.
+
+        Returns
+        -------
+        bool
+            False if another request is being profiled, in which case nothing is started.
+        """
+        if not _active.acquire(blocking=False):
+            return False
+
+        self._thread_id = threading.get_ident()
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        tracemalloc.reset_peak()
+        self._start = time.perf_counter()
+        self._sampler = threading.Thread(target=self._sample, name='profiler', daemon=True)
+        self._sampler.start()
+        return True
+
+    def _sample(self) -> None:
+        while not self._stopped.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == self._thread_id:
+                    self.stacks[_collapse(frame, 'request')] += 1
+                elif names.get(ident, '').startswith(WORKER_THREAD_PREFIXES) and not _idle(frame):
+                    self.stacks[_collapse(frame, names[ident])] += 1
+            self.samples += 1
+
+    def stop(self) -> Optional[dict]:
+        """
+        Stop profiling and write the collapsed stacks and allocation report.
+
+        Returns
+        -------
+        dict or None
+            The report written to ``<name>.json``, or None if the profile was not
+            running (never started, or already stopped).
+        """
+        if self._sampler is None or self._stopped.is_set():
+            return None
+
+        self._stopped.set()
+        self._sampler.join()
+        duration = time.perf_counter() - self._start
+        try:
+            snapshot = tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, __file__),
+            ))
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            if self._started_tracing:
+                tracemalloc.stop()
+            _active.release()
+
+        report = {
+            'name': self.name,
+            'route': self.route,
+            'request_id': self.request_id,
+            'duration_seconds': round(duration, 4),
+            'interval_seconds': self.interval,
+            'samples': self.samples,
+            'peak_traced_bytes': peak,
+            'top_allocations': [{
+                'site': f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                'bytes': stat.size,
+                'blocks': stat.count
+            } for stat in snapshot.statistics('lineno')[:self.top]]
+        }
+
+        try:
+            os.makedirs(config.PROFILE_DIR, exist_ok=True)
+            with open(os.path.join(config.PROFILE_DIR, f"{self.name}.collapsed"), 'w') as f:
+                f.writelines(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+            with open(os.path.join(config.PROFILE_DIR, f"{self.name}.json"), 'w') as f:
+                json.dump(report, f, indent=2)
+        except OSError as e:
+            logger.error(f"Could not write profile {self.name}: {e}")
+            return None
+
+        logger.info(f"Profiled {self.route} in {duration:.3f} s ({self.samples} samples), wrote {self.name}")
+        return report
@@ -0,0 +1,146 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable
+
+import numpy as np
+
+from src.utils import config
+
+def content_digest(image: np.ndarray) -> str:
+    """
+    Hash the decoded pixels of an image.
+
+    Parameters
+    ----------
+    image : numpy.ndarray
+        Image to hash.
+
+    Returns
+    -------
+    str
+        Hex digest that changes whenever the shape, dtype or any pixel changes.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{image.shape}{image.dtype.str}".encode('ascii'))
+    digest.update(np.ascontiguousarray(image).data)
+    return digest.hexdigest()
+
+def file_digest(path: str) -> str:
+    """
+    Hash the contents of a file, such as model weights.
+
+    Parameters
+    ----------
+    path : str
+        Path of the file to hash.
+
+    Returns
+    -------
+    str
+        Hex digest of the file contents.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class ResultCache:
+    """
+    Memoizes computed results in memory, evicting the least recently used beyond a byte budget.
+
+    Arrays are counted by ``nbytes`` and stored read-only so that a cached
+    result cannot be modified by whoever it is handed to.
+
+    Attributes
+    ----------
+    max_bytes : int
+        Upper bound on the estimated size of the cached results.
+    resident_bytes : int
+        Estimated size of the results currently cached.
+    hits, misses : int
+        Lookup counters.
+    """
+    def __init__(self, max_bytes: int = config.RESULT_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.resident_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Any:
+        """
+        Look up a cached result.
+
+        Parameters
+        ----------
+        key : hashable
+            Key the result was stored under.
+
+        Returns
+        -------
+        object or None
+            The cached result, or None if absent.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """
+        Cache a result.
+
+        Parameters
+        ----------
+        key : hashable
+            Key to store the result under.
+        value : object
+            Result to cache. Arrays, and arrays inside tuples, are made read-only.
+        """
+        nbytes = _freeze(value)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.resident_bytes -= old[1]
+            if nbytes > self.max_bytes:
+                return
+
+            self._entries[key] = (value, nbytes)
+            self.resident_bytes += nbytes
+            while self.resident_bytes > self.max_bytes:
+                _, (_, evicted_nbytes) = self._entries.popitem(last=False)
+                self.resident_bytes -= evicted_nbytes
+
+    def stats(self) -> dict:
+        """
+        Report the cache's size and counters.
+
+        Returns
+        -------
+        dict
+            Entry count, resident and maximum bytes, hits and misses.
+        """
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'resident_bytes': self.resident_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+def _freeze(value: Any) -> int:
+    # Mark arrays read-only and estimate the value's size in bytes
+    if isinstance(value, np.ndarray):
+        value.flags.writeable = False
+        return value.nbytes
+    if isinstance(value, (tuple, list)):
+        return sum(_freeze(item) for item in value) + 64
+    return 256
@@ -0,0 +1,128 @@
+import os
+import re
+from collections import defaultdict
+
+import cv2
+import numpy as np
+
+from src.utils.data_loader import list_images
+
+# Dataset and upload names carry the study and slice position, e.g.
+# volume_100_slice_47_jpg.rf.<hash>.jpg
+SLICE_PATTERN = re.compile(r'volume_(\d+)_slice_(\d+)')
+
+def parse_slice_name(name):
+    """
+    Read the volume id and slice index encoded in a file name.
+
+    Parameters
+    ----------
+    name : str
+        File name or path.
+
+    Returns
+    -------
+    tuple or None
+        (volume_id, slice_index), or None if the name does not follow the pattern.
+    """
+    match = SLICE_PATTERN.search(os.path.basename(name))
+    if match is None:
+        return None
+    return int(match.group(1)), int(match.group(2))
+
+def group_slices(names):
+    """
+    Group slice names by volume, in slice order.
+
+    Parameters
+    ----------
+    names : iterable of str
+        File names or paths.
+
+    Returns
+    -------
+    tuple
+        (volumes, ungrouped): a dict mapping volume id to a list of
+        (slice_index, name) sorted by slice, ordered by volume id, and the names
+        without a volume and slice.
+    """
+    volumes = defaultdict(list)
+    ungrouped = []
+    for name in names:
+        parsed = parse_slice_name(name)
+        if parsed is None:
+            ungrouped.append(name)
+        else:
+            volumes[parsed[0]].append((parsed[1], name))
+    return {volume_id: sorted(volumes[volume_id]) for volume_id in sorted(volumes)}, ungrouped
+
+class Volume:
+    """
+    The slices of one study, stacked in slice order.
+
+    Attributes
+    ----------
+    volume_id : int
+        Study id from the file names.
+    slice_indices : list of int
+        Slice index of each stacked slice.
+    names : list of str
+        File or store name of each stacked slice.
+    stack : numpy.ndarray
+        Slices of shape (N, H, W) or (N, H, W, C).
+    """
+    def __init__(self, volume_id, slice_indices, names, stack):
+        self.volume_id = volume_id
+        self.slice_indices = list(slice_indices)
+        self.names = list(names)
+        self.stack = stack
+
+    def __len__(self):
+        return len(self.names)
+
+    @classmethod
+    def from_slices(cls, volume_id, slices):
+        """
+        Stack slices that are already loaded.
+
+        Parameters
+        ----------
+        volume_id : int
+            Study id.
+        slices : list of tuple
+            (slice_index, name, image) per slice, in any order.
+
+        Returns
+        -------
+        Volume
+            The stacked volume.
+
+        Raises
+        ------
+        ValueError
+            If the slices differ in shape or dtype.
+        """
+        slices = sorted(slices, key=lambda item: (item[0], item[1]))
+        shapes = {(image.shape, image.dtype) for _, _, image in slices}
+        if len(shapes) > 1:
+            raise ValueError(f"Slices of volume {volume_id} differ in shape or dtype")
+        return cls(volume_id, [index for index, _, _ in slices], [name for _, name, _ in slices],
+                   np.stack([image for _, _, image in slices]))
+
+def load_volumes(split_dir):
+    """
+    Read the slices of a dataset split as volumes.
+
+    Parameters
+    ----------
+    split_dir : str
+        Split directory holding an ``images`` folder.
+
+    Yields
+    ------
+    Volume
+        One volume per study, in volume id order, with BGR slices.
+    """
+    volumes, _ = group_slices(list_images(split_dir))
+    for volume_id, slices in volumes.items():
+        yield Volume.from_slices(volume_id, [(index, path, cv2.imread(path)) for index, path in slices])
@@ -0,0 +1,191 @@
+"""
+Tests of the ONNX Runtime backend: its NumPy pre- and post-processing, and its
+detections against Ultralytics on the test split.
+
+Run from the repository root with ``python -m pytest tests``. The parity test is
+skipped unless Ultralytics, ONNX Runtime and the trained weights are available.
+"""
+import os
+
+import numpy as np
+import pytest
+
+from src.models.backends import letterbox, nms, postprocess
+from src.utils import config
+
+# Parity tolerances: a reference box is matched by an ONNX box of the same class
+# overlapping it by at least PARITY_MIN_IOU with a score within PARITY_MAX_SCORE_DIFF,
+# and at most PARITY_MAX_MISMATCH of the images may have any unmatched or extra box
+PARITY_MIN_IOU = 0.9
+PARITY_MAX_SCORE_DIFF = 0.05
+PARITY_MAX_MISMATCH = 0.02
+
+TEST_IMAGES = os.path.join('data', 'TumorDetectionYolov8', 'test', 'images')
+WEIGHTS_PATH = os.path.splitext(config.MODEL_PATH)[0] + '.pt'
+
+#==============================================================================
+# LETTERBOX
+#==============================================================================
+def test_letterbox_keeps_aspect_ratio_and_centres_the_image():
+    image = np.full((100, 200, 3), 7, dtype=np.uint8)
+    canvas, ratio, (pad_left, pad_top) = letterbox(image, 64)
+
+    assert canvas.shape == (64, 64, 3)
+    assert ratio == pytest.approx(0.32)
+    assert (pad_left, pad_top) == (0, 16)
+    # The resized image fills the middle rows, the padding the rest
+    assert (canvas[16:48] == 7).all()
+    assert (canvas[:16] == 114).all() and (canvas[48:] == 114).all()
+
+def test_letterbox_splits_odd_padding_like_ultralytics():
+    image = np.zeros((64, 33, 3), dtype=np.uint8)
+    canvas, ratio, (pad_left, pad_top) = letterbox(image, 64)
+
+    assert ratio == 1.0
+    assert canvas.shape == (64, 64, 3)
+    # 31 columns of padding: 15 on the left, 16 on the right
+    assert (pad_left, pad_top) == (15, 0)
+    assert (canvas[:, 15:48] == 0).all()
+
+def test_letterbox_leaves_a_square_image_of_the_right_size_unchanged():
+    image = np.random.default_rng(0).integers(0, 256, (64, 64, 3), dtype=np.uint8)
+    canvas, ratio, pad = letterbox(image, 64)
+
+    assert ratio == 1.0 and pad == (0, 0)
+    np.testing.assert_array_equal(canvas, image)
+
+#==============================================================================
+# NMS
+#==============================================================================
+def test_nms_suppresses_overlapping_boxes_and_orders_by_score():
+    boxes = np.array([[0, 0, 10, 10], [1, 1, 11, 11], [50, 50, 60, 60]], dtype=np.float32)
+    scores = np.array([0.6, 0.9, 0.8], dtype=np.float32)
+
+    np.testing.assert_array_equal(nms(boxes, scores, 0.5), [1, 2])
+    # Nothing overlaps by more than an IoU of 0.7, so every box is kept
+    np.testing.assert_array_equal(nms(boxes, scores, 0.7), [1, 2, 0])
+
+def test_nms_over_smaller_suppresses_contained_boxes():
+    boxes = np.array([[0, 0, 100, 100], [10, 10, 30, 30]], dtype=np.float32)
+    scores = np.array([0.9, 0.5], dtype=np.float32)
+
+    # IoU of the small box with the large one is only 0.04
+    np.testing.assert_array_equal(nms(boxes, scores, 0.5), [0, 1])
+    np.testing.assert_array_equal(nms(boxes, scores, 0.5, over_smaller=True), [0])
+
+def test_nms_of_no_boxes_is_empty():
+    kept = nms(np.empty((0, 4), dtype=np.float32), np.empty(0, dtype=np.float32), 0.5)
+    assert kept.shape == (0,)
+
+#==============================================================================
+# POSTPROCESS
+#==============================================================================
+def _head_output(predictions, num_classes=2):
+    # Rows of (cx, cy, w, h, class, score) -> raw head output of shape (4 + num_classes, anchors)
+    output = np.zeros((4 + num_classes, len(predictions)), dtype=np.float32)
+    for anchor, (cx, cy, w, h, class_id, score) in enumerate(predictions):
+        output[:4, anchor] = cx, cy, w, h
+        output[4 + class_id, anchor] = score
+    return output
+
+def test_postprocess_decodes_filters_and_suppresses_per_class():
+    output = _head_output([
+        (50, 50, 20, 40, 0, 0.9),   # kept
+        (51, 50, 20, 40, 0, 0.8),   # suppressed by the first box
+        (50, 50, 20, 40, 1, 0.7),   # same place, other class: kept
+        (200, 200, 10, 10, 1, 0.1), # below the confidence threshold
+    ])
+    boxes, scores, class_ids = postprocess(output, conf=0.25, iou=0.45)
+
+    np.testing.assert_allclose(boxes, [[40, 30, 60, 70], [40, 30, 60, 70]])
+    np.testing.assert_allclose(scores, [0.9, 0.7])
+    np.testing.assert_array_equal(class_ids, [0, 1])
+
+def test_postprocess_limits_the_number_of_detections():
+    output = _head_output([(20 * i + 10, 10, 8, 8, 0, 0.5 + i / 100) for i in range(10)])
+    boxes, scores, _ = postprocess(output, conf=0.25, iou=0.45, max_det=3)
+
+    assert len(boxes) == 3
+    np.testing.assert_allclose(scores, [0.59, 0.58, 0.57])
+
+def test_postprocess_without_confident_boxes_is_empty():
+    boxes, scores, class_ids = postprocess(_head_output([(10, 10, 5, 5, 0, 0.1)]), conf=0.25, iou=0.45)
+    assert boxes.shape == (0, 4) and scores.shape == (0,) and class_ids.shape == (0,)
+
+#==============================================================================
+# PARITY WITH ULTRALYTICS
+#==============================================================================
+@pytest.fixture(scope='module')
+def onnx_path(tmp_path_factory):
+    pytest.importorskip('ultralytics')
+    pytest.importorskip('onnxruntime')
+    if not os.path.exists(WEIGHTS_PATH):
+        pytest.skip(f"weights not found at {WEIGHTS_PATH}")
+    if not os.path.isdir(TEST_IMAGES):
+        pytest.skip(f"test split not found at {TEST_IMAGES}")
+
+    existing = os.path.splitext(WEIGHTS_PATH)[0] + '.onnx'
+    if os.path.exists(existing):
+        return existing
+
+    from src.models.export_onnx import export_onnx
+    return export_onnx(WEIGHTS_PATH, str(tmp_path_factory.mktemp('onnx') / 'best.onnx'))
+
+def test_onnx_detections_match_ultralytics_on_the_test_split(onnx_path):
+    from src.models.export_onnx import check_parity
+
+    report = check_parity(WEIGHTS_PATH, onnx_path, TEST_IMAGES,
+                          min_iou=PARITY_MIN_IOU, max_score_diff=PARITY_MAX_SCORE_DIFF)
+
+    assert report['images'] > 0
+    mismatch_rate = len(report['mismatched_images']) / report['images']
+    assert mismatch_rate <= PARITY_MAX_MISMATCH, (
+        f"{len(report['mismatched_images'])} of {report['images']} images differ, "
+        f"e.g. {report['mismatched_images'][:5]}")
+
+#==============================================================================
+# CHANNEL ORDER
+#==============================================================================
+class _RecordingSession:
+    # Stands in for an ONNX Runtime session: keeps the input and returns no detections
+    def run(self, output_names, feeds):
+        self.batch = next(iter(feeds.values()))
+        return [np.zeros((len(self.batch), 4 + 2, 10), dtype=np.float32)]
+
+class _RecordingModel:
+    # Stands in for an Ultralytics model: keeps the inputs and returns no detections
+    def __call__(self, images, **kwargs):
+        self.images = images
+        return []
+
+def test_onnx_backend_feeds_bgr_input_to_the_graph_as_rgb():
+    from src.models.backends import OnnxBackend
+
+    backend = OnnxBackend.__new__(OnnxBackend)
+    backend._session, backend._input_name, backend._dynamic_batch = _RecordingSession(), 'images', True
+    backend.imgsz, backend.names = 64, {0: 'a', 1: 'b'}
+
+    # Pure blue in BGR order, as cv2.imread returns it
+    image = np.zeros((64, 64, 3), dtype=np.uint8)
+    image[..., 0] = 255
+    backend.predict([image], conf=0.25, iou=0.45)
+
+    batch = backend._session.batch
+    assert batch.shape == (1, 3, 64, 64)
+    np.testing.assert_array_equal(batch[0, 0], 0)  # red
+    np.testing.assert_array_equal(batch[0, 2], 1)  # blue
+
+def test_ultralytics_backend_passes_bgr_input_unchanged():
+    import threading
+
+    from src.models.backends import UltralyticsBackend
+
+    backend = UltralyticsBackend.__new__(UltralyticsBackend)
+    backend._model, backend._lock = _RecordingModel(), threading.Lock()
+
+    image = np.zeros((64, 64, 3), dtype=np.uint8)
+    image[..., 0] = 255
+    backend.predict([image], conf=0.25, iou=0.45)
+
+    # Ultralytics converts NumPy input from BGR itself
+    assert backend._model.images[0] is image